@@ -0,0 +1,188 @@
+"""Uncertainty ranking of unlabeled images
+
+The model is run over unlabeled images at a low confidence floor and each
+image is scored by how unsure the predictions are:
+
+- low maximum confidence among the detections
+- many boxes close to the inference confidence threshold
+- a wide spread of keypoint confidences
+
+Images the model already gets right score low, so labeling the highest
+scores first gives the most improvement per annotator hour. Scores are
+cached in the image directory (.uncertainty.json) per model file, backend
+and threshold, so only new images (or a new model) need scoring.
+
+    python active_learning.py best.pt path/to/images --labels path/to/output/labels --top 50
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from inference_backends import BACKENDS, get_backend
+from label_core import scan_image_directory
+
+
+CACHE_NAME = '.uncertainty.json'
+
+# Scoring runs below the normal threshold so near-misses are seen
+SCORE_CONF = 0.05
+# Boxes within this distance of the threshold count as borderline
+NEAR_MARGIN = 0.15
+# Weights of the max-confidence, borderline-box and keypoint-spread terms
+WEIGHTS = (0.4, 0.4, 0.2)
+
+
+def uncertainty_score(detections, conf_threshold):
+    """Score one image's detections from 0 (confident) to 1 (uncertain)"""
+    if not detections:
+        return 0.0  # Nothing even at the low confidence floor: confidently empty
+
+    max_conf = max(det['conf'] for det in detections)
+    borderline = sum(1 for det in detections if abs(det['conf'] - conf_threshold) < NEAR_MARGIN)
+
+    kp_confs = [kp[2] for det in detections for kp in (det['keypoints'] or [])]
+    kp_spread = 0.0
+    if len(kp_confs) > 1:
+        mean = sum(kp_confs) / len(kp_confs)
+        # Standard deviation of values in 0-1 is at most 0.5
+        kp_spread = min(1.0, 2 * (sum((c - mean) ** 2 for c in kp_confs) / len(kp_confs)) ** 0.5)
+
+    return (WEIGHTS[0] * (1 - max_conf) +
+            WEIGHTS[1] * borderline / (borderline + 2) +
+            WEIGHTS[2] * kp_spread)
+
+
+def model_key(model_path, backend, int8, conf_threshold):
+    """Identify a model version; cached scores are only reused for the same key"""
+    stat = os.stat(model_path)
+    return f"{Path(model_path).resolve()}|{stat.st_mtime_ns}|{backend}|{int(int8)}|{conf_threshold}"
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_scores(image_dir, key):
+    """Cached {image name: [mtime_ns, size, score]} for a model key (empty for another model)"""
+    try:
+        with open(Path(image_dir) / CACHE_NAME, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('model') != key:
+        return {}
+    return cache.get('scores', {})
+
+
+def save_scores(image_dir, key, scores):
+    cache_path = Path(image_dir) / CACHE_NAME
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps({'model': key, 'scores': scores}, separators=(',', ':')))
+    os.replace(tmp_path, cache_path)
+
+
+def cached_score(scores, path):
+    """Score of an image from the cache, or None if it's missing or the file changed"""
+    entry = scores.get(Path(path).name)
+    if entry is None or entry[:2] != file_signature(path):
+        return None
+    return entry[2]
+
+
+def labeled_stems(labels_dir):
+    """Original image stems that already have a saved label
+
+    Save & Next names labels <original stem>_<key>.txt.
+    """
+    stems = set()
+    try:
+        with os.scandir(labels_dir) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if ext == '.txt':
+                    original, _, key = stem.rpartition('_')
+                    stems.add(original if original and key.isdigit() else stem)
+    except FileNotFoundError:
+        pass
+    return stems
+
+
+def pick_next(image_list, current_idx, scores, labeled=()):
+    """Index of the most uncertain scored, unlabeled image other than the current one, or None"""
+    best = None
+    for i, path in enumerate(image_list):
+        if i == current_idx or path.stem in labeled or path not in scores:
+            continue
+        if best is None or scores[path] > scores[image_list[best]]:
+            best = i
+    return best
+
+
+def next_unlabeled(image_list, current_idx, labeled=()):
+    """Index of the next unlabeled image in list order after the current one (wrapping around), or None"""
+    for offset in range(1, len(image_list)):
+        i = (current_idx + offset) % len(image_list)
+        if image_list[i].stem not in labeled:
+            return i
+    return None
+
+
+def score_images(predict, image_paths, conf_threshold, batch_size=4):
+    """Yield (path, score) for each image, predicting in batches
+
+    predict takes a list of paths and returns a detection list per path.
+    """
+    image_paths = list(image_paths)
+    for start in range(0, len(image_paths), batch_size):
+        batch = image_paths[start:start + batch_size]
+        for path, detections in zip(batch, predict(batch)):
+            yield path, uncertainty_score(detections, conf_threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank unlabeled images by model uncertainty")
+    parser.add_argument('model', help="YOLO model file")
+    parser.add_argument('images', help="Directory of images (scores are cached here)")
+    parser.add_argument('--labels', help="Output labels directory; images labeled there are skipped")
+    parser.add_argument('--backend', default='pytorch', choices=BACKENDS)
+    parser.add_argument('--conf', type=float, default=0.5, help="Confidence threshold used for labeling")
+    parser.add_argument('--iou', type=float, default=0.4, help="NMS IoU threshold")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--top', type=int, default=20, help="Number of images to list")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend, args.model)
+    key = model_key(args.model, args.backend, False, args.conf)
+    scores = load_scores(args.images, key)
+    labeled = labeled_stems(args.labels) if args.labels else set()
+    image_paths = [path for path in scan_image_directory(args.images) if path.stem not in labeled]
+
+    ranked = {}
+    todo = []
+    for path in image_paths:
+        score = cached_score(scores, path)
+        if score is None:
+            todo.append(path)
+        else:
+            ranked[path] = score
+
+    def predict(batch):
+        return backend.predict([str(path) for path in batch], conf=SCORE_CONF, iou=args.iou)
+
+    for i, (path, score) in enumerate(score_images(predict, todo, args.conf, args.batch_size), 1):
+        ranked[path] = score
+        scores[path.name] = file_signature(path) + [score]
+        if i % 500 == 0 or i == len(todo):
+            save_scores(args.images, key, scores)
+            print(f"Scored {i}/{len(todo)} images")
+
+    for path, score in sorted(ranked.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{score:.3f}  {path.name}")
+
+
+if __name__ == '__main__':
+    main()
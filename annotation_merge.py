@@ -0,0 +1,168 @@
+"""Merging model predictions into existing annotations
+
+Predictions are matched against existing boxes with vectorized IoU blocks,
+so running inference twice (or after manual labeling) doesn't stack
+duplicate boxes. Matched predictions are handled by a conflict policy:
+
+- keep_manual:     keep the existing box, drop the prediction
+- replace:         replace the existing box with the prediction
+- union_keypoints: keep the existing box and add predicted keypoints for
+                   keypoint classes it doesn't have yet
+
+Unmatched predictions are always added.
+"""
+
+import numpy as np
+
+
+MERGE_POLICIES = ['keep_manual', 'replace', 'union_keypoints']
+
+# Most IoU values (rows x columns) computed at once
+MAX_BLOCK = 1 << 20
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU of every box in boxes_a (N x 4) with every box in boxes_b (M x 4) as an N x M array"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    area_a = (a[:, 2] - a[:, 0]).clip(min=0) * (a[:, 3] - a[:, 1]).clip(min=0)
+    area_b = (b[:, 2] - b[:, 0]).clip(min=0) * (b[:, 3] - b[:, 1]).clip(min=0)
+
+    inter_w = (np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])).clip(min=0)
+    inter_h = (np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])).clip(min=0)
+    inter = inter_w * inter_h
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def candidate_pairs(boxes_a, boxes_b, iou_threshold):
+    """(rows, cols, ious) of the box pairs whose IoU is at least iou_threshold
+
+    The IoU matrix is never built whole: boxes_a is sorted by left edge and
+    taken in blocks, and each block is only compared with the boxes of
+    boxes_b that overlap its x-extent, so memory stays bounded in dense
+    scenes.
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    a_order = np.argsort(a[:, 0], kind='stable')
+    b_order = np.argsort(b[:, 0], kind='stable')
+    a, b = a[a_order], b[b_order]
+    # Only pairs that overlap can reach a positive threshold
+    prune = iou_threshold > 0
+
+    step = max(1, MAX_BLOCK // max(1, len(b)))
+    found_rows, found_cols, found_ious = [], [], []
+    for start in range(0, len(a), step):
+        block = a[start:start + step]
+        cols = np.arange(len(b))
+        if prune:
+            cols = cols[:np.searchsorted(b[:, 0], block[:, 2].max(), side='left')]
+            cols = cols[b[cols, 2] > block[:, 0].min()]
+            if len(cols) == 0:
+                continue
+        ious = iou_matrix(block, b[cols])
+        rows, hits = np.nonzero(ious >= iou_threshold)
+        found_rows.append(a_order[rows + start])
+        found_cols.append(b_order[cols[hits]])
+        found_ious.append(ious[rows, hits])
+
+    if not found_rows:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return np.concatenate(found_rows), np.concatenate(found_cols), np.concatenate(found_ious)
+
+
+def _greedy_match(rows, cols, ious):
+    # Take candidate pairs from the highest IoU down (ties in row, then column
+    # order), each box used at most once
+    order = np.lexsort((cols, rows, -ious))
+
+    used_rows = set()
+    used_cols = set()
+    matches = []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matches.append((r, c))
+    return matches
+
+
+def match_boxes(existing_boxes, existing_classes, predicted_boxes, predicted_classes,
+                iou_threshold=0.5, class_aware=True):
+    """Match predicted boxes to existing boxes
+
+    Returns a list of (existing_index, predicted_index) pairs.
+    """
+    if len(existing_boxes) == 0 or len(predicted_boxes) == 0:
+        return []
+
+    existing_boxes = np.asarray(existing_boxes, dtype=np.float32).reshape(-1, 4)
+    predicted_boxes = np.asarray(predicted_boxes, dtype=np.float32).reshape(-1, 4)
+
+    if not class_aware:
+        return _greedy_match(*candidate_pairs(existing_boxes, predicted_boxes, iou_threshold))
+
+    # Boxes of different classes never match, so only compare within each class
+    existing_classes = np.asarray(existing_classes)
+    predicted_classes = np.asarray(predicted_classes)
+    matches = []
+    for class_id in np.intersect1d(existing_classes, predicted_classes):
+        rows = np.nonzero(existing_classes == class_id)[0]
+        cols = np.nonzero(predicted_classes == class_id)[0]
+        pair_rows, pair_cols, ious = candidate_pairs(existing_boxes[rows], predicted_boxes[cols], iou_threshold)
+        matches.extend(_greedy_match(rows[pair_rows], cols[pair_cols], ious))
+    return matches
+
+
+def _union_keypoints(existing, prediction):
+    merged = dict(existing)
+    keypoints = list(existing.get('keypoints', []))
+    present = {kp['class'] for kp in keypoints}
+    keypoints.extend(kp for kp in prediction.get('keypoints', []) if kp['class'] not in present)
+    merged['keypoints'] = keypoints
+    return merged
+
+
+def merge_predictions(existing, predictions, iou_threshold=0.5, policy='keep_manual', class_aware=True,
+                      protect=None):
+    """Merge predicted box annotations into existing annotations
+
+    Existing annotations keep their positions in the list (so indices such
+    as the selected box stay valid) and unmatched predictions are appended.
+    protect, if given, returns True for existing annotations that must be
+    kept as they are whatever the policy. Returns (merged_annotations, stats).
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy: {policy}")
+
+    box_indices = [i for i, ann in enumerate(existing) if ann['type'] == 'box']
+    matches = match_boxes(
+        [existing[i]['coords'] for i in box_indices],
+        [existing[i]['class'] for i in box_indices],
+        [pred['coords'] for pred in predictions],
+        [pred['class'] for pred in predictions],
+        iou_threshold=iou_threshold,
+        class_aware=class_aware
+    )
+
+    merged = list(existing)
+    matched_predictions = set()
+    for existing_pos, pred_idx in matches:
+        i = box_indices[existing_pos]
+        matched_predictions.add(pred_idx)
+        if protect is not None and protect(existing[i]):
+            continue
+        if policy == 'replace':
+            merged[i] = predictions[pred_idx]
+        elif policy == 'union_keypoints':
+            merged[i] = _union_keypoints(existing[i], predictions[pred_idx])
+
+    added = [pred for j, pred in enumerate(predictions) if j not in matched_predictions]
+    merged.extend(added)
+
+    return merged, {'added': len(added), 'matched': len(matches)}
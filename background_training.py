@@ -0,0 +1,123 @@
+"""Background training for the labeling tool
+
+Trains (or fine-tunes) a YOLO model in its own process with a limited
+number of CPU threads and lowered priority, so the GUI stays responsive.
+The starting weights are validated first; whenever an epoch beats the best
+validation fitness so far, its weights are copied to
+<run>/weights/improved_<epoch>.pt for the tool to hot-swap.
+
+Progress is printed on stdout as lines starting with EVENT_PREFIX followed
+by JSON, e.g.
+
+    TRAINING_EVENT {"event": "epoch", "epoch": 3, "epochs": 10, "fitness": 0.44, "best_fitness": 0.44}
+
+Other output (ultralytics logging) can be ignored or logged.
+
+    python background_training.py path/to/output/data.yaml --weights best.pt --epochs 10 --threads 2
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+
+EVENT_PREFIX = 'TRAINING_EVENT '
+
+# Starting weights when not fine-tuning the current model; small enough for CPU
+DEFAULT_WEIGHTS = 'yolo11n.pt'
+DEFAULT_POSE_WEIGHTS = 'yolo11n-pose.pt'
+
+
+def emit(event, **fields):
+    print(EVENT_PREFIX + json.dumps(dict(event=event, **fields)), flush=True)
+
+
+def parse_event(line):
+    """Event dict from a line of training output, or None for other output"""
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+
+
+def limit_resources(threads):
+    """Cap math library threads and lower this process's priority (before torch is imported)"""
+    for var in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']:
+        os.environ[var] = str(threads)
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+def train(data, weights, epochs=10, imgsz=640, batch=8, threads=2, device='cpu', project='yolo_gui/runs',
+          name='background'):
+    """Train and emit progress events; returns the best validation fitness"""
+    limit_resources(threads)
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    model = YOLO(weights)
+
+    # Only weights that beat the starting point are worth swapping in
+    emit('status', message=f"Validating {Path(weights).name}")
+    try:
+        metrics = model.val(data=data, imgsz=imgsz, batch=batch, device=device, workers=0,
+                            plots=False, verbose=False)
+        best_fitness = float(metrics.fitness)
+    except Exception:
+        best_fitness = 0.0  # e.g. a base model whose classes don't match the dataset
+    emit('baseline', fitness=best_fitness)
+
+    def on_fit_epoch_end(trainer):
+        nonlocal best_fitness
+        fitness = float(trainer.fitness or 0.0)
+        epoch = trainer.epoch + 1
+        if fitness > best_fitness and Path(trainer.best).exists():
+            # best.pt was just written for this epoch; copy it so later epochs can't overwrite it mid-load
+            best_fitness = fitness
+            target = Path(trainer.save_dir) / 'weights' / f'improved_{epoch}.pt'
+            tmp_path = target.with_suffix('.tmp')
+            shutil.copyfile(trainer.best, tmp_path)
+            os.replace(tmp_path, target)
+            emit('improved', epoch=epoch, fitness=fitness, weights=str(target.resolve()))
+        emit('epoch', epoch=epoch, epochs=trainer.epochs, fitness=fitness, best_fitness=best_fitness)
+
+    model.add_callback('on_fit_epoch_end', on_fit_epoch_end)
+    model.train(data=data, epochs=epochs, imgsz=imgsz, batch=batch, device=device,
+                workers=min(2, threads), project=project, name=name, exist_ok=True,
+                plots=False, verbose=False)
+    emit('done', best_fitness=best_fitness)
+    return best_fitness
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a YOLO model in the background")
+    parser.add_argument('data', help="data.yaml with train/val splits")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS, help="Starting weights (fine-tunes if trained)")
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=2, help="CPU threads for training")
+    parser.add_argument('--device', default='cpu', help="cpu, 0, 0,1, ...")
+    parser.add_argument('--project', default='yolo_gui/runs')
+    parser.add_argument('--name', default='background')
+    args = parser.parse_args()
+
+    try:
+        train(args.data, args.weights, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch,
+              threads=args.threads, device=args.device, project=args.project, name=args.name)
+    except Exception as e:
+        emit('error', message=str(e))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""Headless benchmarks for the labeling tool's hot paths
+
+Runs without a display on synthetic images and annotation sets:
+
+- render:    resize + overlay drawing done by display_image
+- hit_test:  handle and box lookup done by on_mouse_down / on_mouse_move
+- inference: run_inference's conversion of model results into merged
+             annotations, using a stub model
+- save:      label serialization done by save_and_next
+- scan:      image directory scan done by load_directory
+
+Write results to JSON, then compare a later run against them:
+
+    python benchmark.py --boxes 100 1000 10000 --keypoints 0 17 --output baseline.json
+    python benchmark.py --boxes 100 1000 10000 --keypoints 0 17 --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from annotation_merge import merge_predictions
+from detections import detections_to_annotations, results_to_detections
+from label_core import (IMAGE_EXTENSIONS, draw_annotations, find_box_at, find_handle, fit_scale,
+                        resize_for_display, scan_image_directory)
+from yolo_format import write_label_file
+
+
+def make_image(width, height, seed=0):
+    """Synthetic RGB image with some structure so resizing isn't trivial"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+    pixels = (gradient + noise).clip(0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, 'RGB')
+
+
+def make_annotations(num_boxes, num_keypoints, img_width, img_height, seed=0, num_classes=3):
+    """Random box annotations with keypoints inside each box"""
+    rng = random.Random(seed)
+    annotations = []
+    for _ in range(num_boxes):
+        w = rng.uniform(20, img_width / 8)
+        h = rng.uniform(20, img_height / 8)
+        x1 = rng.uniform(0, img_width - w)
+        y1 = rng.uniform(0, img_height - h)
+        keypoints = [{
+            'class': kp_class,
+            'coords': (rng.uniform(x1, x1 + w), rng.uniform(y1, y1 + h)),
+            'visible': rng.choice([0, 1, 1, 1])
+        } for kp_class in range(num_keypoints)]
+        annotations.append({
+            'type': 'box',
+            'class': rng.randrange(num_classes),
+            'coords': [x1, y1, x1 + w, y1 + h],
+            'keypoints': keypoints
+        })
+    return annotations
+
+
+class _StubTensor:
+    def __init__(self, array):
+        self.array = np.asarray(array, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _StubBoxes:
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy = _StubTensor(xyxy)
+        self.cls = _StubTensor(cls)
+        self.conf = _StubTensor(conf)
+
+    def __len__(self):
+        return len(self.xyxy.array)
+
+
+class _StubKeypoints:
+    def __init__(self, data):
+        self.data = _StubTensor(data)
+
+
+class StubResults:
+    """Stands in for an ultralytics Results object"""
+
+    def __init__(self, annotations, num_keypoints, seed=0):
+        rng = np.random.default_rng(seed)
+        n = len(annotations)
+        xyxy = np.array([ann['coords'] for ann in annotations], dtype=np.float32).reshape(n, 4)
+        # Jitter so predictions overlap existing boxes without being identical
+        xyxy += rng.normal(0, 2, size=xyxy.shape).astype(np.float32)
+        self.boxes = _StubBoxes(xyxy, [ann['class'] for ann in annotations], rng.uniform(0.3, 1.0, n))
+        self.keypoints = None
+        if num_keypoints:
+            data = np.zeros((n, num_keypoints, 3), dtype=np.float32)
+            for i, ann in enumerate(annotations):
+                for kp in ann['keypoints']:
+                    data[i, kp['class']] = [kp['coords'][0], kp['coords'][1], rng.uniform(0, 1)]
+            self.keypoints = _StubKeypoints(data)
+
+
+class StubModel:
+    """Model stand-in that returns precomputed results"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __call__(self, source, **kwargs):
+        return [self.results]
+
+
+def _summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        'runs': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered),
+        'p50_ms': ordered[len(ordered) // 2],
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        'min_ms': ordered[0]
+    }
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _summarize(samples)
+
+
+def bench_render(image, annotations, canvas_size, repeat):
+    """Time display_image's resize and overlay stages"""
+    scale_factor, display_width, display_height = fit_scale(image.width, image.height, *canvas_size)
+    resized = resize_for_display(image, display_width, display_height)
+
+    def overlay():
+        draw_annotations(resized.copy(), annotations, scale_factor, selected_idx=0)
+
+    def render():
+        display_img = resize_for_display(image, display_width, display_height).copy()
+        draw_annotations(display_img, annotations, scale_factor, selected_idx=0)
+
+    return {
+        'render': _time(render, repeat),
+        'render_resize': _time(lambda: resize_for_display(image, display_width, display_height), repeat),
+        'render_overlay': _time(overlay, repeat)
+    }
+
+
+def bench_hit_test(annotations, img_width, img_height, scale_factor, clicks, seed=0):
+    """Time the handle check and box lookup of a mouse press, per click"""
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, img_width), rng.uniform(0, img_height)) for _ in range(clicks)]
+    threshold = 10 / scale_factor
+    selected = annotations[0]['coords'] if annotations else None
+
+    samples = []
+    for img_x, img_y in points:
+        start = time.perf_counter()
+        if selected is not None:
+            find_handle(selected, img_x, img_y, threshold)
+        find_box_at(annotations, img_x, img_y)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'hit_test': _summarize(samples)}
+
+
+def bench_inference(annotations, num_keypoints, repeat):
+    """Time converting stub model output into annotations merged with existing boxes"""
+    model = StubModel(StubResults(annotations, num_keypoints))
+
+    def convert():
+        detections = results_to_detections(model('image.jpg')[0])
+        merge_predictions(annotations, detections_to_annotations(detections))
+
+    return {'inference_conversion': _time(convert, repeat)}
+
+
+def bench_save(annotations, img_width, img_height, num_keypoints, repeat, workdir):
+    """Time writing the annotations as a YOLO label file"""
+    label_path = os.path.join(workdir, 'label.txt')
+    return {'save': _time(lambda: write_label_file(label_path, annotations, img_width, img_height,
+                                                   num_keypoints), repeat)}
+
+
+def bench_scan(num_files, repeat, workdir):
+    """Time scanning a directory of (empty) image files plus some other files"""
+    scan_dir = os.path.join(workdir, 'scan')
+    os.makedirs(scan_dir, exist_ok=True)
+    extensions = IMAGE_EXTENSIONS + [ext.upper() for ext in IMAGE_EXTENSIONS] + ['.txt', '.json']
+    for i in range(num_files):
+        open(os.path.join(scan_dir, f"frame_{i:07d}{extensions[i % len(extensions)]}"), 'w').close()
+    return {'scan': _time(lambda: scan_image_directory(scan_dir), repeat)}
+
+
+def run_benchmarks(box_counts, keypoint_counts, image_size, canvas_size, repeat, clicks, scan_files):
+    """Run every benchmark and return a JSON-serializable report"""
+    img_width, img_height = image_size
+    image = make_image(img_width, img_height)
+    scale_factor = fit_scale(img_width, img_height, *canvas_size)[0]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for num_boxes in box_counts:
+            for num_keypoints in keypoint_counts:
+                annotations = make_annotations(num_boxes, num_keypoints, img_width, img_height)
+                case = f"boxes={num_boxes},kp={num_keypoints}"
+                timings = {}
+                timings.update(bench_render(image, annotations, canvas_size, repeat))
+                timings.update(bench_hit_test(annotations, img_width, img_height, scale_factor, clicks))
+                timings.update(bench_inference(annotations, num_keypoints, repeat))
+                timings.update(bench_save(annotations, img_width, img_height, num_keypoints, repeat, workdir))
+                for name, summary in timings.items():
+                    results[f"{name}[{case}]"] = summary
+                print(f"  {case} done", file=sys.stderr)
+
+        results[f"scan[files={scan_files}]"] = bench_scan(scan_files, repeat, workdir)['scan']
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'image_size': list(image_size),
+            'canvas_size': list(canvas_size),
+            'repeat': repeat,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'results': results
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Compare mean times against a baseline report; returns (lines, regressions)"""
+    lines = [f"{'benchmark':<45}{'baseline ms':>13}{'current ms':>12}{'change':>9}"]
+    regressions = []
+    for name, summary in report['results'].items():
+        if name not in baseline['results']:
+            lines.append(f"{name:<45}{'-':>13}{summary['mean_ms']:>12.3f}{'new':>9}")
+            continue
+        before = baseline['results'][name]['mean_ms']
+        after = summary['mean_ms']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        lines.append(f"{name:<45}{before:>13.3f}{after:>12.3f}{change:>+9.1%}{flag}")
+    return lines, regressions
+
+
+def format_report(report):
+    lines = [f"{'benchmark':<45}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}"]
+    for name, summary in report['results'].items():
+        lines.append(f"{name:<45}{summary['mean_ms']:>10.3f}{summary['p50_ms']:>10.3f}{summary['p95_ms']:>10.3f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the YOLO labeling tool")
+    parser.add_argument('--boxes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="Annotation set sizes")
+    parser.add_argument('--keypoints', type=int, nargs='+', default=[0, 17],
+                        help="Keypoints per box")
+    parser.add_argument('--image-size', type=int, nargs=2, default=[4000, 3000], metavar=('W', 'H'))
+    parser.add_argument('--canvas-size', type=int, nargs=2, default=[1100, 750], metavar=('W', 'H'))
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per timed operation")
+    parser.add_argument('--clicks', type=int, default=1000, help="Mouse presses per hit-test run")
+    parser.add_argument('--scan-files', type=int, default=10000, help="Files in the scanned directory")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against a previous results JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Slowdown (fraction) reported as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.boxes, args.keypoints, tuple(args.image_size), tuple(args.canvas_size),
+                            args.repeat, args.clicks, args.scan_files)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        lines, regressions = compare(report, baseline, args.tolerance)
+        print('\n'.join(lines))
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.tolerance:.0%}")
+            sys.exit(1)
+    else:
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Helpers for the labeled dataset written by the tool
+
+Save & Next writes an output directory laid out as
+
+    output_dir/
+        images/<name>_<key>.jpg
+        labels/<name>_<key>.txt
+        data.yaml        (optional, class names)
+
+Images and labels are paired by file stem.
+"""
+
+import os
+from pathlib import Path
+
+from label_core import IMAGE_EXTENSIONS
+
+
+def scan_files(directory, extensions=None):
+    """Map file stem to path for the files in a directory (empty if it doesn't exist)"""
+    files = {}
+    if extensions is not None:
+        extensions = {ext.lower() for ext in extensions}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if (extensions is None or ext.lower() in extensions) and entry.is_file():
+                    files[stem] = Path(entry.path)
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def scan_dataset(output_dir):
+    """Return ({stem: image_path}, {stem: label_path}) for an output directory"""
+    output_dir = Path(output_dir)
+    images = scan_files(output_dir / 'images', IMAGE_EXTENSIONS)
+    labels = scan_files(output_dir / 'labels', ['.txt'])
+    return images, labels
+
+
+def find_data_yaml(output_dir):
+    """data.yaml in the output directory or the working directory, or None"""
+    for candidate in [Path(output_dir) / 'data.yaml', Path('data.yaml')]:
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def save_class_names(data_yaml, class_names):
+    """Write class names ({class_id: name}) to a data.yaml, keeping its other keys"""
+    import yaml
+
+    data_yaml = Path(data_yaml)
+    data = {}
+    if data_yaml.is_file():
+        with open(data_yaml, 'r') as f:
+            data = yaml.safe_load(f) or {}
+    nc = max(class_names) + 1 if class_names else 0
+    data['nc'] = nc
+    data['names'] = [class_names.get(i, f"class_{i}") for i in range(nc)]
+
+    tmp_path = data_yaml.with_name(data_yaml.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        yaml.safe_dump(data, f, default_flow_style=None, sort_keys=False)
+    os.replace(tmp_path, data_yaml)
+
+
+def load_class_names(data_yaml):
+    """Class names from a data.yaml as {class_id: name}"""
+    import yaml
+
+    with open(data_yaml, 'r') as f:
+        data = yaml.safe_load(f) or {}
+    names = data.get('names') or []
+    if isinstance(names, dict):
+        return {int(k): str(v) for k, v in names.items()}
+    return {i: str(name) for i, name in enumerate(names)}
@@ -0,0 +1,348 @@
+"""Audit the labeled dataset before training
+
+Scans output_dir/labels and output_dir/images and reports class balance
+(with data.yaml names), box size distributions, degenerate and out-of-range
+boxes, keypoint count mismatches and images without labels. Label files are
+parsed in a process pool and the per-file results are cached by mtime in
+output_dir/.audit_cache.json, so re-runs only parse files that changed.
+
+    python dataset_audit.py path/to/output --num-kp 3 --histograms sizes.png
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dataset import find_data_yaml, load_class_names, scan_dataset
+from yolo_format import parse_yolo_line
+
+
+CACHE_NAME = '.audit_cache.json'
+CACHE_VERSION = 1
+
+# Box sizes are counted in fixed bins over the normalized 0-1 range
+SIZE_BINS = 20
+# Boxes narrower or shorter than this (normalized) are degenerate
+DEGENERATE_SIZE = 1e-3
+# Slack for boxes and keypoints just outside the image from rounding
+RANGE_TOLERANCE = 1e-3
+
+# Files processed per task when parsing in parallel
+CHUNK_SIZE = 500
+# Below this many changed files parsing runs in-process
+PARALLEL_MIN_FILES = 2000
+
+
+def _size_bin(value):
+    return min(SIZE_BINS - 1, max(0, int(value * SIZE_BINS)))
+
+
+def audit_label_file(path):
+    """Collect the facts the report needs from one label file
+
+    The result doesn't depend on the audit settings, so it can be cached.
+    """
+    classes = Counter()
+    keypoint_counts = Counter()
+    widths = Counter()
+    heights = Counter()
+    areas = Counter()
+    degenerate = out_of_range = invalid = 0
+
+    low, high = -RANGE_TOLERANCE, 1 + RANGE_TOLERANCE
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            parsed = parse_yolo_line(line)
+            if parsed is None:
+                invalid += 1
+                continue
+
+            x_center, y_center, width, height = parsed['box']
+            classes[parsed['class']] += 1
+            keypoint_counts[len(parsed['keypoints'])] += 1
+            widths[_size_bin(width)] += 1
+            heights[_size_bin(height)] += 1
+            areas[_size_bin(max(width * height, 0) ** 0.5)] += 1
+
+            if width < DEGENERATE_SIZE or height < DEGENERATE_SIZE:
+                degenerate += 1
+            if not (low <= x_center - width / 2 and x_center + width / 2 <= high and
+                    low <= y_center - height / 2 and y_center + height / 2 <= high and
+                    all(low <= kp_x <= high and low <= kp_y <= high
+                        for kp_x, kp_y, visible in parsed['keypoints'] if visible)):
+                out_of_range += 1
+
+    return {
+        'classes': {str(k): v for k, v in classes.items()},
+        'keypoint_counts': {str(k): v for k, v in keypoint_counts.items()},
+        # Sparse {bin: count} keeps the cache small
+        'widths': {str(k): v for k, v in widths.items()},
+        'heights': {str(k): v for k, v in heights.items()},
+        'areas': {str(k): v for k, v in areas.items()},
+        'degenerate': degenerate,
+        'out_of_range': out_of_range,
+        'invalid': invalid
+    }
+
+
+def audit_label_files(paths):
+    """Audit a chunk of label files (runs in a worker process)"""
+    return [(path, audit_label_file(path)) for path in paths]
+
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache.get('files', {})
+
+
+def save_cache(cache_path, files):
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps({'version': CACHE_VERSION, 'files': files}, separators=(',', ':')))
+    os.replace(tmp_path, cache_path)
+
+
+def collect_label_results(output_dir, workers=None, use_cache=True, progress=None):
+    """Per-file audit results for an output directory, parsing only files not in the cache
+
+    Returns (images, labels, results, parsed) where images and labels map
+    stem to path, results maps label stem to audit_label_file's result and
+    parsed is the number of files that had to be read.
+    """
+    output_dir = Path(output_dir)
+    images, labels = scan_dataset(output_dir)
+    cache_path = output_dir / CACHE_NAME
+    cached = load_cache(cache_path) if use_cache else {}
+
+    # Reuse results for files whose mtime and size haven't changed
+    results = {}
+    stale = []
+    signatures = {}
+    for stem, label_path in labels.items():
+        stat = label_path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        signatures[stem] = signature
+        entry = cached.get(label_path.name)
+        if entry is not None and entry[0] == signature:
+            results[stem] = entry[1]
+        else:
+            stale.append(str(label_path))
+
+    if stale:
+        chunks = [stale[i:i + CHUNK_SIZE] for i in range(0, len(stale), CHUNK_SIZE)]
+        done = 0
+        if len(stale) < PARALLEL_MIN_FILES or workers == 1:
+            chunk_results = map(audit_label_files, chunks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            chunk_results = executor.map(audit_label_files, chunks)
+        try:
+            for chunk in chunk_results:
+                for path, result in chunk:
+                    results[Path(path).stem] = result
+                done += len(chunk)
+                if progress:
+                    progress(done, len(stale))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    if use_cache and (stale or len(cached) != len(results)):
+        save_cache(cache_path, {labels[stem].name: [signatures[stem], result]
+                                for stem, result in results.items()})
+
+    return images, labels, results, len(stale)
+
+
+def audit_dataset(output_dir, class_names=None, num_kp_classes=None, workers=None, use_cache=True,
+                  progress=None):
+    """Audit an output directory and return a JSON-serializable report
+
+    class_names ({id: name}) defaults to the names in data.yaml, if found.
+    num_kp_classes, if given, flags boxes with a different number of keypoints.
+    progress, if given, is called with (files_done, files_to_parse).
+    """
+    start_time = time.perf_counter()
+    if class_names is None:
+        data_yaml = find_data_yaml(output_dir)
+        class_names = load_class_names(data_yaml) if data_yaml else {}
+
+    images, labels, results, parsed = collect_label_results(output_dir, workers=workers,
+                                                            use_cache=use_cache, progress=progress)
+
+    report = summarize(results, images, labels, class_names, num_kp_classes)
+    report['parsed'] = parsed
+    report['cached'] = len(labels) - parsed
+    report['seconds'] = time.perf_counter() - start_time
+    return report
+
+
+def summarize(results, images, labels, class_names, num_kp_classes=None):
+    """Combine per-file results into the report"""
+    class_counts = Counter()
+    files_per_class = Counter()
+    keypoint_counts = Counter()
+    widths = [0] * SIZE_BINS
+    heights = [0] * SIZE_BINS
+    areas = [0] * SIZE_BINS
+    issues = {'degenerate': [], 'out_of_range': [], 'invalid_lines': [], 'unknown_class': [],
+              'keypoint_mismatch': [], 'empty': []}
+
+    for stem in sorted(results):
+        result = results[stem]
+        name = labels[stem].name
+        file_classes = {int(k): v for k, v in result['classes'].items()}
+        class_counts.update(file_classes)
+        files_per_class.update(file_classes.keys())
+        for k, v in result['keypoint_counts'].items():
+            keypoint_counts[int(k)] += v
+        for totals, counts in [(widths, result['widths']), (heights, result['heights']),
+                               (areas, result['areas'])]:
+            for i, count in counts.items():
+                totals[int(i)] += count
+
+        if not file_classes and not result['invalid']:
+            issues['empty'].append(name)
+        if result['degenerate']:
+            issues['degenerate'].append(name)
+        if result['out_of_range']:
+            issues['out_of_range'].append(name)
+        if result['invalid']:
+            issues['invalid_lines'].append(name)
+        if class_names and any(class_id not in class_names for class_id in file_classes):
+            issues['unknown_class'].append(name)
+        if num_kp_classes is not None and any(int(k) != num_kp_classes for k in result['keypoint_counts']):
+            issues['keypoint_mismatch'].append(name)
+
+    return {
+        'images': len(images),
+        'labels': len(labels),
+        'boxes': sum(class_counts.values()),
+        'class_names': {str(k): v for k, v in class_names.items()},
+        'class_counts': {str(k): class_counts[k] for k in sorted(class_counts)},
+        'files_per_class': {str(k): files_per_class[k] for k in sorted(files_per_class)},
+        'keypoint_counts': {str(k): keypoint_counts[k] for k in sorted(keypoint_counts)},
+        'width_hist': widths,
+        'height_hist': heights,
+        'size_hist': areas,
+        'images_without_labels': sorted(images[stem].name for stem in images.keys() - labels.keys()),
+        'labels_without_images': sorted(labels[stem].name for stem in labels.keys() - images.keys()),
+        'issues': issues
+    }
+
+
+def _text_histogram(counts, width=40):
+    lines = []
+    peak = max(counts) or 1
+    for i, count in enumerate(counts):
+        low, high = i / SIZE_BINS, (i + 1) / SIZE_BINS
+        lines.append(f"  {low:.2f}-{high:.2f} {count:>9}  {'#' * round(width * count / peak)}")
+    return lines
+
+
+def format_report(report, examples=5, histograms=True):
+    """Human-readable audit report"""
+    names = report['class_names']
+    lines = [f"Images: {report['images']}   Label files: {report['labels']}   Boxes: {report['boxes']}"]
+    if 'seconds' in report:
+        lines.append(f"Audited in {report['seconds']:.2f} s ({report['parsed']} parsed, {report['cached']} cached)")
+
+    lines += ["", f"{'class':<28}{'boxes':>10}{'share':>8}{'files':>10}"]
+    class_ids = sorted({int(k) for k in names} | {int(k) for k in report['class_counts']})
+    for class_id in class_ids:
+        count = report['class_counts'].get(str(class_id), 0)
+        label = f"{class_id} {names.get(str(class_id), '(not in data.yaml)' if names else '')}"
+        share = count / report['boxes'] if report['boxes'] else 0.0
+        lines.append(f"{label:<28}{count:>10}{share:>8.1%}{report['files_per_class'].get(str(class_id), 0):>10}")
+
+    if report['keypoint_counts']:
+        counts = ', '.join(f"{k} kp: {v}" for k, v in report['keypoint_counts'].items())
+        lines += ["", f"Keypoints per box: {counts}"]
+
+    problems = [('Images without labels', report['images_without_labels']),
+                ('Labels without images', report['labels_without_images']),
+                ('Empty label files', report['issues']['empty']),
+                ('Files with degenerate boxes', report['issues']['degenerate']),
+                ('Files with out-of-range boxes/keypoints', report['issues']['out_of_range']),
+                ('Files with unparseable lines', report['issues']['invalid_lines']),
+                ('Files with classes not in data.yaml', report['issues']['unknown_class']),
+                ('Files with keypoint count mismatches', report['issues']['keypoint_mismatch'])]
+    lines.append("")
+    for title, files in problems:
+        lines.append(f"{title}: {len(files)}")
+        for name in files[:examples]:
+            lines.append(f"    {name}")
+        if len(files) > examples:
+            lines.append(f"    ... and {len(files) - examples} more")
+
+    if histograms and report['boxes']:
+        for title, key in [('Box width', 'width_hist'), ('Box height', 'height_hist'),
+                           ('Box size (sqrt of area)', 'size_hist')]:
+            lines += ["", f"{title} (fraction of image):"]
+            lines += _text_histogram(report[key])
+    return '\n'.join(lines)
+
+
+def save_histograms(report, path):
+    """Plot the box size histograms to an image file (needs matplotlib)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    edges = [i / SIZE_BINS for i in range(SIZE_BINS)]
+    for ax, (title, key) in zip(axes, [('Box width', 'width_hist'), ('Box height', 'height_hist'),
+                                       ('Box size (sqrt of area)', 'size_hist')]):
+        ax.bar(edges, report[key], width=1 / SIZE_BINS, align='edge')
+        ax.set_title(title)
+        ax.set_xlabel('fraction of image')
+        ax.set_ylabel('boxes')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit a labeled YOLO dataset")
+    parser.add_argument('output_dir', help="Directory containing images/ and labels/")
+    parser.add_argument('--data', help="data.yaml with class names (default: output_dir/data.yaml or ./data.yaml)")
+    parser.add_argument('--num-kp', type=int, help="Expected keypoints per box")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument('--no-cache', action='store_true', help="Parse every file again")
+    parser.add_argument('--examples', type=int, default=5, help="File names listed per problem")
+    parser.add_argument('--histograms', metavar='IMAGE', help="Also plot box size histograms (needs matplotlib)")
+    parser.add_argument('--json', metavar='FILE', help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.data) if args.data else None
+    report = audit_dataset(args.output_dir, class_names=class_names, num_kp_classes=args.num_kp,
+                           workers=args.workers, use_cache=not args.no_cache)
+    print(format_report(report, examples=args.examples))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.histograms:
+        try:
+            save_histograms(report, args.histograms)
+        except ImportError:
+            print("matplotlib is needed for --histograms", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""Bulk edits of the label files in an output directory
+
+Supported edits, applied to every box line:
+
+- remap classes ({old: new}), e.g. fixing a class mistake across the dataset
+- delete classes
+- drop boxes whose width or height (normalized) is below a minimum
+- drop boxes whose confidence is below a minimum (lines without one are kept)
+- renumber keypoints to a new number of keypoint classes, optionally
+  reordering them (new keypoint i takes old keypoint order[i]; -1 leaves it
+  empty)
+
+Class ids always refer to the labels as they are before the edit. Only files
+that can be affected are opened: the per-file classes, box sizes and
+keypoint counts come from the dataset audit cache. Files are rewritten in a
+process pool, each to a temporary file that is renamed over the original,
+so a file is never left half-written. Finished files are listed in a
+journal (labels/.dataset_edit.journal); re-running the same edit after an
+interruption skips them, which matters for edits like swapping two classes.
+A dry run reports the changes and a few example diffs without writing.
+
+    python dataset_edit.py path/to/output --remap 3:1 --delete 5 --min-size 0.005 --apply
+"""
+
+import argparse
+import difflib
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dataset_audit import SIZE_BINS, collect_label_results
+from yolo_format import format_yolo_line, parse_yolo_line
+
+
+JOURNAL_NAME = '.dataset_edit.journal'
+
+# Files edited per task in the process pool
+CHUNK_SIZE = 500
+# Below this many candidate files editing runs in-process
+PARALLEL_MIN_FILES = 2000
+# Example diffs kept for the dry-run report
+MAX_DIFFS = 5
+DIFF_LINES = 12
+
+
+def make_edit(remap=None, delete=None, min_size=None, min_conf=None, num_kp=None, keypoint_order=None):
+    """Describe a bulk edit as a plain (picklable, JSON-serializable) dict"""
+    keypoints = None
+    if num_kp is not None or keypoint_order is not None:
+        order = list(keypoint_order) if keypoint_order is not None else list(range(num_kp))
+        if num_kp is not None:
+            order = (order + [-1] * num_kp)[:num_kp]
+        keypoints = [i if i is not None and i >= 0 else -1 for i in order]
+    return {
+        'remap': {int(k): int(v) for k, v in (remap or {}).items() if int(k) != int(v)},
+        'delete': sorted({int(c) for c in (delete or [])}),
+        'min_size': min_size or None,
+        'min_conf': min_conf or None,
+        'keypoints': keypoints
+    }
+
+
+def edit_line(line, edit, counts):
+    """Apply an edit to one label line; returns the new line or None to drop it
+
+    counts is updated with (change, class) tallies.
+    """
+    stripped = line.strip()
+    class_token, _, rest = stripped.partition(' ')
+    try:
+        class_id = int(float(class_token))
+    except ValueError:
+        return line  # Blank or invalid lines are left alone
+
+    if class_id in edit['delete']:
+        counts['deleted', class_id] += 1
+        return None
+    new_class = edit['remap'].get(class_id, class_id)
+
+    if not (edit['min_size'] or edit['min_conf'] or edit['keypoints'] is not None):
+        # Class-only edits keep the rest of the line exactly as written
+        if new_class == class_id:
+            return line
+        counts['remapped', class_id] += 1
+        return f"{new_class} {rest}\n"
+
+    parsed = parse_yolo_line(stripped)
+    if parsed is None:
+        return line
+    _, _, width, height = parsed['box']
+    if edit['min_size'] and min(width, height) < edit['min_size']:
+        counts['too_small', class_id] += 1
+        return None
+    if edit['min_conf'] and parsed['conf'] is not None and parsed['conf'] < edit['min_conf']:
+        counts['low_conf', class_id] += 1
+        return None
+
+    keypoints = parsed['keypoints']
+    if edit['keypoints'] is not None:
+        renumbered = [keypoints[i] if 0 <= i < len(keypoints) else (0.0, 0.0, 0) for i in edit['keypoints']]
+        if renumbered != keypoints:
+            counts['keypoints', class_id] += 1
+            keypoints = renumbered
+    if new_class != class_id:
+        counts['remapped', class_id] += 1
+    elif keypoints is parsed['keypoints']:
+        return line
+    return format_yolo_line(new_class, parsed['box'], keypoints, parsed['conf']) + "\n"
+
+
+def edit_label_file(path, edit, dry_run=True, want_diff=False, journal_file=None):
+    """Edit one label file; returns (counts, diff lines) or None if nothing changes
+
+    The file name is added to journal_file between writing the edited copy
+    and renaming it over the original.
+    """
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    counts = Counter()
+    new_lines = []
+    for line in lines:
+        new_line = edit_line(line, edit, counts)
+        if new_line is not None:
+            new_lines.append(new_line)
+    if not counts:
+        if journal_file is not None:
+            journal_file.write(Path(path).name + "\n")
+            journal_file.flush()
+        return None
+
+    diff = []
+    if want_diff:
+        diff = list(difflib.unified_diff(lines, new_lines, Path(path).name, Path(path).name, n=0))[:DIFF_LINES]
+    if not dry_run:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.writelines(new_lines)
+        if journal_file is not None:
+            journal_file.write(Path(path).name + "\n")
+            journal_file.flush()
+        os.replace(tmp_path, path)
+    return counts, diff
+
+
+def edit_label_files(paths, edit, dry_run=True, journal=None, want_diffs=0):
+    """Edit a chunk of label files (runs in a worker process); returns [(path, counts, diff)]"""
+    results = []
+    journal_file = open(journal, 'a') if journal and not dry_run else None
+    try:
+        for path in paths:
+            result = edit_label_file(path, edit, dry_run, len(results) < want_diffs, journal_file)
+            if result is not None:
+                results.append((path, result[0], result[1]))
+    finally:
+        if journal_file is not None:
+            journal_file.close()
+    return results
+
+
+def candidate_stems(results, edit):
+    """Label stems that may change, judged from the audit's per-file results"""
+    classes = set(edit['remap']) | set(edit['delete'])
+    # Boxes in the size bin holding min_size may be smaller than it
+    small_bin = int(edit['min_size'] * SIZE_BINS) if edit['min_size'] else None
+    candidates = set()
+    for stem, result in results.items():
+        if edit['min_conf'] or (edit['keypoints'] is not None and result['keypoint_counts']):
+            candidates.add(stem)
+        elif classes & {int(k) for k in result['classes']}:
+            candidates.add(stem)
+        elif small_bin is not None and any(int(k) <= small_bin for k in list(result['widths']) +
+                                           list(result['heights'])):
+            candidates.add(stem)
+    return candidates
+
+
+def _resume_journal(journal_path, signature):
+    """File names already edited by an interrupted run of the same edit
+
+    Files journaled whose edited copy wasn't renamed yet are finished here.
+    """
+    try:
+        with open(journal_path, 'r') as f:
+            if f.readline().rstrip('\n') != signature:
+                return set()
+            lines = f.read()
+    except OSError:
+        return set()
+
+    if lines and not lines.endswith('\n'):
+        # Interrupted mid-write: that file is redone, and new names must start on a new line
+        lines = lines[:lines.rfind('\n') + 1]
+        with open(journal_path, 'a') as f:
+            f.write("\n")
+    names = set(lines.splitlines())
+    for name in names:
+        tmp_path = Path(journal_path).parent / f"{name}.tmp"
+        if tmp_path.exists():
+            os.replace(tmp_path, tmp_path.with_suffix(''))
+    return names
+
+
+def bulk_edit(output_dir, edit, dry_run=True, workers=None, progress=None):
+    """Apply (or with dry_run, only count) an edit across an output directory's labels
+
+    progress, if given, is called with (files_done, files_to_check).
+    Returns a summary dict (see format_summary).
+    """
+    start_time = time.perf_counter()
+    output_dir = Path(output_dir)
+    _, labels, results, _ = collect_label_results(output_dir, workers=workers)
+
+    journal_path = output_dir / 'labels' / JOURNAL_NAME
+    signature = json.dumps(edit, sort_keys=True)
+    done_names = _resume_journal(journal_path, signature) if not dry_run else set()
+    if not dry_run and not done_names:
+        with open(journal_path, 'w') as f:
+            f.write(signature + "\n")
+
+    paths = [str(labels[stem]) for stem in sorted(candidate_stems(results, edit))
+             if labels[stem].name not in done_names]
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    journal = str(journal_path) if not dry_run else None
+
+    counts = Counter()
+    changed = 0
+    diffs = []
+    executor = None
+    if len(paths) < PARALLEL_MIN_FILES or workers == 1:
+        chunk_results = (edit_label_files(chunk, edit, dry_run, journal, MAX_DIFFS) for chunk in chunks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunk_results = executor.map(edit_label_files, chunks, [edit] * len(chunks), [dry_run] * len(chunks),
+                                     [journal] * len(chunks), [MAX_DIFFS] * len(chunks))
+    done = 0
+    try:
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            for path, file_counts, diff in chunk_result:
+                changed += 1
+                counts.update(file_counts)
+                if diff and len(diffs) < MAX_DIFFS:
+                    diffs.append(diff)
+            done += len(chunk)
+            if progress:
+                progress(done, len(paths))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if not dry_run:
+        os.remove(journal_path)  # Finished: a later run of the same edit starts fresh
+
+    return {
+        'dry_run': dry_run,
+        'files': len(labels),
+        'checked': len(paths),
+        'resumed': len(done_names),
+        'changed': changed,
+        'counts': {f"{change}:{class_id}": n for (change, class_id), n in sorted(counts.items())},
+        'diffs': diffs,
+        'seconds': time.perf_counter() - start_time
+    }
+
+
+CHANGE_LABELS = {
+    'remapped': "boxes remapped from class",
+    'deleted': "boxes deleted of class",
+    'too_small': "boxes too small of class",
+    'low_conf': "boxes below confidence of class",
+    'keypoints': "boxes with keypoints renumbered of class"
+}
+
+
+def format_summary(summary, edit, class_names=None):
+    """Text report of a bulk edit"""
+    class_names = class_names or {}
+
+    def name(class_id):
+        return f"{class_id} ({class_names[class_id]})" if class_id in class_names else str(class_id)
+
+    verb = "would change" if summary['dry_run'] else "changed"
+    lines = [f"{summary['changed']} of {summary['files']} label files {verb} "
+             f"({summary['checked']} checked in {summary['seconds']:.1f} s)"]
+    if summary['resumed']:
+        lines.append(f"{summary['resumed']} files were already edited by an interrupted run")
+    for key, n in summary['counts'].items():
+        change, class_id = key.split(':')
+        line = f"  {n:>8} {CHANGE_LABELS[change]} {name(int(class_id))}"
+        if change == 'remapped':
+            line += f" to {name(edit['remap'][int(class_id)])}"
+        lines.append(line)
+    for diff in summary['diffs']:
+        lines.append("")
+        lines.extend(line.rstrip('\n') for line in diff)
+    return '\n'.join(lines)
+
+
+def parse_remap(text):
+    """{old: new} from "3:1,4:1" """
+    remap = {}
+    for pair in text.replace(' ', '').split(','):
+        if pair:
+            old, new = pair.split(':')
+            remap[int(old)] = int(new)
+    return remap
+
+
+def parse_int_list(text):
+    return [int(value) for value in text.replace(' ', '').split(',') if value]
+
+
+def main():
+    from dataset import find_data_yaml, load_class_names
+
+    parser = argparse.ArgumentParser(description="Bulk edit the label files of an output directory")
+    parser.add_argument('output_dir', help="Directory containing images/ and labels/")
+    parser.add_argument('--remap', type=parse_remap, help="Class changes as OLD:NEW pairs, e.g. 3:1,4:1")
+    parser.add_argument('--delete', type=parse_int_list, help="Classes to delete, e.g. 5,6")
+    parser.add_argument('--min-size', type=float, help="Drop boxes narrower or shorter than this (0-1)")
+    parser.add_argument('--min-conf', type=float, help="Drop boxes with a confidence below this")
+    parser.add_argument('--num-kp', type=int, help="Pad or truncate keypoints to this many per box")
+    parser.add_argument('--keypoint-order', type=parse_int_list,
+                        help="Old keypoint index for each new keypoint (-1 for empty), e.g. 2,0,1")
+    parser.add_argument('--apply', action='store_true', help="Write the changes (default: dry run)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    edit = make_edit(args.remap, args.delete, args.min_size, args.min_conf, args.num_kp, args.keypoint_order)
+    data_yaml = find_data_yaml(args.output_dir)
+    class_names = load_class_names(data_yaml) if data_yaml else {}
+    summary = bulk_edit(args.output_dir, edit, dry_run=not args.apply, workers=args.workers)
+    print(format_summary(summary, edit, class_names))
+    if not args.apply and summary['changed']:
+        print("\nDry run; re-run with --apply to write the changes")
+
+
+if __name__ == '__main__':
+    main()
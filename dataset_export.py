@@ -0,0 +1,233 @@
+"""Export the labeled dataset to COCO JSON and Pascal VOC XML
+
+Image sizes are read from the file headers only (PIL opens images lazily),
+and label files are converted in a process pool. The COCO file is written
+as a stream: images are written as they arrive while their annotations are
+spooled to a temporary file and appended afterwards, so memory doesn't grow
+with the number of annotations.
+
+Keypoint visibility follows the tool's output (see yolo_format.py):
+
+    YOLO "0 0 0" (never placed)      -> COCO v=0, x=y=0
+    YOLO v=0 with coordinates (the
+    "invisible" keypoint, drawn as X) -> COCO v=1 (labeled, not visible)
+    YOLO v=1 or 2 (visible)          -> COCO v=2
+
+COCO category ids are the YOLO class ids plus one. VOC has no keypoints,
+so only boxes are exported there.
+
+    python dataset_export.py path/to/output --coco annotations.json --voc path/to/voc
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from dataset import find_data_yaml, load_class_names, scan_dataset
+from yolo_format import parse_yolo_line
+
+
+# Images converted per task in the process pool
+CHUNK_SIZE = 256
+# Below this many images conversion runs in-process
+PARALLEL_MIN_FILES = 1000
+
+
+def coco_visibility(kp_x, kp_y, visible):
+    """COCO visibility (0 missing, 1 occluded, 2 visible) of a YOLO keypoint"""
+    if visible == 0:
+        return 0 if kp_x == 0 and kp_y == 0 else 1
+    return 2
+
+
+def convert_image(image_path, label_path):
+    """Image size and pixel-space objects [(class, [x, y, w, h], keypoints)] of one image"""
+    with Image.open(image_path) as img:
+        width, height = img.size  # Header only, no decoding
+
+    objects = []
+    if label_path is not None:
+        with open(label_path, 'r') as f:
+            for line in f:
+                parsed = parse_yolo_line(line)
+                if parsed is None:
+                    continue
+                x_center, y_center, box_w, box_h = parsed['box']
+                bbox = [(x_center - box_w / 2) * width, (y_center - box_h / 2) * height,
+                        box_w * width, box_h * height]
+                keypoints = [(kp_x * width, kp_y * height, coco_visibility(kp_x, kp_y, visible))
+                             for kp_x, kp_y, visible in parsed['keypoints']]
+                objects.append((parsed['class'], bbox, keypoints))
+    return {'file_name': Path(image_path).name, 'width': width, 'height': height, 'objects': objects}
+
+
+def write_voc_xml(path, record, class_names):
+    """Write one image's boxes as a Pascal VOC annotation"""
+    root = ET.Element('annotation')
+    ET.SubElement(root, 'folder').text = 'images'
+    ET.SubElement(root, 'filename').text = record['file_name']
+    size = ET.SubElement(root, 'size')
+    ET.SubElement(size, 'width').text = str(record['width'])
+    ET.SubElement(size, 'height').text = str(record['height'])
+    ET.SubElement(size, 'depth').text = '3'
+    ET.SubElement(root, 'segmented').text = '0'
+
+    for class_id, (x, y, w, h), _ in record['objects']:
+        obj = ET.SubElement(root, 'object')
+        ET.SubElement(obj, 'name').text = class_names.get(class_id, str(class_id))
+        ET.SubElement(obj, 'pose').text = 'Unspecified'
+        ET.SubElement(obj, 'truncated').text = '0'
+        ET.SubElement(obj, 'difficult').text = '0'
+        box = ET.SubElement(obj, 'bndbox')
+        # VOC pixel coordinates are 1-based and inclusive
+        ET.SubElement(box, 'xmin').text = str(max(1, min(record['width'], round(x) + 1)))
+        ET.SubElement(box, 'ymin').text = str(max(1, min(record['height'], round(y) + 1)))
+        ET.SubElement(box, 'xmax').text = str(max(1, min(record['width'], round(x + w))))
+        ET.SubElement(box, 'ymax').text = str(max(1, min(record['height'], round(y + h))))
+
+    tmp_path = f"{path}.tmp"
+    ET.ElementTree(root).write(tmp_path, encoding='utf-8', xml_declaration=True)
+    os.replace(tmp_path, path)
+
+
+def convert_chunk(items, voc_dir=None, class_names=None, keep_records=True):
+    """Convert (image_path, label_path) pairs, writing VOC files if voc_dir is set (runs in a worker)"""
+    records = []
+    for image_path, label_path in items:
+        record = convert_image(image_path, label_path)
+        if voc_dir is not None:
+            write_voc_xml(Path(voc_dir) / f"{Path(image_path).stem}.xml", record, class_names or {})
+        records.append(record if keep_records else None)
+    return records
+
+
+def _iter_records(items, voc_dir, class_names, keep_records, workers, progress):
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    executor = None
+    if len(items) < PARALLEL_MIN_FILES or workers == 1:
+        results = (convert_chunk(chunk, voc_dir, class_names, keep_records) for chunk in chunks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(convert_chunk, chunks, [voc_dir] * len(chunks), [class_names] * len(chunks),
+                               [keep_records] * len(chunks))
+    done = 0
+    try:
+        for records in results:
+            yield from records
+            done += len(records)
+            if progress:
+                progress(done, len(items))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def export_dataset(output_dir, coco_path=None, voc_dir=None, class_names=None, workers=None, progress=None):
+    """Export an output directory to COCO JSON and/or VOC XML; returns counts
+
+    class_names defaults to the names in data.yaml, if found.
+    progress, if given, is called with (images_done, total_images).
+    """
+    output_dir = Path(output_dir)
+    if class_names is None:
+        data_yaml = find_data_yaml(output_dir)
+        class_names = load_class_names(data_yaml) if data_yaml else {}
+
+    images, labels = scan_dataset(output_dir)
+    items = [(str(images[stem]), str(labels[stem]) if stem in labels else None) for stem in sorted(images)]
+    if voc_dir is not None:
+        Path(voc_dir).mkdir(parents=True, exist_ok=True)
+
+    records = _iter_records(items, voc_dir, class_names, coco_path is not None, workers, progress)
+    if coco_path is None:
+        for _ in records:
+            pass
+        return {'images': len(items), 'annotations': None}
+    return write_coco(coco_path, records, class_names)
+
+
+def write_coco(path, records, class_names):
+    """Stream image records into a COCO JSON file; returns counts"""
+    classes = set()
+    num_keypoints = 0
+    image_count = annotation_count = 0
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as out, tempfile.TemporaryFile('w+') as annotations:
+        out.write('{"info":{"description":"Exported by YOLO Labeling Tool"},"licenses":[],"images":[')
+        for image_id, record in enumerate(records, 1):
+            if image_id > 1:
+                out.write(',')
+            out.write(json.dumps({'id': image_id, 'file_name': record['file_name'],
+                                  'width': record['width'], 'height': record['height']}))
+            image_count += 1
+
+            for class_id, bbox, keypoints in record['objects']:
+                annotation_count += 1
+                classes.add(class_id)
+                annotation = {
+                    'id': annotation_count,
+                    'image_id': image_id,
+                    'category_id': class_id + 1,
+                    'bbox': [round(v, 2) for v in bbox],
+                    'area': round(bbox[2] * bbox[3], 2),
+                    'iscrowd': 0
+                }
+                if keypoints:
+                    num_keypoints = max(num_keypoints, len(keypoints))
+                    annotation['keypoints'] = [round(v, 2) if i % 3 < 2 else v
+                                               for kp in keypoints for i, v in enumerate(kp)]
+                    annotation['num_keypoints'] = sum(1 for kp in keypoints if kp[2] > 0)
+                if annotation_count > 1:
+                    annotations.write(',')
+                annotations.write(json.dumps(annotation))
+
+        out.write('],"annotations":[')
+        annotations.seek(0)
+        shutil.copyfileobj(annotations, out)
+
+        category_ids = sorted(classes | set(class_names))
+        categories = []
+        for class_id in category_ids:
+            category = {'id': class_id + 1, 'name': class_names.get(class_id, str(class_id)),
+                        'supercategory': 'none'}
+            if num_keypoints:
+                category['keypoints'] = [str(i) for i in range(num_keypoints)]
+                category['skeleton'] = []
+            categories.append(category)
+        out.write('],"categories":' + json.dumps(categories) + '}')
+    os.replace(tmp_path, path)
+
+    return {'images': image_count, 'annotations': annotation_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a labeled YOLO dataset to COCO JSON and/or Pascal VOC")
+    parser.add_argument('output_dir', help="Directory containing images/ and labels/")
+    parser.add_argument('--coco', metavar='JSON', help="Write COCO detection/keypoints JSON here")
+    parser.add_argument('--voc', metavar='DIR', help="Write one VOC XML file per image into this directory")
+    parser.add_argument('--data', help="data.yaml with class names (default: output_dir/data.yaml or ./data.yaml)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not args.coco and not args.voc:
+        parser.error("give --coco and/or --voc")
+
+    class_names = load_class_names(args.data) if args.data else None
+    counts = export_dataset(args.output_dir, coco_path=args.coco, voc_dir=args.voc,
+                            class_names=class_names, workers=args.workers)
+    summary = f"Exported {counts['images']} images"
+    if counts['annotations'] is not None:
+        summary += f" and {counts['annotations']} annotations"
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
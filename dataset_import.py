@@ -0,0 +1,350 @@
+"""Open COCO and Pascal VOC datasets in the labeling tool
+
+COCO annotation files are read incrementally: the JSON is parsed one image,
+annotation or category at a time from a buffered stream, so a file of
+several gigabytes never has to fit in memory. The annotations go into a
+per-image SQLite index in the image directory (.coco_index.sqlite), which
+is reused until the JSON file changes. VOC needs no index since each image
+already has its own XML file.
+
+Both sources return an image's objects on demand as
+(class name, [x1, y1, x2, y2], [(x, y, v), ...]) with pixel coordinates
+and COCO keypoint visibility. ClassMapper turns the names into the tool's
+class ids, matching the model or data.yaml names.
+
+    python dataset_import.py annotations.json path/to/images --show 000000000139.jpg
+"""
+
+import argparse
+import codecs
+import json
+import os
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from pathlib import Path
+
+
+INDEX_NAME = '.coco_index.sqlite'
+COCO_SECTIONS = ('images', 'annotations', 'categories')
+
+READ_SIZE = 1 << 20
+WHITESPACE = re.compile(r'[ \t\r\n]*')
+# Rows inserted per transaction while indexing
+BATCH_SIZE = 10000
+
+
+class JsonStream:
+    """Minimal pull parser over a binary file for JSON too large to load at once"""
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        chunk = self.f.read(READ_SIZE)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the file"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found {found!r} near byte {self.bytes_read}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_coco(f):
+    """Yield (section, item) for every image, annotation and category in a COCO file
+
+    Other top-level keys (info, licenses, ...) are skipped.
+    """
+    stream = JsonStream(f)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        if key in COCO_SECTIONS and stream.peek() == '[':
+            stream.expect('[')
+            if stream.peek() != ']':
+                while True:
+                    yield key, stream.value()
+                    if stream.peek() == ']':
+                        break
+                    stream.expect(',')
+            stream.expect(']')
+        else:
+            stream.value()
+        if stream.peek() == '}':
+            return
+        stream.expect(',')
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return [str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size]
+
+
+def build_coco_index(json_path, index_path, progress=None):
+    """Index a COCO file by image name into SQLite
+
+    progress, if given, is called with (bytes_read, file_size).
+    """
+    total = os.path.getsize(json_path)
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE meta (source TEXT, mtime_ns INTEGER, size INTEGER);
+            CREATE TABLE images (id INTEGER PRIMARY KEY, name TEXT, width INTEGER, height INTEGER);
+            CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT, keypoints INTEGER);
+            CREATE TABLE annotations (image_id INTEGER, category_id INTEGER,
+                                      x REAL, y REAL, w REAL, h REAL, keypoints BLOB);
+        """)
+        rows = {section: [] for section in COCO_SECTIONS}
+
+        def flush():
+            conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)", rows['images'])
+            conn.executemany("INSERT OR REPLACE INTO categories VALUES (?, ?, ?)", rows['categories'])
+            conn.executemany("INSERT INTO annotations VALUES (?, ?, ?, ?, ?, ?, ?)", rows['annotations'])
+            conn.commit()
+            for section_rows in rows.values():
+                section_rows.clear()
+
+        with open(json_path, 'rb') as f:
+            count = 0
+            for section, item in iter_coco(f):
+                if section == 'annotations':
+                    if 'bbox' not in item or item.get('iscrowd'):
+                        continue  # Crowd regions have no single box to edit
+                    keypoints = item.get('keypoints')
+                    # Packed doubles are much cheaper to write and read back than JSON text
+                    rows['annotations'].append((item['image_id'], item['category_id'], *item['bbox'][:4],
+                                                array('d', keypoints).tobytes() if keypoints else None))
+                elif section == 'images':
+                    # Match on the bare file name; COCO names may include a folder
+                    rows['images'].append((item['id'], Path(item['file_name']).name,
+                                           item.get('width'), item.get('height')))
+                else:
+                    rows['categories'].append((item['id'], str(item.get('name', item['id'])),
+                                               len(item.get('keypoints') or [])))
+                count += 1
+                if count % BATCH_SIZE == 0:
+                    flush()
+                    if progress:
+                        progress(f.tell(), total)
+            flush()
+
+        conn.executescript("""
+            CREATE INDEX images_name ON images (name);
+            CREATE INDEX annotations_image ON annotations (image_id);
+        """)
+        conn.execute("INSERT INTO meta VALUES (?, ?, ?)", source_signature(json_path))
+        conn.commit()
+    finally:
+        conn.close()
+    # Only a complete index replaces the old one
+    os.replace(tmp_path, index_path)
+    if progress:
+        progress(total, total)
+
+
+class CocoIndex:
+    """Per-image lookups into an indexed COCO file"""
+
+    def __init__(self, index_path):
+        self.conn = sqlite3.connect(index_path, check_same_thread=False)
+        self.categories = {}
+        self.num_keypoints = 0
+        for category_id, name, keypoints in self.conn.execute(
+                "SELECT id, name, keypoints FROM categories ORDER BY id"):
+            self.categories[category_id] = name
+            self.num_keypoints = max(self.num_keypoints, keypoints or 0)
+
+    def class_names(self):
+        """Category names in category id order"""
+        return list(self.categories.values())
+
+    def objects(self, image_name):
+        """(class name, [x1, y1, x2, y2], keypoints) of each object in an image"""
+        objects = []
+        for category_id, x, y, w, h, keypoints in self.conn.execute(
+                "SELECT category_id, x, y, w, h, a.keypoints FROM images i "
+                "JOIN annotations a ON a.image_id = i.id WHERE i.name = ?", (Path(image_name).name,)):
+            values = array('d', keypoints) if keypoints else []
+            objects.append((self.categories.get(category_id, str(category_id)), [x, y, x + w, y + h],
+                            [(values[k], values[k + 1], int(values[k + 2])) for k in range(0, len(values) - 2, 3)]))
+        return objects
+
+    def counts(self):
+        images = self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        annotations = self.conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+        return images, annotations
+
+
+def open_coco(json_path, index_dir, progress=None):
+    """CocoIndex for a COCO file, indexing it first unless an up-to-date index exists"""
+    index_path = Path(index_dir) / INDEX_NAME
+    if index_path.exists():
+        conn = sqlite3.connect(index_path)
+        try:
+            meta = conn.execute("SELECT source, mtime_ns, size FROM meta").fetchone()
+        except sqlite3.DatabaseError:
+            meta = None
+        finally:
+            conn.close()
+        if meta is not None and list(meta) == source_signature(json_path):
+            return CocoIndex(index_path)
+    build_coco_index(json_path, index_path, progress)
+    return CocoIndex(index_path)
+
+
+class VocAnnotations:
+    """Per-image lookups into a directory of Pascal VOC XML files"""
+
+    num_keypoints = 0
+
+    def __init__(self, xml_dir):
+        self.xml_dir = Path(xml_dir)
+        self.names = []
+
+    def scan(self, progress=None):
+        """Collect the class names of all XML files, so class ids don't depend on browsing order
+
+        progress, if given, is called with (files_read, total_files, 'files').
+        """
+        paths = sorted(self.xml_dir.glob('*.xml'))
+        names = set()
+        for i, path in enumerate(paths, 1):
+            try:
+                names.update(obj.findtext('name', '').strip() for obj in ET.parse(path).getroot().iter('object'))
+            except ET.ParseError:
+                pass  # Reported when the image is opened
+            if progress and (i % 1000 == 0 or i == len(paths)):
+                progress(i, len(paths), 'files')
+        names.discard('')
+        self.names = sorted(names)
+        return self
+
+    def class_names(self):
+        """Class names found by scan(), sorted"""
+        return list(self.names)
+
+    def objects(self, image_name):
+        """(class name, [x1, y1, x2, y2], []) of each object in an image"""
+        path = self.xml_dir / f"{Path(image_name).stem}.xml"
+        if not path.exists():
+            return []
+        objects = []
+        for obj in ET.parse(path).getroot().iter('object'):
+            box = obj.find('bndbox')
+            if box is None:
+                continue
+            xmin, ymin, xmax, ymax = (float(box.findtext(tag, '0')) for tag in ['xmin', 'ymin', 'xmax', 'ymax'])
+            # VOC pixel coordinates are 1-based and inclusive
+            objects.append((obj.findtext('name', '').strip(), [xmin - 1, ymin - 1, xmax, ymax], []))
+        return objects
+
+
+class ClassMapper:
+    """Map dataset class names to the tool's class ids
+
+    Names are matched case-insensitively against the target names (model or
+    data.yaml); names not found there get the next free ids.
+    """
+
+    def __init__(self, target_names=None, source_names=()):
+        self.names = dict(target_names or {})
+        self.ids = {name.lower(): class_id for class_id, name in self.names.items()}
+        for name in source_names:
+            self.class_id(name)  # Number the dataset's own classes in its order
+
+    def class_id(self, name):
+        key = str(name).lower()
+        if key not in self.ids:
+            class_id = max(self.names) + 1 if self.names else 0
+            self.ids[key] = class_id
+            self.names[class_id] = str(name)
+        return self.ids[key]
+
+
+def to_annotations(objects, mapper):
+    """Convert objects from a COCO/VOC source to the tool's box annotations"""
+    annotations = []
+    for name, coords, keypoints in objects:
+        ann = {'type': 'box', 'class': mapper.class_id(name), 'coords': list(coords), 'keypoints': []}
+        for kp_class, (kp_x, kp_y, visible) in enumerate(keypoints):
+            if visible == 0:
+                continue  # Not labeled
+            # COCO 1 (labeled, not visible) is the tool's invisible keypoint
+            ann['keypoints'].append({'class': kp_class, 'coords': (kp_x, kp_y), 'visible': 1 if visible == 2 else 0})
+        annotations.append(ann)
+    return annotations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a COCO file or check a VOC directory for the labeling tool")
+    parser.add_argument('annotations', help="COCO JSON file or directory of VOC XML files")
+    parser.add_argument('images', help="Image directory (the COCO index is stored here)")
+    parser.add_argument('--show', metavar='IMAGE', help="Print the objects of one image")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if os.path.isdir(args.annotations):
+        source = VocAnnotations(args.annotations).scan()
+        print(f"{len(source.names)} classes: {', '.join(source.names)}")
+    else:
+        def progress(done, total):
+            print(f"\rIndexing {done / 1e6:.0f}/{total / 1e6:.0f} MB", end='', flush=True)
+
+        source = open_coco(args.annotations, args.images, progress)
+        images, annotations = source.counts()
+        print(f"\n{images} images, {annotations} annotations, {len(source.categories)} categories "
+              f"({time.perf_counter() - start:.1f} s)")
+
+    if args.show:
+        for name, coords, keypoints in source.objects(args.show):
+            print(f"{name}: {' '.join(f'{v:.1f}' for v in coords)}"
+                  + (f"  ({len(keypoints)} keypoints)" if keypoints else ""))
+
+
+if __name__ == '__main__':
+    main()
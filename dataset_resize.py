@@ -0,0 +1,276 @@
+"""Training-resolution copies of the labeled dataset
+
+Save & Next keeps the full-resolution originals, but training at imgsz=640
+decodes and shrinks every one of them again each epoch. This mirrors the
+output directory into a parallel dataset root (by default
+<output_dir>_<imgsz>) holding images scaled so their long side is imgsz,
+the label files, the train/val/test lists and a data.yaml. Aspect ratios
+are kept, so the normalized labels are valid unchanged.
+
+Images are resized in a process pool (JPEGs are decoded at a reduced scale
+to begin with), and files whose copy is newer than the original are
+skipped, so re-running after a labeling session only handles new images.
+
+    python dataset_resize.py path/to/output --imgsz 640
+"""
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from dataset import find_data_yaml, load_class_names, scan_dataset, scan_files
+from dataset_split import SPLITS, split_entries
+
+
+DEFAULT_IMGSZ = 640
+JPEG_QUALITY = 95
+# Records the imgsz of a root, so copies of another size are never reused
+MARKER_NAME = '.imgsz'
+
+# Images resized per task in the process pool
+CHUNK_SIZE = 32
+# Below this many images to resize work runs in-process
+PARALLEL_MIN_FILES = 64
+
+
+def training_root(output_dir, imgsz):
+    """Default dataset root for copies of an output directory at imgsz"""
+    output_dir = Path(output_dir).resolve()
+    return output_dir.with_name(f"{output_dir.name}_{imgsz}")
+
+
+def resize_for_training(image, imgsz):
+    """Image scaled down so its long side is imgsz (returned as is if already smaller)"""
+    width, height = image.size
+    scale = imgsz / max(width, height)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def save_training_image(image, path):
+    """Save an image atomically in the format its extension names"""
+    path = Path(path)
+    image_format = Image.registered_extensions().get(path.suffix.lower(), 'PNG')
+    options = {}
+    if image_format == 'JPEG':
+        options['quality'] = JPEG_QUALITY
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    tmp_path = path.with_name(path.name + '.tmp')
+    image.save(tmp_path, format=image_format, **options)
+    os.replace(tmp_path, path)
+
+
+def resize_image_file(source, target, imgsz):
+    """Write a training copy of one image file"""
+    with Image.open(source) as img:
+        width, height = img.size
+        if max(width, height) <= imgsz:
+            tmp_path = f"{target}.tmp"
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, target)
+            return
+        scale = imgsz / max(width, height)
+        # JPEGs decode straight to a smaller size that's still at least the target
+        img.draft(img.mode, (round(width * scale), round(height * scale)))
+        save_training_image(resize_for_training(img, imgsz), target)
+
+
+def resize_image_files(pairs, imgsz):
+    """Resize a chunk of (source, target) images (runs in a worker process); returns errors"""
+    errors = []
+    for source, target in pairs:
+        try:
+            resize_image_file(source, target, imgsz)
+        except (OSError, ValueError) as e:
+            errors.append(f"{Path(source).name}: {e}")
+    return errors
+
+
+def _up_to_date(source_stat, target):
+    try:
+        return os.stat(target).st_mtime_ns >= source_stat.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _copy_if_newer(source, target):
+    if not _up_to_date(os.stat(source), target):
+        tmp_path = f"{target}.tmp"
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+
+
+def _copy_split_list(source, target):
+    """Copy an image list, pointing its entries at the copies' images/ directory"""
+    with open(source, 'r') as f:
+        names = [Path(line.strip()).name for line in f if line.strip()]
+    tmp_path = f"{target}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(f"./images/{name}\n" for name in names)
+    os.replace(tmp_path, target)
+
+
+def write_training_yaml(root, output_dir, data_yaml=None):
+    """Write the root's data.yaml with the classes and splits of the output directory (or data_yaml)"""
+    root = Path(root)
+    data_yaml = data_yaml or find_data_yaml(output_dir)
+    data = {}
+    class_names = {}
+    if data_yaml:
+        import yaml
+
+        with open(data_yaml, 'r') as f:
+            data = yaml.safe_load(f) or {}
+        class_names = load_class_names(data_yaml)
+    if not class_names:
+        # No names anywhere: number the classes used in the labels
+        from dataset_audit import collect_label_results
+
+        _, _, results, _ = collect_label_results(output_dir)
+        class_names = {int(k): f"class_{k}" for result in results.values() for k in result['classes']}
+
+    splits = [name for name in SPLITS if (root / f"{name}.txt").exists() and (root / f"{name}.txt").stat().st_size]
+    lines = split_entries(splits) or ["train: images", "val: images"]
+    nc = max(class_names) + 1 if class_names else 0
+    names = [class_names.get(i, f"class_{i}") for i in range(nc)]
+    lines += ["", f"nc: {nc}", f"names: {json.dumps(names)}"]
+    if data.get('kpt_shape'):
+        lines.append(f"kpt_shape: {json.dumps(data['kpt_shape'])}")
+
+    with open(root / 'data.yaml', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def export_training_copies(output_dir, imgsz=DEFAULT_IMGSZ, root=None, workers=None, progress=None,
+                           split_dir=None):
+    """Bring a training-resolution copy of an output directory up to date; returns a summary dict
+
+    root defaults to training_root(output_dir, imgsz). The split lists and
+    data.yaml are taken from split_dir (default output_dir). progress, if
+    given, is called with (images_done, images_to_resize).
+    """
+    output_dir = Path(output_dir)
+    split_dir = Path(split_dir) if split_dir else output_dir
+    root = Path(root) if root else training_root(output_dir, imgsz)
+    images_dir = root / 'images'
+    labels_dir = root / 'labels'
+    images_dir.mkdir(parents=True, exist_ok=True)
+    labels_dir.mkdir(parents=True, exist_ok=True)
+
+    marker = root / MARKER_NAME
+    same_size = marker.exists() and marker.read_text().strip() == str(imgsz)
+    if not same_size and marker.exists():
+        marker.unlink()  # Copies of the old size are all stale
+
+    images, labels = scan_dataset(output_dir)
+    stale = []
+    source_bytes = target_bytes = 0
+    for stem, source in images.items():
+        source_stat = source.stat()
+        source_bytes += source_stat.st_size
+        target = images_dir / source.name
+        if same_size and _up_to_date(source_stat, target):
+            target_bytes += target.stat().st_size
+        else:
+            stale.append((str(source), str(target)))
+
+    for stem, source in labels.items():
+        _copy_if_newer(source, labels_dir / source.name)
+    # Drop copies whose original was removed
+    for directory, sources in [(images_dir, images), (labels_dir, labels)]:
+        for stem, path in scan_files(directory).items():
+            if stem not in sources and path.suffix != '.tmp':
+                path.unlink()
+
+    errors = []
+    if stale:
+        chunks = [stale[i:i + CHUNK_SIZE] for i in range(0, len(stale), CHUNK_SIZE)]
+        executor = None
+        if len(stale) < PARALLEL_MIN_FILES or workers == 1:
+            chunk_results = (resize_image_files(chunk, imgsz) for chunk in chunks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            chunk_results = executor.map(resize_image_files, chunks, [imgsz] * len(chunks))
+        done = 0
+        try:
+            for chunk, chunk_errors in zip(chunks, chunk_results):
+                errors.extend(chunk_errors)
+                for _, target in chunk:
+                    if os.path.exists(target):
+                        target_bytes += os.path.getsize(target)
+                done += len(chunk)
+                if progress:
+                    progress(done, len(stale))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    marker.write_text(f"{imgsz}\n")
+
+    # The copies keep the file names, so list entries become ./images/<file>
+    for name in SPLITS:
+        split_list = split_dir / f"{name}.txt"
+        if split_list.exists():
+            _copy_split_list(split_list, root / f"{name}.txt")
+        elif (root / f"{name}.txt").exists():
+            (root / f"{name}.txt").unlink()
+    split_yaml = split_dir / 'data.yaml'
+    write_training_yaml(root, output_dir, split_yaml if split_yaml.is_file() else None)
+
+    return {
+        'root': str(root),
+        'images': len(images),
+        'resized': len(stale) - len(errors),
+        'up_to_date': len(images) - len(stale),
+        'errors': errors,
+        'source_bytes': source_bytes,
+        'target_bytes': target_bytes
+    }
+
+
+def save_training_copy(image, image_name, label_path, output_dir, imgsz=DEFAULT_IMGSZ):
+    """Add one just-saved image (already in memory) and its label to the training copy"""
+    root = training_root(output_dir, imgsz)
+    (root / 'images').mkdir(parents=True, exist_ok=True)
+    (root / 'labels').mkdir(parents=True, exist_ok=True)
+    save_training_image(resize_for_training(image, imgsz), root / 'images' / image_name)
+    _copy_if_newer(label_path, root / 'labels' / Path(label_path).name)
+    if not (root / MARKER_NAME).exists():
+        (root / MARKER_NAME).write_text(f"{imgsz}\n")
+    if not (root / 'data.yaml').exists():
+        write_training_yaml(root, output_dir)
+
+
+def format_summary(summary):
+    lines = [f"{summary['resized']} images resized, {summary['up_to_date']} already up to date "
+             f"({summary['images']} total) in {summary['root']}",
+             f"Images: {summary['source_bytes'] / 1e6:.1f} MB originals, "
+             f"{summary['target_bytes'] / 1e6:.1f} MB training copies"]
+    if summary['errors']:
+        lines.append(f"{len(summary['errors'])} images failed:")
+        lines += [f"  {error}" for error in summary['errors'][:20]]
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write training-resolution copies of a labeled dataset")
+    parser.add_argument('output_dir', help="Directory containing images/ and labels/")
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ, help="Long side of the copies")
+    parser.add_argument('--root', help="Dataset root for the copies (default: <output_dir>_<imgsz>)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    summary = export_training_copies(args.output_dir, imgsz=args.imgsz, root=args.root, workers=args.workers)
+    print(format_summary(summary))
+    print(f"Train with data={Path(summary['root']) / 'data.yaml'}")
+
+
+if __name__ == '__main__':
+    main()
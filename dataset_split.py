@@ -0,0 +1,286 @@
+"""Train/val/test split export that never copies images
+
+Writes ultralytics image-list files (train.txt, val.txt, test.txt with
+"./images/<file>" entries) next to images/ and labels/ in the output
+directory, plus a data.yaml pointing at them with the class names.
+
+Splits are stratified by each image's rarest class, and can keep groups of
+images together (e.g. frames from the same video or session) using a
+regular expression over the file name. Assignment depends only on the seed
+and the file (or group) names, so re-running gives the same split and new
+images don't reshuffle old ones much. Label classes come from the cached
+per-file results of the dataset audit, so re-runs are fast.
+
+    python dataset_split.py path/to/output --ratios 0.8 0.1 0.1 --seed 0 --group-pattern "^(.+)_\\d+_\\d+$"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from dataset import find_data_yaml, load_class_names, scan_dataset
+from dataset_audit import collect_label_results
+
+
+SPLITS = ['train', 'val', 'test']
+# Split settings saved next to the lists, used to place images labeled later
+SETTINGS_NAME = '.split.json'
+
+# Stratum for images without any boxes (used by ultralytics as background images)
+BACKGROUND = -1
+
+
+def split_key(seed, key):
+    """Deterministic pseudo-random order of a file or group name for a seed"""
+    return int(hashlib.sha1(f"{seed}:{key}".encode('utf-8')).hexdigest()[:16], 16)
+
+
+def group_of(stem, pattern):
+    """Group name of an image: the pattern's first group (or whole match), else the stem"""
+    match = pattern.search(stem)
+    if not match:
+        return stem
+    return match.group(1) if match.groups() else match.group(0)
+
+
+def make_splits(images, results, ratios, seed=0, group_pattern=None):
+    """Assign image stems to splits; returns {split: [stems]}
+
+    results maps label stem to the audit's per-file result (images without
+    one are background images). ratios are the train/val/test fractions.
+    """
+    if isinstance(group_pattern, str):
+        group_pattern = re.compile(group_pattern)
+    total_ratio = sum(ratios)
+    ratios = [ratio / total_ratio for ratio in ratios]
+    active = [i for i, ratio in enumerate(ratios) if ratio > 0]
+
+    class_counts = Counter()
+    for result in results.values():
+        class_counts.update({int(k): v for k, v in result['classes'].items()})
+
+    units = defaultdict(list)  # group -> image stems
+    for stem in images:
+        units[group_of(stem, group_pattern) if group_pattern else stem].append(stem)
+
+    # Each unit is stratified by its rarest class across the whole dataset
+    strata = defaultdict(list)
+    for key, stems in units.items():
+        classes = {int(k) for stem in stems if stem in results for k in results[stem]['classes']}
+        stratum = min(classes, key=lambda c: (class_counts[c], c)) if classes else BACKGROUND
+        strata[stratum].append(key)
+
+    # Shares are counted over all strata so far, so the fractions each small
+    # stratum can't fill carry over to the next one
+    assignment = {}  # unit -> split index
+    assigned = [0] * len(SPLITS)
+    done = 0
+    for stratum in sorted(strata):
+        keys = sorted(strata[stratum], key=lambda key: (split_key(seed, key), key))
+        done += sum(len(units[key]) for key in keys)
+        for key in keys:
+            # Give the unit to the split furthest below its share
+            i = max(active, key=lambda i: ratios[i] * done - assigned[i])
+            assigned[i] += len(units[key])
+            assignment[key] = i
+
+    # Every split with a share gets at least one unit if there are enough,
+    # taken from the largest split's most common stratum
+    stratum_of = {key: stratum for stratum, keys in strata.items() for key in keys}
+    if len(units) >= len(active):
+        for i in active:
+            if i in assignment.values():
+                continue
+            unit_counts = Counter(assignment.values())
+            donor = max(active, key=lambda j: (unit_counts[j], -j))
+            key = max((key for key, j in assignment.items() if j == donor),
+                      key=lambda key: (len(strata[stratum_of[key]]), split_key(seed, key), key))
+            assignment[key] = i
+
+    splits = {name: [] for name in SPLITS}
+    for key, i in assignment.items():
+        splits[SPLITS[i]].extend(units[key])
+    for stems in splits.values():
+        stems.sort()
+    return splits
+
+
+def split_entries(names):
+    """data.yaml lines for the non-empty split lists named
+
+    ultralytics needs a val entry, so train.txt stands in for an empty val.
+    """
+    lines = [f"{name}: {name}.txt" for name in SPLITS if name in names]
+    if 'val' not in names and 'train' in names:
+        lines.insert(1, "val: train.txt")
+    return lines
+
+
+def write_data_yaml(path, list_dir, class_names, splits, num_kp_classes=None):
+    """Write a data.yaml pointing at the split image lists in list_dir
+
+    Keys of an existing file that aren't written here (download, a
+    kpt_shape when num_kp_classes isn't given, ...) are kept.
+    """
+    path = Path(path)
+    list_dir = Path(list_dir)
+    nc = max(class_names) + 1 if class_names else 0
+    names = [class_names.get(i, f"class_{i}") for i in range(nc)]
+
+    extra = {}
+    if path.is_file():
+        import yaml
+
+        with open(path, 'r') as f:
+            extra = yaml.safe_load(f) or {}
+        for key in ['path', 'train', 'val', 'test', 'nc', 'names'] + (['kpt_shape'] if num_kp_classes else []):
+            extra.pop(key, None)
+
+    lines = []
+    # ultralytics resolves the lists against the yaml's own directory by default
+    if path.resolve().parent != list_dir.resolve():
+        lines.append(f"path: {list_dir.resolve()}")
+    lines += split_entries([name for name in SPLITS if splits[name]])
+    lines += ["", f"nc: {nc}", f"names: {json.dumps(names)}"]
+    if num_kp_classes:
+        lines.append(f"kpt_shape: [{num_kp_classes}, 3]")
+    if extra:
+        import yaml
+
+        lines += ["", yaml.safe_dump(extra, default_flow_style=None, sort_keys=False).rstrip('\n')]
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def export_split(output_dir, ratios=(0.8, 0.1, 0.1), seed=0, group_pattern=None, class_names=None,
+                 yaml_path=None, num_kp_classes=None, workers=None, progress=None, list_dir=None):
+    """Write train/val/test image lists and data.yaml; returns a summary dict
+
+    class_names defaults to the names in data.yaml, if found, otherwise the
+    classes in the labels are numbered. The lists go in list_dir (default
+    output_dir; lists elsewhere hold absolute image paths) and yaml_path
+    defaults to list_dir/data.yaml.
+    """
+    output_dir = Path(output_dir)
+    list_dir = Path(list_dir) if list_dir else output_dir
+    list_dir.mkdir(parents=True, exist_ok=True)
+    relative = list_dir.resolve() == output_dir.resolve()
+    if class_names is None:
+        data_yaml = find_data_yaml(output_dir)
+        class_names = load_class_names(data_yaml) if data_yaml else {}
+
+    images, labels, results, _ = collect_label_results(output_dir, workers=workers, progress=progress)
+    splits = make_splits(images, results, ratios, seed=seed, group_pattern=group_pattern)
+
+    summary = {}
+    for name in SPLITS:
+        class_counts = Counter()
+        with open(list_dir / f"{name}.txt", 'w') as f:
+            for stem in splits[name]:
+                f.write(f"./images/{images[stem].name}\n" if relative else f"{images[stem].resolve()}\n")
+                if stem in results:
+                    class_counts.update({int(k): v for k, v in results[stem]['classes'].items()})
+        summary[name] = {'images': len(splits[name]), 'boxes': dict(sorted(class_counts.items()))}
+
+    # Name any classes in the labels that data.yaml doesn't cover
+    seen = {int(k) for result in results.values() for k in result['classes']}
+    class_names = dict(class_names)
+    for class_id in seen - class_names.keys():
+        class_names[class_id] = f"class_{class_id}"
+
+    write_data_yaml(yaml_path or list_dir / 'data.yaml', list_dir, class_names, splits, num_kp_classes)
+    with open(list_dir / SETTINGS_NAME, 'w') as f:
+        json.dump({'ratios': list(ratios), 'seed': seed,
+                   'group_pattern': getattr(group_pattern, 'pattern', group_pattern)}, f)
+    return summary
+
+
+def extend_split(output_dir, split_dir, target_dir):
+    """Write split_dir's lists to target_dir with images not in any list added; returns {split: added}
+
+    An added image joins the split holding images of its group (using the
+    group pattern the split was exported with), otherwise train, so images
+    labeled after the split are used without moving any listed image.
+    Lists in target_dir hold absolute image paths.
+    """
+    output_dir, split_dir, target_dir = Path(output_dir), Path(split_dir), Path(target_dir)
+    images, _ = scan_dataset(output_dir)
+    try:
+        with open(split_dir / SETTINGS_NAME, 'r') as f:
+            group_pattern = json.load(f).get('group_pattern')
+    except (OSError, ValueError):
+        group_pattern = None
+    group_pattern = re.compile(group_pattern) if group_pattern else None
+
+    splits = {}
+    listed = {}  # stem -> split
+    for name in SPLITS:
+        splits[name] = []
+        split_list = split_dir / f"{name}.txt"
+        if split_list.exists():
+            with open(split_list, 'r') as f:
+                for line in f:
+                    stem = Path(line.strip()).stem
+                    if line.strip() and stem in images:
+                        splits[name].append(stem)
+                        listed[stem] = name
+
+    group_splits = {group_of(stem, group_pattern): name for stem, name in listed.items()} if group_pattern else {}
+    added = Counter()
+    for stem in sorted(images.keys() - listed.keys()):
+        name = group_splits.get(group_of(stem, group_pattern), 'train') if group_pattern else 'train'
+        splits[name].append(stem)
+        added[name] += 1
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for name in SPLITS:
+        with open(target_dir / f"{name}.txt", 'w') as f:
+            f.writelines(f"{images[stem].resolve()}\n" for stem in splits[name])
+    return dict(added)
+
+
+def format_summary(summary, class_names=None):
+    class_names = class_names or {}
+    lines = []
+    for name, stats in summary.items():
+        boxes = ', '.join(f"{class_names.get(k, k)}: {v}" for k, v in stats['boxes'].items()) or 'no boxes'
+        lines.append(f"{name:<6}{stats['images']:>9} images  ({boxes})")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a train/val/test split as image lists")
+    parser.add_argument('output_dir', help="Directory containing images/ and labels/")
+    parser.add_argument('--ratios', type=float, nargs=3, default=[0.8, 0.1, 0.1],
+                        metavar=('TRAIN', 'VAL', 'TEST'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--group-pattern',
+                        help="Regex over the file name whose first group names the image's group "
+                             "(e.g. source video); groups are never split")
+    parser.add_argument('--data', help="data.yaml with class names (default: output_dir/data.yaml or ./data.yaml)")
+    parser.add_argument('--yaml', help="Where to write the generated data.yaml (default: in the lists' directory)")
+    parser.add_argument('--list-dir', help="Where to write train/val/test.txt (default: output_dir)")
+    parser.add_argument('--num-kp', type=int, help="Keypoints per box, written as kpt_shape")
+    parser.add_argument('--workers', type=int, help="Worker processes for reading labels")
+    args = parser.parse_args()
+
+    if min(args.ratios) < 0 or sum(args.ratios) <= 0:
+        parser.error("ratios must be non-negative and not all zero")
+
+    class_names = load_class_names(args.data) if args.data else None
+    summary = export_split(args.output_dir, ratios=args.ratios, seed=args.seed,
+                           group_pattern=args.group_pattern, class_names=class_names,
+                           yaml_path=args.yaml, num_kp_classes=args.num_kp, workers=args.workers,
+                           list_dir=args.list_dir)
+    print(format_summary(summary))
+
+
+if __name__ == '__main__':
+    main()
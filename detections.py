@@ -0,0 +1,82 @@
+"""Plain-data detections shared by the labeling tool and the inference server
+
+A detection is a dict with the same shape everywhere so it can cross process
+boundaries as JSON:
+
+    {'class': int, 'coords': [x1, y1, x2, y2], 'conf': float,
+     'keypoints': [[x, y, conf], ...] or None}
+"""
+
+
+def results_to_detections(results):
+    """Convert an ultralytics Results object to a list of detection dicts"""
+    detections = []
+    boxes = results.boxes
+    if boxes is None or len(boxes) == 0:
+        return detections
+
+    xyxy = boxes.xyxy.cpu().numpy()
+    classes = boxes.cls.cpu().numpy()
+    confs = boxes.conf.cpu().numpy()
+
+    # Pose models also return keypoints with shape (num_boxes, num_keypoints, 2 or 3)
+    kp_data = None
+    if hasattr(results, 'keypoints') and results.keypoints is not None:
+        kp_data = results.keypoints.data.cpu().numpy()
+
+    for idx in range(len(xyxy)):
+        x1, y1, x2, y2 = xyxy[idx]
+        detection = {
+            'class': int(classes[idx]),
+            'coords': [float(x1), float(y1), float(x2), float(y2)],
+            'conf': float(confs[idx]),
+            'keypoints': None
+        }
+        if kp_data is not None:
+            keypoints = []
+            for kp_point in kp_data[idx]:
+                kp_conf = float(kp_point[2]) if len(kp_point) > 2 else 1.0
+                keypoints.append([float(kp_point[0]), float(kp_point[1]), kp_conf])
+            detection['keypoints'] = keypoints
+        detections.append(detection)
+
+    return detections
+
+
+def detections_to_annotations(detections, kp_conf_threshold=0.5):
+    """Convert detection dicts to the tool's box annotation format"""
+    annotations = []
+    for detection in detections:
+        box_ann = {
+            'type': 'box',
+            'class': detection['class'],
+            'coords': list(detection['coords']),
+            'keypoints': []
+        }
+
+        # Consider keypoint visible if confidence > threshold
+        for kp_class, (kp_x, kp_y, kp_conf) in enumerate(detection.get('keypoints') or []):
+            if kp_conf > kp_conf_threshold:
+                box_ann['keypoints'].append({
+                    'class': kp_class,
+                    'coords': (kp_x, kp_y),
+                    'visible': 1
+                })
+
+        annotations.append(box_ann)
+
+    return annotations
+
+
+def box_iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes"""
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def has_keypoints(detections):
+    """Return True if the detections came from a pose model"""
+    return any(detection.get('keypoints') is not None for detection in detections)
@@ -0,0 +1,180 @@
+"""Carry annotations forward to the next frame of a video sequence
+
+Each box is tracked on its own by template matching: the box's pixels in
+the previous frame are searched for in a window around the box in the next
+frame using normalized cross-correlation, first at a coarse scale and then
+refined at a finer one. Keypoints move with their box. Only the box
+regions are cropped and compared, so a frame takes milliseconds however
+large the images are, and no model inference is needed.
+
+Boxes that can't be found with confidence (occlusion, large motion, flat
+texture) are left where they were for the annotator to fix.
+
+    python frame_propagation.py frame_0001.jpg frame_0002.jpg labels/frame_0001.txt --output labels/frame_0002.txt
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+# Longest template side (pixels) at the coarse and refinement scales
+COARSE_SIZE = 24
+REFINE_SIZE = 96
+# Coarse search reaches this fraction of the box size in each direction,
+# and at least MIN_SEARCH pixels
+SEARCH_MARGIN = 0.5
+MIN_SEARCH = 48
+# Refinement searches this many coarse pixels around the coarse match
+REFINE_MARGIN = 2
+# Matches below this correlation are treated as lost
+MIN_SCORE = 0.5
+# Boxes smaller than this (pixels) aren't tracked
+MIN_BOX_SIZE = 4
+
+
+def grey_region(image, box, width, height):
+    """Greyscale float array of an integer image region resized to width x height"""
+    region = image.crop(box).convert('L').resize((width, height), Image.Resampling.BILINEAR)
+    return np.asarray(region, dtype=np.float32)
+
+
+def _subpixel(before, peak, after):
+    """Offset of a parabola's vertex through three samples around a peak"""
+    curvature = float(before) - 2 * peak + float(after)
+    if curvature >= 0:
+        return 0.0
+    return 0.5 * (float(before) - float(after)) / curvature
+
+
+def ncc_match(template, search):
+    """(row, col, score) of the best normalized cross-correlation of template within search
+
+    row and col are refined to sub-pixel positions.
+    """
+    template = template - template.mean()
+    template_norm = np.sqrt((template * template).sum())
+    if template_norm < 1e-3:
+        return None  # Flat region: any position matches
+
+    windows = sliding_window_view(search, template.shape)
+    n = template.size
+    # sum((w - mean(w)) * t) == sum(w * t) because t has zero mean
+    numerator = np.einsum('ijkl,kl->ij', windows, template)
+    window_sums = windows.sum(axis=(2, 3))
+    window_sq = np.einsum('ijkl,ijkl->ij', windows, windows)
+    variance = np.maximum(window_sq - window_sums * window_sums / n, 1e-6)
+    scores = numerator / (np.sqrt(variance) * template_norm)
+
+    row, col = np.unravel_index(np.argmax(scores), scores.shape)
+    peak = float(scores[row, col])
+    sub_row, sub_col = float(row), float(col)
+    if 0 < row < scores.shape[0] - 1:
+        sub_row += _subpixel(scores[row - 1, col], peak, scores[row + 1, col])
+    if 0 < col < scores.shape[1] - 1:
+        sub_col += _subpixel(scores[row, col - 1], peak, scores[row, col + 1])
+    return sub_row, sub_col, peak
+
+
+def _clamp_box(box, width, height):
+    x1, y1, x2, y2 = box
+    return (max(0, int(round(min(x1, x2)))), max(0, int(round(min(y1, y2)))),
+            min(width, int(round(max(x1, x2)))), min(height, int(round(max(y1, y2)))))
+
+
+def track_box(prev_image, next_image, coords):
+    """(dx, dy, score) of a box's movement between two frames, or None if it can't be tracked"""
+    x1, y1, x2, y2 = _clamp_box(coords, *prev_image.size)
+    box_w, box_h = x2 - x1, y2 - y1
+    if box_w < MIN_BOX_SIZE or box_h < MIN_BOX_SIZE:
+        return None
+
+    dx = dy = 0.0
+    margin_x = max(box_w * SEARCH_MARGIN, MIN_SEARCH)
+    margin_y = max(box_h * SEARCH_MARGIN, MIN_SEARCH)
+    match = None
+    for size in [COARSE_SIZE, REFINE_SIZE]:
+        scale = min(1.0, size / max(box_w, box_h))
+        template_w, template_h = max(2, round(box_w * scale)), max(2, round(box_h * scale))
+        template = grey_region(prev_image, (x1, y1, x2, y2), template_w, template_h)
+
+        search_box = _clamp_box((x1 + dx - margin_x, y1 + dy - margin_y, x2 + dx + margin_x, y2 + dy + margin_y),
+                                *next_image.size)
+        search_w = round((search_box[2] - search_box[0]) * template_w / box_w)
+        search_h = round((search_box[3] - search_box[1]) * template_h / box_h)
+        if search_w < template_w or search_h < template_h:
+            return None  # Box has (nearly) left the frame
+        search = grey_region(next_image, search_box, search_w, search_h)
+
+        match = ncc_match(template, search)
+        if match is None:
+            return None
+        row, col, _ = match
+        # Back to image pixels using the search region's actual scale
+        dx = search_box[0] + col * (search_box[2] - search_box[0]) / search_w - x1
+        dy = search_box[1] + row * (search_box[3] - search_box[1]) / search_h - y1
+        margin_x = REFINE_MARGIN * box_w / template_w
+        margin_y = REFINE_MARGIN * box_h / template_h
+    return dx, dy, match[2]
+
+
+def propagate_annotations(prev_image, next_image, annotations):
+    """Move box annotations from one frame to the next; returns (annotations, boxes not found)"""
+    width, height = next_image.size
+    carried = []
+    lost = 0
+    for ann in annotations:
+        if ann['type'] != 'box':
+            continue
+        match = track_box(prev_image, next_image, ann['coords'])
+        if match is None or match[2] < MIN_SCORE:
+            dx = dy = 0.0
+            lost += 1
+        else:
+            dx, dy, _ = match
+
+        x1, y1, x2, y2 = ann['coords']
+        carried.append({
+            'type': 'box',
+            'class': ann['class'],
+            'coords': [min(max(x1 + dx, 0), width), min(max(y1 + dy, 0), height),
+                       min(max(x2 + dx, 0), width), min(max(y2 + dy, 0), height)],
+            'keypoints': [{'class': kp['class'], 'coords': (kp['coords'][0] + dx, kp['coords'][1] + dy),
+                           'visible': kp['visible']} for kp in ann.get('keypoints', [])]
+        })
+    return carried, lost
+
+
+def main():
+    from yolo_format import annotation_to_line, label_file_keypoint_count, read_label_file
+
+    parser = argparse.ArgumentParser(description="Carry YOLO labels from one video frame to the next")
+    parser.add_argument('prev_image', help="Frame the labels belong to")
+    parser.add_argument('next_image', help="Following frame")
+    parser.add_argument('labels', help="YOLO label file of the previous frame")
+    parser.add_argument('--output', help="Write the next frame's labels here (default: stdout)")
+    args = parser.parse_args()
+
+    prev_image = Image.open(args.prev_image)
+    next_image = Image.open(args.next_image)
+    annotations = read_label_file(args.labels, *prev_image.size)
+
+    start = time.perf_counter()
+    carried, lost = propagate_annotations(prev_image, next_image, annotations)
+    elapsed = time.perf_counter() - start
+
+    num_kp_classes = label_file_keypoint_count(args.labels)
+    lines = [annotation_to_line(ann, *next_image.size, num_kp_classes) for ann in carried]
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+    else:
+        print('\n'.join(lines))
+    print(f"Carried {len(carried)} boxes ({lost} not found) in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
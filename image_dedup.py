@@ -0,0 +1,240 @@
+"""Near-duplicate detection with perceptual hashes
+
+Each image gets a 64-bit difference hash (dHash): the image is shrunk to
+9x8 grey pixels and each bit records whether a pixel is brighter than its
+right neighbour. Near-identical frames have hashes a few bits apart.
+
+Hashes are computed in a process pool and stored in the image directory in
+a small SQLite database (.phash.sqlite), keyed by file name, mtime and size,
+so only new or changed images are hashed when the directory is re-indexed.
+Clustering walks the images in order and looks each one up in a
+multi-index hash table of cluster representatives, so it never compares
+every pair.
+
+    python image_dedup.py path/to/images --threshold 6
+"""
+
+import argparse
+import itertools
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from label_core import scan_image_directory
+
+
+HASH_SIZE = 8
+DB_NAME = '.phash.sqlite'
+DEFAULT_THRESHOLD = 6
+
+# Images hashed per task in the process pool
+CHUNK_SIZE = 256
+# Below this many new images hashing runs in-process
+PARALLEL_MIN_FILES = 500
+
+
+def dhash(path):
+    """64-bit difference hash of an image file"""
+    with Image.open(path) as img:
+        # JPEGs decode at a reduced scale, which is most of the speed-up
+        img.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+        small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+if hasattr(int, 'bit_count'):  # Python 3.10+
+    def hamming(a, b):
+        return (a ^ b).bit_count()
+else:
+    def hamming(a, b):
+        return bin(a ^ b).count('1')
+
+
+def hash_files(paths):
+    """Hash a chunk of images (runs in a worker process); unreadable images get None"""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, dhash(path)))
+        except (OSError, ValueError):
+            results.append((path, None))
+    return results
+
+
+def update_hash_index(directory, image_paths=None, workers=None, progress=None):
+    """Hash new or changed images in a directory and return {path: hash}
+
+    image_paths defaults to the directory's images. progress, if given, is
+    called with (images_done, images_to_hash).
+    """
+    directory = Path(directory)
+    if image_paths is None:
+        image_paths = scan_image_directory(directory)
+
+    conn = sqlite3.connect(directory / DB_NAME)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS hashes "
+                     "(name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, hash TEXT)")
+        stored = {name: (mtime_ns, size, value)
+                  for name, mtime_ns, size, value in conn.execute("SELECT name, mtime_ns, size, hash FROM hashes")}
+
+        hashes = {}
+        stale = []
+        signatures = {}
+        for path in image_paths:
+            stat = os.stat(path)
+            signatures[str(path)] = (stat.st_mtime_ns, stat.st_size)
+            entry = stored.get(Path(path).name)
+            if entry is not None and entry[:2] == signatures[str(path)]:
+                if entry[2] is not None:
+                    hashes[Path(path)] = int(entry[2], 16)
+            else:
+                stale.append(str(path))
+
+        if stale:
+            chunks = [stale[i:i + CHUNK_SIZE] for i in range(0, len(stale), CHUNK_SIZE)]
+            executor = None
+            if len(stale) < PARALLEL_MIN_FILES or workers == 1:
+                chunk_results = map(hash_files, chunks)
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                chunk_results = executor.map(hash_files, chunks)
+            done = 0
+            try:
+                for chunk in chunk_results:
+                    rows = []
+                    for path, value in chunk:
+                        mtime_ns, size = signatures[path]
+                        # 64-bit hashes don't fit SQLite's signed integers, so they're stored as hex
+                        rows.append((Path(path).name, mtime_ns, size, None if value is None else f"{value:016x}"))
+                        if value is not None:
+                            hashes[Path(path)] = value
+                    conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", rows)
+                    conn.commit()  # Progress survives an interrupted run
+                    done += len(chunk)
+                    if progress:
+                        progress(done, len(stale))
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+    finally:
+        conn.close()
+
+    return hashes
+
+
+class MultiIndexHash:
+    """Lookup of "any stored hash within d bits of this one" through hash tables
+
+    Hashes are split into BANDS substrings, each indexed in its own table.
+    Two hashes within d bits have at least one band that differs by at most
+    d // BANDS bits (pigeonhole), so only those few bit flips per band are
+    looked up instead of comparing against every stored hash.
+    """
+
+    BANDS = 4
+
+    def __init__(self):
+        self.band_bits = 64 // self.BANDS
+        self.band_mask = (1 << self.band_bits) - 1
+        self.tables = [{} for _ in range(self.BANDS)]
+        self.flip_masks = {}  # radius -> XOR masks with up to radius bits set
+
+    def _bands(self, value):
+        return [(value >> (band * self.band_bits)) & self.band_mask for band in range(self.BANDS)]
+
+    def _flips(self, radius):
+        if radius not in self.flip_masks:
+            masks = [0]
+            for bits in range(1, radius + 1):
+                for positions in itertools.combinations(range(self.band_bits), bits):
+                    masks.append(sum(1 << position for position in positions))
+            self.flip_masks[radius] = masks
+        return self.flip_masks[radius]
+
+    def add(self, value, item):
+        for table, key in zip(self.tables, self._bands(value)):
+            table.setdefault(key, []).append((value, item))
+
+    def find(self, value, threshold):
+        """(distance, item) of the closest entry within threshold, or None"""
+        best = None
+        masks = self._flips(threshold // self.BANDS)
+        for table, key in zip(self.tables, self._bands(value)):
+            for mask in masks:
+                for candidate, item in table.get(key ^ mask, ()):
+                    distance = hamming(value, candidate)
+                    if distance <= threshold and (best is None or distance < best[0]):
+                        best = (distance, item)
+        return best
+
+
+def cluster_duplicates(image_paths, hashes, threshold=DEFAULT_THRESHOLD):
+    """Group near-duplicate images; returns {representative: [duplicates]}
+
+    Images are visited in order and join an earlier representative within
+    threshold bits of them (the previous image's, if it is, otherwise the
+    closest), otherwise they start a new cluster. Distances are always to
+    the representative, so slow drift such as a pan starts new clusters.
+    Images without a hash are their own cluster.
+    """
+    index = MultiIndexHash()
+    clusters = {}
+    previous = None  # (representative's hash, representative) of the last image
+    for path in image_paths:
+        value = hashes.get(path)
+        if value is None:
+            clusters[path] = []
+            continue
+
+        # Consecutive frames usually belong to the previous image's cluster
+        if previous is not None and hamming(value, previous[0]) <= threshold:
+            representative = previous[1]
+        else:
+            match = index.find(value, threshold)
+            representative = match[1] if match else None
+
+        if representative is None:
+            representative = path
+            clusters[path] = []
+            index.add(value, path)
+        else:
+            clusters[representative].append(path)
+        previous = (hashes[representative], representative)
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate images with perceptual hashes")
+    parser.add_argument('directory', help="Image directory (the hash index is stored here)")
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help="Maximum Hamming distance (of 64 bits) for near-duplicates")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument('--list', action='store_true', help="List each cluster's duplicates")
+    args = parser.parse_args()
+
+    image_paths = scan_image_directory(args.directory)
+    hashes = update_hash_index(args.directory, image_paths, workers=args.workers)
+    clusters = cluster_duplicates(image_paths, hashes, args.threshold)
+
+    duplicates = sum(len(dups) for dups in clusters.values())
+    print(f"{len(image_paths)} images, {len(clusters)} unique, {duplicates} near-duplicates "
+          f"(threshold {args.threshold})")
+    if args.list:
+        for representative, dups in clusters.items():
+            if dups:
+                print(f"{representative.name}: {' '.join(path.name for path in dups)}")
+
+
+if __name__ == '__main__':
+    main()
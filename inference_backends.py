@@ -0,0 +1,298 @@
+"""Pluggable inference backends for the YOLO labeling tool
+
+Every backend wraps a YOLO model and returns plain detections (see
+detections.py), so the labeling tool and the inference server don't care
+which runtime produced them:
+
+- pytorch:     the .pt weights run by ultralytics (the original behaviour)
+- onnxruntime: the weights exported once to ONNX, optionally int8-quantized
+- openvino:    the weights exported once to OpenVINO IR, optionally int8
+
+Exports are cached next to the weights and only redone when the .pt file is
+newer than the export.
+
+Compare latency and agreement with the .pt output on a folder of images:
+
+    python inference_backends.py best.pt path/to/images --int8
+"""
+
+import argparse
+import shutil
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from detections import box_iou, results_to_detections
+
+
+BACKENDS = ['pytorch', 'onnxruntime', 'openvino']
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp']
+
+
+class InferenceBackend:
+    """Runs a YOLO model with ultralytics and returns plain detections"""
+
+    name = 'pytorch'
+
+    def __init__(self, model_path, int8=False, data=None):
+        self.model_path = str(model_path)
+        self.int8 = int8
+        self.data = data  # Calibration dataset for int8 OpenVINO export
+        self.model = None
+
+    @property
+    def names(self):
+        return dict(getattr(self.model, 'names', {}) or {})
+
+    def weights_path(self):
+        """Path of the model file this backend actually runs"""
+        return self.model_path
+
+    def load(self):
+        from ultralytics import YOLO
+        self.model = YOLO(self.weights_path())
+        return self
+
+    def predict(self, source, conf, iou, imgsz=None, **kwargs):
+        """Run the model on one source or a list of sources
+
+        Returns a list with one detection list per source.
+        """
+        predict_args = {'conf': conf, 'iou': iou, 'verbose': False}
+        if imgsz:
+            predict_args['imgsz'] = imgsz
+        predict_args.update(kwargs)
+        results = self.model(source, **predict_args)
+        return [results_to_detections(result) for result in results]
+
+    def warmup(self, imgsz=640):
+        """Run one forward pass on a blank image so the first real inference isn't slow"""
+        import numpy as np
+        self.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), conf=0.5, iou=0.5)
+
+
+class _ExportedBackend(InferenceBackend, ABC):
+    """Backend that runs an export of the .pt weights, created on first load"""
+
+    @abstractmethod
+    def exported_path(self):
+        """Where the export of the weights is cached"""
+
+    @abstractmethod
+    def export(self, target):
+        """Export the weights to target"""
+
+    def weights_path(self):
+        target = self.exported_path()
+        if not _is_up_to_date(target, self.model_path):
+            self.export(target)
+        return str(target)
+
+    def _export_with_ultralytics(self, **export_args):
+        from ultralytics import YOLO
+        return Path(YOLO(self.model_path).export(**export_args))
+
+
+class OnnxRuntimeBackend(_ExportedBackend):
+    name = 'onnxruntime'
+
+    def exported_path(self, int8=None):
+        weights = Path(self.model_path)
+        suffix = '_int8' if (self.int8 if int8 is None else int8) else ''
+        return weights.with_name(f"{weights.stem}{suffix}.onnx")
+
+    def export(self, target):
+        if not self.int8:
+            # Dynamic axes so the same export serves batches and other image sizes
+            exported = self._export_with_ultralytics(format='onnx', dynamic=True)
+            if exported != target:
+                exported.replace(target)
+            return
+
+        # int8 is quantized from the fp32 export, which is only kept if it is
+        # also the fp32 backend's cache
+        fp32_path = self.exported_path(int8=False)
+        keep_fp32 = fp32_path.exists()
+        if _is_up_to_date(fp32_path, self.model_path):
+            exported = fp32_path
+        else:
+            exported = self._export_with_ultralytics(format='onnx', dynamic=True)
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(exported), str(target), weight_type=QuantType.QUInt8)
+        if exported.exists() and not (keep_fp32 and exported == fp32_path):
+            exported.unlink()
+
+
+class OpenVINOBackend(_ExportedBackend):
+    name = 'openvino'
+
+    def exported_path(self):
+        weights = Path(self.model_path)
+        suffix = '_int8' if self.int8 else ''
+        return weights.with_name(f"{weights.stem}{suffix}_openvino_model")
+
+    def export(self, target):
+        export_args = {'format': 'openvino', 'dynamic': True, 'int8': self.int8}
+        if self.int8 and self.data:
+            export_args['data'] = self.data
+        exported = self._export_with_ultralytics(**export_args)
+        if exported != target:
+            if target.exists():
+                shutil.rmtree(target)
+            shutil.move(str(exported), str(target))
+
+
+_BACKEND_CLASSES = {
+    'pytorch': InferenceBackend,
+    'onnxruntime': OnnxRuntimeBackend,
+    'openvino': OpenVINOBackend
+}
+
+
+def get_backend(name, model_path, int8=False, data=None):
+    """Create and load the named backend for a model file"""
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown inference backend: {name}")
+    return _BACKEND_CLASSES[name](model_path, int8=int8, data=data).load()
+
+
+def _is_up_to_date(target, source):
+    target = Path(target)
+    return target.exists() and target.stat().st_mtime >= Path(source).stat().st_mtime
+
+
+def detection_agreement(reference, candidate, iou_threshold=0.5, kp_conf_threshold=0.5):
+    """Measure how well candidate detections agree with reference detections
+
+    Both arguments are lists (one entry per image) of detection lists.
+    Boxes are matched greedily by IoU within the same class.
+    """
+    matched = 0
+    reference_count = 0
+    candidate_count = 0
+    ious = []
+    kp_errors = []
+
+    for ref_dets, cand_dets in zip(reference, candidate):
+        reference_count += len(ref_dets)
+        candidate_count += len(cand_dets)
+
+        pairs = []
+        for i, ref in enumerate(ref_dets):
+            for j, cand in enumerate(cand_dets):
+                if ref['class'] == cand['class']:
+                    iou = box_iou(ref['coords'], cand['coords'])
+                    if iou >= iou_threshold:
+                        pairs.append((iou, i, j))
+        pairs.sort(reverse=True)
+
+        used_ref = set()
+        used_cand = set()
+        for iou, i, j in pairs:
+            if i in used_ref or j in used_cand:
+                continue
+            used_ref.add(i)
+            used_cand.add(j)
+            matched += 1
+            ious.append(iou)
+
+            # Keypoint error in pixels for keypoints both backends consider visible
+            for ref_kp, cand_kp in zip(ref_dets[i].get('keypoints') or [], cand_dets[j].get('keypoints') or []):
+                if ref_kp[2] > kp_conf_threshold and cand_kp[2] > kp_conf_threshold:
+                    kp_errors.append(((ref_kp[0] - cand_kp[0]) ** 2 + (ref_kp[1] - cand_kp[1]) ** 2) ** 0.5)
+
+    return {
+        'precision': matched / candidate_count if candidate_count else 1.0,
+        'recall': matched / reference_count if reference_count else 1.0,
+        'mean_iou': sum(ious) / len(ious) if ious else None,
+        'kp_error_px': sum(kp_errors) / len(kp_errors) if kp_errors else None
+    }
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def compare_backends(model_path, image_paths, backends=BACKENDS, int8=False, data=None,
+                     conf=0.5, iou=0.4):
+    """Time each backend on the images and compare its detections with the .pt output"""
+    image_paths = [str(path) for path in image_paths]
+    if not image_paths:
+        raise ValueError("No images to compare on")
+
+    # The PyTorch output is the reference, so it always runs first
+    order = ['pytorch'] + [name for name in backends if name != 'pytorch']
+
+    report = []
+    reference = None
+    for name in order:
+        try:
+            backend = get_backend(name, model_path, int8=int8 and name != 'pytorch', data=data)
+        except Exception as e:
+            report.append({'backend': name, 'error': str(e)})
+            continue
+
+        # Warm-up run so one-off initialization isn't counted
+        backend.predict(image_paths[0], conf=conf, iou=iou)
+
+        latencies = []
+        outputs = []
+        for path in image_paths:
+            start = time.perf_counter()
+            outputs.append(backend.predict(path, conf=conf, iou=iou)[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        if reference is None:
+            reference = outputs
+
+        row = {
+            'backend': name + (' (int8)' if backend.int8 else ''),
+            'mean_ms': sum(latencies) / len(latencies),
+            'p50_ms': _percentile(latencies, 0.5),
+            'p95_ms': _percentile(latencies, 0.95)
+        }
+        row.update(detection_agreement(reference, outputs))
+        report.append(row)
+
+    return report
+
+
+def format_report(report):
+    """Format a compare_backends report as a text table"""
+    header = f"{'backend':<20}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'precision':>11}{'recall':>9}{'mean IoU':>10}{'kp err px':>11}"
+    lines = [header, '-' * len(header)]
+    for row in report:
+        if 'error' in row:
+            lines.append(f"{row['backend']:<20}failed: {row['error']}")
+            continue
+        mean_iou = f"{row['mean_iou']:.3f}" if row['mean_iou'] is not None else '-'
+        kp_error = f"{row['kp_error_px']:.2f}" if row['kp_error_px'] is not None else '-'
+        lines.append(f"{row['backend']:<20}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+                     f"{row['precision']:>11.3f}{row['recall']:>9.3f}{mean_iou:>10}{kp_error:>11}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends against the .pt model")
+    parser.add_argument('model', help="YOLO .pt model file")
+    parser.add_argument('images', help="Directory of images to run on")
+    parser.add_argument('--backends', nargs='+', default=BACKENDS, choices=BACKENDS)
+    parser.add_argument('--int8', action='store_true', help="Quantize exported models to int8")
+    parser.add_argument('--data', help="Calibration data.yaml for int8 OpenVINO export")
+    parser.add_argument('--limit', type=int, default=50, help="Maximum number of images to use")
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.4)
+    args = parser.parse_args()
+
+    image_paths = sorted(path for path in Path(args.images).iterdir()
+                         if path.suffix.lower() in IMAGE_EXTENSIONS)[:args.limit]
+    report = compare_backends(args.model, image_paths, backends=args.backends, int8=args.int8,
+                              data=args.data, conf=args.conf, iou=args.iou)
+    print(f"Compared on {len(image_paths)} images")
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
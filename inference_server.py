@@ -0,0 +1,332 @@
+"""Shared inference server for the YOLO labeling tool
+
+A single process owns the YOLO models and serves every labeling tool window
+on the machine over a Unix socket, so each annotator no longer holds their
+own copy of the model in RAM. Image pixels are passed through shared memory
+and requests that arrive close together are batched into one forward pass.
+
+Start it before (or while) the labeling tools are running:
+
+    python inference_server.py --preload best.pt
+
+When the server is not running the labeling tool falls back to loading the
+model in its own process.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+from inference_backends import BACKENDS, get_backend
+
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    'YOLO_INFERENCE_SOCKET',
+    os.path.join(tempfile.gettempdir(), f"yolo_inference_{getattr(os, 'getuid', lambda: 0)()}.sock")
+)
+
+
+class InferenceServerError(Exception):
+    """Raised when the inference server reports a failure"""
+
+
+def send_message(sock, message):
+    """Send a length-prefixed JSON message"""
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data)
+
+
+def recv_message(sock):
+    """Receive a length-prefixed JSON message, or None if the peer closed"""
+    header = _recv_exact(sock, 4)
+    if header is None:
+        return None
+    (length,) = struct.unpack('>I', header)
+    data = _recv_exact(sock, length)
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def _attach_shared_memory(name):
+    """Attach to a client's shared memory block without taking ownership of it"""
+    shm = shared_memory.SharedMemory(name=name)
+    # The client creates and unlinks the block; stop our resource tracker from
+    # unlinking it (and warning about leaks) when the server exits.
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+class InferenceClient:
+    """Client used by the labeling tool to talk to the inference server"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def available(self):
+        """Check whether a server is listening on the socket"""
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(self.socket_path):
+            return False
+        try:
+            with self._connect():
+                return True
+        except OSError:
+            return False
+
+    def load_model(self, model_path, backend='pytorch', int8=False):
+        """Ask the server to load a model and return its class names"""
+        response = self._request({
+            'op': 'load',
+            'model': os.path.abspath(model_path),
+            'backend': backend,
+            'int8': int8
+        })
+        return _parse_names(response.get('names'))
+
+    def predict(self, model_path, image, conf, iou, imgsz=None, backend='pytorch', int8=False):
+        """Run inference on a PIL image, returning (detections, class names)"""
+        rgb_image = image if image.mode == 'RGB' else image.convert('RGB')
+        pixels = rgb_image.tobytes()
+
+        shm = shared_memory.SharedMemory(create=True, size=len(pixels))
+        try:
+            shm.buf[:len(pixels)] = pixels
+            response = self._request({
+                'op': 'predict',
+                'model': os.path.abspath(model_path),
+                'backend': backend,
+                'int8': int8,
+                'shm': shm.name,
+                'width': rgb_image.width,
+                'height': rgb_image.height,
+                'conf': conf,
+                'iou': iou,
+                'imgsz': imgsz
+            })
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return response['detections'], _parse_names(response.get('names'))
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, message):
+        with self._connect() as sock:
+            send_message(sock, message)
+            response = recv_message(sock)
+        if response is None:
+            raise InferenceServerError("Inference server closed the connection")
+        if 'error' in response:
+            raise InferenceServerError(response['error'])
+        return response
+
+
+def _parse_names(names):
+    # JSON turns the integer class ids into strings
+    if not names:
+        return {}
+    return {int(class_id): name for class_id, name in names.items()}
+
+
+class _PendingRequest:
+    def __init__(self, message):
+        self.message = message
+        self.response = None
+        self.done = threading.Event()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if message is None:
+                return
+
+            op = message.get('op')
+            if op == 'load':
+                try:
+                    model = self.server.get_model(message['model'], message.get('backend', 'pytorch'),
+                                                  message.get('int8', False))
+                    response = {'names': model.names}
+                except Exception as e:
+                    response = {'error': f"Failed to load model: {str(e)}"}
+            elif op == 'predict':
+                # Hand the request to the batching thread and wait for its result
+                pending = _PendingRequest(message)
+                self.server.pending.put(pending)
+                pending.done.wait()
+                response = pending.response
+            else:
+                response = {'error': f"Unknown operation: {op}"}
+
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+# Unix sockets are not available on Windows; keep the module importable there
+# so the labeling tool can still use the client (which then reports unavailable)
+_UnixStreamServer = getattr(socketserver, 'UnixStreamServer', socketserver.TCPServer)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, _UnixStreamServer):
+    """Unix socket server that batches inference requests across clients"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, max_batch=8, batch_window=0.01):
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.models = {}
+        self.models_lock = threading.Lock()
+        self.pending = queue.Queue()
+        super().__init__(socket_path, _RequestHandler)
+
+        self.batch_thread = threading.Thread(target=self._batch_loop, daemon=True)
+        self.batch_thread.start()
+
+    def get_model(self, model_path, backend='pytorch', int8=False):
+        """Load a model backend on first use and keep it for every later request"""
+        key = (model_path, backend, int8)
+        with self.models_lock:
+            if key not in self.models:
+                model = get_backend(backend, model_path, int8=int8)
+                model.warmup()
+                self.models[key] = model
+            return self.models[key]
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.pending.get()]
+
+            # Give other clients a short window to join this forward pass
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Only requests for the same model and settings can share a batch
+            groups = {}
+            for pending in batch:
+                message = pending.message
+                key = (message['model'], message.get('backend', 'pytorch'), message.get('int8', False),
+                       message['conf'], message['iou'], message.get('imgsz'))
+                groups.setdefault(key, []).append(pending)
+
+            for key, requests in groups.items():
+                self._run_batch(key, requests)
+
+    def _run_batch(self, key, requests):
+        import numpy as np
+
+        model_path, backend, int8, conf, iou, imgsz = key
+        try:
+            model = self.get_model(model_path, backend, int8)
+
+            images = []
+            for pending in requests:
+                message = pending.message
+                shm = _attach_shared_memory(message['shm'])
+                try:
+                    pixels = np.ndarray((message['height'], message['width'], 3),
+                                        dtype=np.uint8, buffer=shm.buf)
+                    # ultralytics expects numpy images in BGR order; copy so the
+                    # client can release the block as soon as we reply
+                    images.append(np.ascontiguousarray(pixels[..., ::-1]))
+                    del pixels
+                finally:
+                    shm.close()
+
+            batch_detections = model.predict(images, conf=conf, iou=iou, imgsz=imgsz)
+            for pending, detections in zip(requests, batch_detections):
+                pending.response = {'detections': detections, 'names': model.names}
+        except Exception as e:
+            for pending in requests:
+                pending.response = {'error': f"Inference failed: {str(e)}"}
+        finally:
+            for pending in requests:
+                pending.done.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared YOLO inference server for the labeling tool")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH,
+                        help="Unix socket path (default: %(default)s)")
+    parser.add_argument('--max-batch', type=int, default=8,
+                        help="Maximum number of images per forward pass")
+    parser.add_argument('--batch-window', type=float, default=0.01,
+                        help="Seconds to wait for other clients before running a batch")
+    parser.add_argument('--preload', nargs='*', default=[],
+                        help="Model files to load at startup")
+    parser.add_argument('--backend', default='pytorch', choices=BACKENDS,
+                        help="Backend used for preloaded models")
+    parser.add_argument('--int8', action='store_true',
+                        help="Preload int8-quantized exports")
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        if InferenceClient(args.socket).available():
+            parser.exit(1, f"An inference server is already running on {args.socket}\n")
+        # Stale socket left behind by a server that did not shut down cleanly
+        os.unlink(args.socket)
+
+    server = InferenceServer(args.socket, max_batch=args.max_batch, batch_window=args.batch_window)
+    for model_path in args.preload:
+        server.get_model(os.path.abspath(model_path), args.backend, args.int8)
+        print(f"Loaded {model_path}")
+
+    print(f"Inference server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Annotation rendering and hit-testing without Tk
+
+The labeling tool draws its overlay with PIL and hit-tests in image
+coordinates; keeping that logic here means it can run (and be benchmarked)
+without a Tk root. YOLOLabelTool delegates to these functions.
+"""
+
+import os
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp']
+
+CLASS_COLORS = ['red', 'blue', 'green', 'yellow', 'cyan', 'magenta',
+                'orange', 'purple', 'pink', 'lime', 'navy', 'teal']
+
+HANDLE_SIZE = 6
+KEYPOINT_RADIUS = 4
+
+
+def get_class_color(class_id):
+    """Get color for a given class ID"""
+    return CLASS_COLORS[class_id % len(CLASS_COLORS)]
+
+
+def is_preview(ann):
+    """Check if a box is an unedited low-resolution inference preview"""
+    return ann.get('source') == 'preview' and not ann.get('edited')
+
+
+def scan_image_directory(directory):
+    """List the supported images in a directory, sorted by path"""
+    extensions = set(IMAGE_EXTENSIONS) | {ext.upper() for ext in IMAGE_EXTENSIONS}
+    image_list = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1] in extensions and entry.is_file():
+                image_list.append(Path(entry.path))
+    image_list.sort()
+    return image_list
+
+
+def fit_scale(img_width, img_height, canvas_width, canvas_height):
+    """Scale factor and display size that fit an image in the canvas (never enlarged)"""
+    scale_factor = min(canvas_width / img_width, canvas_height / img_height, 1.0)
+    return scale_factor, int(img_width * scale_factor), int(img_height * scale_factor)
+
+
+def resize_for_display(image, display_width, display_height):
+    """Resize the image to its on-screen size"""
+    return image.resize((display_width, display_height), Image.Resampling.LANCZOS)
+
+
+def draw_dashed_rectangle(draw, coords, color, width, dash=8):
+    """Draw a rectangle outline with dashed lines"""
+    x1, y1, x2, y2 = coords
+    for start, end in [((x1, y1), (x2, y1)), ((x2, y1), (x2, y2)),
+                       ((x2, y2), (x1, y2)), ((x1, y2), (x1, y1))]:
+        length = max(abs(end[0] - start[0]), abs(end[1] - start[1]))
+        for offset in range(0, int(length), dash * 2):
+            t1 = offset / length
+            t2 = min(offset + dash, length) / length
+            draw.line([start[0] + (end[0] - start[0]) * t1, start[1] + (end[1] - start[1]) * t1,
+                       start[0] + (end[0] - start[0]) * t2, start[1] + (end[1] - start[1]) * t2],
+                      fill=color, width=width)
+
+
+def draw_annotations(display_img, annotations, scale_factor, selected_idx=None, model_names=None):
+    """Draw boxes, labels, keypoints and selection handles onto a display-sized image"""
+    model_names = model_names or {}
+    draw = ImageDraw.Draw(display_img)
+
+    for i, ann in enumerate(annotations):
+        if ann['type'] != 'box':
+            continue
+
+        x1, y1, x2, y2 = ann['coords']
+        x1_s = int(x1 * scale_factor)
+        y1_s = int(y1 * scale_factor)
+        x2_s = int(x2 * scale_factor)
+        y2_s = int(y2 * scale_factor)
+
+        color = get_class_color(ann['class'])
+        width = 3 if i == selected_idx else 2
+        preview = is_preview(ann)
+        if preview:
+            # Low-resolution preview still waiting for refinement
+            draw_dashed_rectangle(draw, [x1_s, y1_s, x2_s, y2_s], color, width)
+        else:
+            draw.rectangle([x1_s, y1_s, x2_s, y2_s], outline=color, width=width)
+
+        # Draw label text above box (top left)
+        # Use class name from model if available, otherwise show "Class X"
+        if ann['class'] in model_names:
+            label_text = model_names[ann['class']]
+        else:
+            label_text = f"Class {ann['class']}"
+        if preview:
+            label_text += " (preview)"
+        text_bbox = draw.textbbox((0, 0), label_text)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+        text_y = y1_s - text_height - 5
+        if text_y < 0:
+            text_y = y1_s + 2
+        draw.rectangle([x1_s, text_y, x1_s + text_width + 4, text_y + text_height + 4],
+                       fill=color)
+        draw.text((x1_s + 2, text_y + 2), label_text, fill='white')
+
+        # Draw keypoints
+        radius = KEYPOINT_RADIUS
+        for kp in ann.get('keypoints', []):
+            kp_x, kp_y = kp['coords']
+            kp_x_s = int(kp_x * scale_factor)
+            kp_y_s = int(kp_y * scale_factor)
+            kp_color = get_class_color(kp['class'])
+
+            if kp['visible']:
+                # Visible keypoint - solid fill
+                draw.ellipse([kp_x_s-radius, kp_y_s-radius, kp_x_s+radius, kp_y_s+radius],
+                             fill=kp_color, outline='white', width=2)
+                # Draw keypoint class label
+                draw.text((kp_x_s + 6, kp_y_s - 6), f"{kp['class']}", fill=kp_color)
+            else:
+                # Invisible keypoint - outlined with X
+                draw.ellipse([kp_x_s-radius, kp_y_s-radius, kp_x_s+radius, kp_y_s+radius],
+                             outline='gray', width=2)
+                draw.line([kp_x_s-radius, kp_y_s-radius, kp_x_s+radius, kp_y_s+radius], fill='gray', width=2)
+                draw.line([kp_x_s-radius, kp_y_s+radius, kp_x_s+radius, kp_y_s-radius], fill='gray', width=2)
+                # Draw keypoint class label in gray
+                draw.text((kp_x_s + 6, kp_y_s - 6), f"{kp['class']}", fill='gray')
+
+        # Draw handles for selected box
+        if i == selected_idx:
+            handle_size = HANDLE_SIZE
+            # Corners
+            for x, y in [(x1_s, y1_s), (x2_s, y1_s), (x1_s, y2_s), (x2_s, y2_s)]:
+                draw.rectangle([x-handle_size, y-handle_size, x+handle_size, y+handle_size],
+                               fill='blue', outline='white')
+            # Edges
+            for x, y in [(x1_s, (y1_s+y2_s)//2), (x2_s, (y1_s+y2_s)//2),
+                         ((x1_s+x2_s)//2, y1_s), ((x1_s+x2_s)//2, y2_s)]:
+                draw.rectangle([x-handle_size, y-handle_size, x+handle_size, y+handle_size],
+                               fill='yellow', outline='white')
+
+    return draw
+
+
+def find_handle(coords, img_x, img_y, threshold):
+    """Return the resize handle ('tl', 'r', ...) of a box at a position, or None"""
+    x1, y1, x2, y2 = coords
+
+    # Check corners
+    if abs(img_x - x1) < threshold and abs(img_y - y1) < threshold:
+        return 'tl'  # top-left
+    if abs(img_x - x2) < threshold and abs(img_y - y1) < threshold:
+        return 'tr'  # top-right
+    if abs(img_x - x1) < threshold and abs(img_y - y2) < threshold:
+        return 'bl'  # bottom-left
+    if abs(img_x - x2) < threshold and abs(img_y - y2) < threshold:
+        return 'br'  # bottom-right
+
+    # Check edges
+    if abs(img_x - x1) < threshold and y1 <= img_y <= y2:
+        return 'l'  # left
+    if abs(img_x - x2) < threshold and y1 <= img_y <= y2:
+        return 'r'  # right
+    if abs(img_y - y1) < threshold and x1 <= img_x <= x2:
+        return 't'  # top
+    if abs(img_y - y2) < threshold and x1 <= img_x <= x2:
+        return 'b'  # bottom
+
+    return None
+
+
+def find_box_at(annotations, img_x, img_y):
+    """Index of the first box containing a position, or None"""
+    for i, ann in enumerate(annotations):
+        if ann['type'] == 'box':
+            x1, y1, x2, y2 = ann['coords']
+            if x1 <= img_x <= x2 and y1 <= img_y <= y2:
+                return i
+    return None
+
+
+def find_keypoint_at(keypoints, img_x, img_y, threshold):
+    """Index of the first keypoint within threshold of a position, or None"""
+    for idx, kp in enumerate(keypoints):
+        kp_x, kp_y = kp['coords']
+        distance = ((img_x - kp_x)**2 + (img_y - kp_y)**2)**0.5
+        if distance < threshold:
+            return idx
+    return None
@@ -1,10 +1,37 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
 import os
+import sys
 import json
+import time
+import queue
+import argparse
+import threading
+import subprocess
 from pathlib import Path
-from ultralytics import YOLO
+from active_learning import (SCORE_CONF, cached_score, file_signature, labeled_stems, load_scores, model_key,
+                             next_unlabeled, pick_next, save_scores, score_images)
+from annotation_merge import MERGE_POLICIES, match_boxes, merge_predictions
+from background_training import DEFAULT_POSE_WEIGHTS, DEFAULT_WEIGHTS, parse_event
+from dataset import find_data_yaml, load_class_names, save_class_names
+from dataset_audit import audit_dataset, format_report
+from dataset_edit import bulk_edit, make_edit, parse_int_list, parse_remap, format_summary as format_edit_summary
+from dataset_export import export_dataset
+from dataset_import import ClassMapper, VocAnnotations, open_coco, to_annotations
+from dataset_resize import DEFAULT_IMGSZ, export_training_copies, save_training_copy, training_root
+from dataset_resize import format_summary as format_resize_summary
+from dataset_split import export_split, extend_split, format_summary
+from label_core import (draw_annotations, find_box_at, find_handle, find_keypoint_at, fit_scale,
+                        get_class_color, is_preview, resize_for_display, scan_image_directory)
+from detections import detections_to_annotations, has_keypoints
+from frame_propagation import propagate_annotations
+from image_dedup import DEFAULT_THRESHOLD, cluster_duplicates, update_hash_index
+from inference_backends import BACKENDS, get_backend
+from inference_server import InferenceClient, InferenceServerError
+from session_replay import RECORDER, recorded
+from tracing import TRACER, traced
+from yolo_format import write_label_file
 
 
 class YOLOLabelTool:
@@ -14,7 +41,11 @@ class YOLOLabelTool:
         self.root.geometry("1200x800")
 
         # Data storage
-        self.image_list = []
+        self.image_list = []  # Images shown in the list (near-duplicates may be hidden)
+        self.all_images = []  # Every image in the directory
+        self.image_hashes = {}  # Perceptual hashes for near-duplicate detection
+        self.duplicate_counts = {}  # Hidden near-duplicates per shown image
+        self.image_scores = {}  # Uncertainty of unlabeled images (see active_learning.py)
         self.current_image_idx = None  # Track current image index
         self.current_image_path = None
         self.current_image = None
@@ -38,18 +69,65 @@ class YOLOLabelTool:
         # Key counter for unique naming
         self.key_counter = self.load_key_counter()
 
+        # Persistent settings (last used model etc.)
+        self.settings = self.load_settings()
+
         # YOLO model
-        self.model = None
+        self.model = None  # Inference backend (see inference_backends.py)
         self.model_path = None
+        self.model_loading = False  # Models load in a background thread
         self.model_names = {}  # Store class names from model
         self.inference_params = {
             'conf': 0.5,
             'iou': 0.4,
             'show': False,
-            'save': False
+            'save': False,
+            'backend': 'pytorch',
+            'int8': False,
+            'progressive': True,  # Quick low-resolution preview, then full-resolution refinement
+            'preview_imgsz': 320,
+            'refine_imgsz': 0,  # 0 = model's own image size
+            # Merging predictions with existing boxes (see annotation_merge.py)
+            'merge_iou': 0.5,
+            'merge_policy': 'keep_manual',
+            'merge_class_aware': True
         }
 
+        # Optional shared inference server (see inference_server.py)
+        self.inference_client = InferenceClient()
+
+        # Background work: the model is shared between threads, and worker
+        # threads hand results back to Tk through the UI queue
+        self.model_lock = threading.Lock()
+        self.interactive_inference = threading.Event()  # Background scoring waits while this is set
+        self.ui_queue = queue.Queue()
+        self.inference_generation = 0  # Bumped to discard stale background results
+        self.deleted_previews = []  # Preview boxes deleted while their refinement runs
+        self.scoring_generation = 0  # Bumped to stop background uncertainty scoring
+        self.training_process = None  # Background training (see background_training.py)
+        self.training_starting = False  # Set while the split and copies are prepared, until training ends
+        self.pending_model = None  # Improved weights waiting for the current model load to finish
+        self.import_source = None  # Imported COCO/VOC annotations (see dataset_import.py)
+        self.import_classes = None  # Maps the imported dataset's class names to class ids
+        self.import_generation = 0  # Bumped when another directory is opened
+
         self.setup_ui()
+        self.poll_ui_queue()
+
+    def run_on_ui(self, callback):
+        """Schedule a callback on the Tk thread (safe to call from worker threads)"""
+        self.ui_queue.put(callback)
+
+    def poll_ui_queue(self):
+        """Run callbacks queued by worker threads"""
+        try:
+            while True:
+                callback = self.ui_queue.get_nowait()
+                callback()
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(50, self.poll_ui_queue)
 
     def load_key_counter(self):
         """Load the last used key counter from file"""
@@ -67,11 +145,27 @@ class YOLOLabelTool:
         with open(counter_file, 'w') as f:
             json.dump({'counter': self.key_counter}, f)
 
+    def load_settings(self):
+        """Load persistent settings from file"""
+        settings_file = Path("yolo_gui/settings.json")
+        if settings_file.exists():
+            try:
+                with open(settings_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def save_settings(self):
+        """Save persistent settings to file"""
+        settings_file = Path("yolo_gui/settings.json")
+        settings_file.parent.mkdir(exist_ok=True)
+        with open(settings_file, 'w') as f:
+            json.dump(self.settings, f, indent=2)
+
     def get_class_color(self, class_id):
         """Get color for a given class ID"""
-        colors = ['red', 'blue', 'green', 'yellow', 'cyan', 'magenta',
-                  'orange', 'purple', 'pink', 'lime', 'navy', 'teal']
-        return colors[class_id % len(colors)]
+        return get_class_color(class_id)
 
     def setup_ui(self):
         # Main container
@@ -112,6 +206,25 @@ class YOLOLabelTool:
         list_scroll.config(command=self.image_listbox.yview)
         self.image_listbox.bind('<<ListboxSelect>>', self.on_image_select)
 
+        # Near-duplicate frames (see image_dedup.py)
+        dedup_frame = tk.Frame(right_frame)
+        dedup_frame.pack(fill=tk.X, pady=(5, 0))
+        self.hide_duplicates_var = tk.BooleanVar(value=self.settings.get('hide_duplicates', False))
+        tk.Checkbutton(dedup_frame, text="Hide near-duplicates", variable=self.hide_duplicates_var,
+                       command=self.on_duplicate_settings_change).pack(side=tk.LEFT)
+        self.duplicate_threshold_var = tk.StringVar(
+            value=str(self.settings.get('duplicate_threshold', DEFAULT_THRESHOLD)))
+        threshold_spinbox = tk.Spinbox(dedup_frame, from_=0, to=32, width=3,
+                                       textvariable=self.duplicate_threshold_var,
+                                       command=self.on_duplicate_settings_change)
+        threshold_spinbox.pack(side=tk.RIGHT)
+        threshold_spinbox.bind('<Return>', lambda e: self.on_duplicate_settings_change())
+
+        # Video sequences: start the next frame from this frame's boxes (see frame_propagation.py)
+        self.propagate_var = tk.BooleanVar(value=self.settings.get('propagate_annotations', False))
+        tk.Checkbutton(right_frame, text="Carry boxes to next frame", variable=self.propagate_var,
+                       command=self.on_propagate_change).pack(anchor=tk.W)
+
         # Mode selection
         mode_frame = tk.LabelFrame(left_frame, text="Annotation Mode", padx=5, pady=5)
         mode_frame.pack(fill=tk.X, pady=5)
@@ -184,34 +297,751 @@ class YOLOLabelTool:
                             command=self.save_and_next, bg='lightgreen')
         btn_save.pack(fill=tk.X, pady=2)
 
+        # Menu bar
+        menubar = tk.Menu(self.root)
+        self.root.config(menu=menubar)
+
+        perf_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Performance", menu=perf_menu)
+        self.trace_var = tk.BooleanVar(value=TRACER.enabled)
+        perf_menu.add_checkbutton(label="Trace Latency", variable=self.trace_var,
+                                  command=self.toggle_tracing)
+        perf_menu.add_command(label="Export Chrome Trace...", command=self.export_trace)
+        perf_menu.add_separator()
+        perf_menu.add_command(label="Record Session...", command=self.record_session)
+        perf_menu.add_command(label="Stop Recording", command=self.stop_recording)
+
+        dataset_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Dataset", menu=dataset_menu)
+        dataset_menu.add_command(label="Audit Labels...", command=self.audit_labels)
+        dataset_menu.add_command(label="Bulk Edit Labels...", command=self.open_bulk_edit)
+        dataset_menu.add_command(label="Export Train/Val/Test Split...", command=self.open_split_export)
+        dataset_menu.add_command(label="Export COCO JSON...", command=self.export_coco)
+        dataset_menu.add_command(label="Export Pascal VOC...", command=self.export_voc)
+        dataset_menu.add_command(label="Export Training Copies...", command=self.open_training_copies_export)
+        self.training_copies_var = tk.BooleanVar(value=self.settings.get('training_copies', False))
+        dataset_menu.add_checkbutton(label="Save Training Copies", variable=self.training_copies_var,
+                                     command=self.toggle_training_copies)
+        dataset_menu.add_separator()
+        dataset_menu.add_command(label="Open COCO Dataset...", command=self.import_coco)
+        dataset_menu.add_command(label="Open Pascal VOC Dataset...", command=self.import_voc)
+        dataset_menu.add_separator()
+        self.rank_var = tk.BooleanVar(value=self.settings.get('rank_by_uncertainty', False))
+        dataset_menu.add_checkbutton(label="Next Image by Uncertainty", variable=self.rank_var,
+                                     command=self.toggle_uncertainty_ranking)
+        dataset_menu.add_separator()
+        dataset_menu.add_command(label="Train Model in Background...", command=self.open_training_dialog)
+        dataset_menu.add_command(label="Stop Training", command=self.stop_training)
+
         # Status bar
+        status_frame = tk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+
+        # Live frame-time readout while tracing is on
+        self.perf_var = tk.StringVar(value="")
+        perf_label = tk.Label(status_frame, textvariable=self.perf_var,
+                              relief=tk.SUNKEN, anchor=tk.E, width=32)
+        perf_label.pack(side=tk.RIGHT)
+
+        # Background training progress
+        self.training_var = tk.StringVar(value="")
+        training_label = tk.Label(status_frame, textvariable=self.training_var,
+                                  relief=tk.SUNKEN, anchor=tk.E, width=44)
+        training_label.pack(side=tk.RIGHT)
+
         self.status_var = tk.StringVar(value="Ready. Load a directory to start.")
-        status_bar = tk.Label(self.root, textvariable=self.status_var,
+        status_bar = tk.Label(status_frame, textvariable=self.status_var,
                             relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        self.update_perf_readout()
+
+    def toggle_tracing(self):
+        """Switch latency tracing on or off"""
+        TRACER.enabled = self.trace_var.get()
+        if TRACER.enabled:
+            # Start a fresh session
+            TRACER.clear()
+            self.status_var.set("Latency tracing on")
+        else:
+            self.status_var.set("Latency tracing off")
+        self.update_perf_readout(reschedule=False)
+
+    def update_perf_readout(self, reschedule=True):
+        """Show p50/p95 frame time in the status bar while tracing"""
+        stats = TRACER.frame_percentiles() if TRACER.enabled else None
+        if stats:
+            p50, p95, count = stats
+            self.perf_var.set(f"Frame p50 {p50:.1f} ms | p95 {p95:.1f} ms ({count})")
+        elif TRACER.enabled:
+            self.perf_var.set("Frame time: no frames yet")
+        else:
+            self.perf_var.set("")
+        if reschedule:
+            self.root.after(500, self.update_perf_readout)
+
+    def export_trace(self):
+        """Export the traced session as Chrome trace-event JSON"""
+        if not TRACER.events:
+            messagebox.showinfo("Export Trace", "No trace recorded. Turn on Performance > Trace Latency first.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Export Chrome Trace",
+            defaultextension=".json",
+            filetypes=[("Trace files", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            count = TRACER.export_chrome_trace(file_path)
+            self.status_var.set(f"Exported {count} spans to {Path(file_path).name}")
+
+    def record_session(self):
+        """Start recording the annotation session for replay"""
+        if RECORDER.active:
+            self.status_var.set("Already recording a session")
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Record Session",
+            defaultextension=".jsonl.gz",
+            filetypes=[("Session logs", "*.jsonl.gz"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.start_recording(file_path)
+
+    def start_recording(self, file_path):
+        """Record events from now on to a session log"""
+        self.root.update_idletasks()
+        RECORDER.start(file_path, self)
+        self.status_var.set(f"Recording session to {Path(file_path).name}")
+
+    def stop_recording(self):
+        """Finish the session log"""
+        if not RECORDER.active:
+            self.status_var.set("Not recording")
+            return
+        RECORDER.stop(self)
+        self.status_var.set("Session recording stopped")
+
+    def on_close(self):
+        """Close the window, finishing any session recording and background training first"""
+        RECORDER.stop(self)
+        self.stop_training()
+        self.root.destroy()
+
+    def dataset_directory(self, title):
+        """The output directory, or one picked by the user if none is set"""
+        if self.output_dir:
+            return self.output_dir
+        directory = filedialog.askdirectory(title=title)
+        return Path(directory) if directory else None
+
+    def audit_labels(self):
+        """Audit the output dataset in the background and show the report"""
+        output_dir = self.dataset_directory("Select Dataset Directory to Audit")
+        if not output_dir:
+            return
+        try:
+            num_kp_classes = int(self.num_kp_classes_var.get())
+        except ValueError:
+            num_kp_classes = None
+
+        def progress(done, total):
+            self.run_on_ui(lambda: self.status_var.set(f"Auditing labels: {done}/{total} files parsed"))
+
+        def worker():
+            try:
+                report = audit_dataset(output_dir, num_kp_classes=num_kp_classes, progress=progress)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: messagebox.showerror("Error", f"Audit failed: {error}"))
+                return
+            self.run_on_ui(lambda: self.show_audit_report(output_dir, report))
+
+        self.status_var.set(f"Auditing labels in {output_dir}...")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_audit_report(self, output_dir, report):
+        """Show an audit report in its own window"""
+        self.status_var.set(f"Audited {report['labels']} label files in {report['seconds']:.1f} s")
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Label Audit - {output_dir}")
+        window.geometry("700x600")
+
+        text_frame = tk.Frame(window)
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        scroll = tk.Scrollbar(text_frame)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(text_frame, font=('Courier', 10), yscrollcommand=scroll.set)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.config(command=text.yview)
+
+        text.insert(tk.END, format_report(report))
+        text.config(state=tk.DISABLED)
+
+    def open_bulk_edit(self):
+        """Open window to remap, delete or filter boxes across the output dataset"""
+        output_dir = self.dataset_directory("Select Dataset Directory to Edit")
+        if not output_dir:
+            return
+
+        edit_window = tk.Toplevel(self.root)
+        edit_window.title("Bulk Edit Labels")
+        edit_window.geometry("400x300")
+        edit_window.transient(self.root)
+        edit_window.grab_set()
+
+        fields = {}
+        for key, text in [('remap', "Remap Classes (old:new, ...):"), ('delete', "Delete Classes (a, b, ...):"),
+                          ('min_size', "Min Box Size (0-1):"), ('min_conf', "Min Confidence:"),
+                          ('num_kp', "Keypoints per Box:"), ('keypoint_order', "Keypoint Order (old index, ...):")]:
+            frame = tk.Frame(edit_window, padx=10, pady=3)
+            frame.pack(fill=tk.X)
+            tk.Label(frame, text=text).pack(side=tk.LEFT)
+            fields[key] = tk.StringVar(value="")
+            tk.Entry(frame, textvariable=fields[key], width=14).pack(side=tk.RIGHT)
+
+        button_frame = tk.Frame(edit_window, padx=10, pady=10)
+        button_frame.pack(fill=tk.X)
+
+        def preview():
+            values = {key: var.get().strip() for key, var in fields.items()}
+            try:
+                edit = make_edit(remap=parse_remap(values['remap']),
+                                 delete=parse_int_list(values['delete']),
+                                 min_size=float(values['min_size']) if values['min_size'] else None,
+                                 min_conf=float(values['min_conf']) if values['min_conf'] else None,
+                                 num_kp=int(values['num_kp']) if values['num_kp'] else None,
+                                 keypoint_order=parse_int_list(values['keypoint_order']) or None)
+            except ValueError:
+                messagebox.showerror("Error", "Invalid value", parent=edit_window)
+                return
+            edit_window.destroy()
+            self.start_bulk_edit(output_dir, edit, dry_run=True)
+
+        tk.Button(button_frame, text="Preview", command=preview, bg='lightgreen', width=10).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=edit_window.destroy, bg='lightcoral',
+                  width=10).pack(side=tk.RIGHT, padx=5)
+
+    def start_bulk_edit(self, output_dir, edit, dry_run):
+        """Run a bulk edit (or its dry run) in the background"""
+        def progress(done, total):
+            self.run_on_ui(lambda: self.status_var.set(f"Editing labels: {done}/{total} files checked"))
+
+        def worker():
+            try:
+                summary = bulk_edit(output_dir, edit, dry_run=dry_run, progress=progress)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: messagebox.showerror("Error", f"Bulk edit failed: {error}"))
+                return
+            self.run_on_ui(lambda: self.show_bulk_edit_summary(output_dir, edit, summary))
+
+        self.status_var.set(f"{'Checking' if dry_run else 'Editing'} labels in {output_dir}...")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_bulk_edit_summary(self, output_dir, edit, summary):
+        """Show what a bulk edit would change (with an Apply button) or changed"""
+        verb = "would change" if summary['dry_run'] else "changed"
+        self.status_var.set(f"Bulk edit {verb} {summary['changed']} label files in {summary['seconds']:.1f} s")
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Bulk Edit - {output_dir}")
+        window.geometry("700x500")
+
+        if summary['dry_run'] and summary['changed']:
+            def apply():
+                window.destroy()
+                self.start_bulk_edit(output_dir, edit, dry_run=False)
+
+            button_frame = tk.Frame(window, padx=10, pady=5)
+            button_frame.pack(side=tk.BOTTOM, fill=tk.X)
+            tk.Button(button_frame, text="Apply", command=apply, bg='lightgreen', width=10).pack(side=tk.LEFT)
+            tk.Button(button_frame, text="Cancel", command=window.destroy, bg='lightcoral',
+                      width=10).pack(side=tk.RIGHT)
+
+        text_frame = tk.Frame(window)
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        scroll = tk.Scrollbar(text_frame)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(text_frame, font=('Courier', 10), yscrollcommand=scroll.set)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.config(command=text.yview)
+
+        text.insert(tk.END, format_edit_summary(summary, edit, self.model_names))
+        text.config(state=tk.DISABLED)
+
+    def open_split_export(self):
+        """Open window to export a train/val/test split of the output dataset"""
+        output_dir = self.dataset_directory("Select Dataset Directory to Split")
+        if not output_dir:
+            return
+
+        split_window = tk.Toplevel(self.root)
+        split_window.title("Export Split")
+        split_window.geometry("360x260")
+        split_window.transient(self.root)
+        split_window.grab_set()
+
+        ratio_vars = {}
+        for name, default in [('train', 0.8), ('val', 0.1), ('test', 0.1)]:
+            frame = tk.Frame(split_window, padx=10, pady=5)
+            frame.pack(fill=tk.X)
+            tk.Label(frame, text=f"{name.capitalize()} Fraction:").pack(side=tk.LEFT)
+            ratio_vars[name] = tk.StringVar(value=str(default))
+            tk.Entry(frame, textvariable=ratio_vars[name], width=10).pack(side=tk.RIGHT)
+
+        seed_frame = tk.Frame(split_window, padx=10, pady=5)
+        seed_frame.pack(fill=tk.X)
+        tk.Label(seed_frame, text="Seed:").pack(side=tk.LEFT)
+        seed_var = tk.StringVar(value="0")
+        tk.Entry(seed_frame, textvariable=seed_var, width=10).pack(side=tk.RIGHT)
+
+        # Images whose names give the same group (e.g. source video) stay in one split
+        group_frame = tk.Frame(split_window, padx=10, pady=5)
+        group_frame.pack(fill=tk.X)
+        tk.Label(group_frame, text="Group Pattern (regex):").pack(side=tk.LEFT)
+        group_var = tk.StringVar(value="")
+        tk.Entry(group_frame, textvariable=group_var, width=18).pack(side=tk.RIGHT)
+
+        button_frame = tk.Frame(split_window, padx=10, pady=10)
+        button_frame.pack(fill=tk.X)
+
+        def export():
+            try:
+                ratios = [float(ratio_vars[name].get()) for name in ['train', 'val', 'test']]
+                seed = int(seed_var.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid fraction or seed", parent=split_window)
+                return
+            if min(ratios) < 0 or sum(ratios) <= 0:
+                messagebox.showerror("Error", "Fractions must be non-negative and not all zero",
+                                     parent=split_window)
+                return
+            group_pattern = group_var.get().strip() or None
+            try:
+                num_kp_classes = int(self.num_kp_classes_var.get())
+            except ValueError:
+                num_kp_classes = None
+            split_window.destroy()
+
+            def worker():
+                try:
+                    summary = export_split(output_dir, ratios=ratios, seed=seed, group_pattern=group_pattern,
+                                           num_kp_classes=num_kp_classes)
+                except Exception as e:
+                    error = str(e)
+                    self.run_on_ui(lambda: messagebox.showerror("Error", f"Split export failed: {error}"))
+                    return
+                self.run_on_ui(lambda: self.finish_split_export(output_dir, summary))
+
+            self.status_var.set(f"Exporting split of {output_dir}...")
+            threading.Thread(target=worker, daemon=True).start()
+
+        tk.Button(button_frame, text="Export", command=export, bg='lightgreen', width=10).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=split_window.destroy, bg='lightcoral',
+                  width=10).pack(side=tk.RIGHT, padx=5)
+
+    def finish_split_export(self, output_dir, summary):
+        """Report a finished split export"""
+        self.status_var.set(f"Wrote train/val/test lists and data.yaml to {output_dir}")
+        messagebox.showinfo("Split Exported", format_summary(summary))
+
+    def export_coco(self):
+        """Export the output dataset to a COCO JSON file"""
+        output_dir = self.dataset_directory("Select Dataset Directory to Export")
+        if not output_dir:
+            return
+        coco_path = filedialog.asksaveasfilename(title="Save COCO JSON", defaultextension=".json",
+                                                 initialfile="annotations.json",
+                                                 filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if coco_path:
+            self.start_export(output_dir, coco_path=coco_path)
+
+    def export_voc(self):
+        """Export the output dataset to Pascal VOC XML files"""
+        output_dir = self.dataset_directory("Select Dataset Directory to Export")
+        if not output_dir:
+            return
+        voc_dir = filedialog.askdirectory(title="Select Directory for VOC Annotations")
+        if voc_dir:
+            self.start_export(output_dir, voc_dir=voc_dir)
+
+    def start_export(self, output_dir, coco_path=None, voc_dir=None):
+        """Convert the output dataset in the background"""
+        def progress(done, total):
+            self.run_on_ui(lambda: self.status_var.set(f"Exporting: {done}/{total} images converted"))
+
+        def worker():
+            try:
+                counts = export_dataset(output_dir, coco_path=coco_path, voc_dir=voc_dir, progress=progress)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: messagebox.showerror("Error", f"Export failed: {error}"))
+                return
+            target = coco_path or voc_dir
+            summary = f"Exported {counts['images']} images"
+            if counts['annotations'] is not None:
+                summary += f" and {counts['annotations']} annotations"
+            self.run_on_ui(lambda: self.status_var.set(f"{summary} to {target}"))
+
+        self.status_var.set(f"Exporting {output_dir}...")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def import_coco(self):
+        """Open an image directory with annotations from a COCO JSON file"""
+        image_dir = filedialog.askdirectory(title="Select Image Directory")
+        if not image_dir:
+            return
+        json_path = filedialog.askopenfilename(title="Select COCO Annotation File",
+                                               filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if json_path:
+            self.start_import(image_dir, lambda progress: open_coco(json_path, image_dir, progress))
+
+    def import_voc(self):
+        """Open an image directory with annotations from Pascal VOC XML files"""
+        image_dir = filedialog.askdirectory(title="Select Image Directory")
+        if not image_dir:
+            return
+        xml_dir = filedialog.askdirectory(title="Select VOC Annotations Directory")
+        if xml_dir:
+            self.start_import(image_dir, lambda progress: VocAnnotations(xml_dir).scan(progress))
+
+    def start_import(self, image_dir, open_source):
+        """Open the images right away and index their annotations in the background"""
+        self.open_directory(image_dir)
+        generation = self.import_generation
+
+        def progress(done, total, unit='MB'):
+            if unit == 'MB':
+                done, total = f"{done / 1e6:.0f}", f"{total / 1e6:.0f}"
+            self.run_on_ui(lambda: self.status_var.set(f"Indexing annotations: {done}/{total} {unit}"))
+
+        def worker():
+            try:
+                source = open_source(progress)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: messagebox.showerror("Error", f"Failed to read annotations: {error}"))
+                return
+            self.run_on_ui(lambda: self.finish_import(generation, source))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def finish_import(self, generation, source):
+        """Attach an indexed COCO/VOC source, unless another directory was opened meanwhile"""
+        if generation != self.import_generation:
+            return
+
+        # Imported classes are matched by name to the model's or data.yaml's classes
+        target_names = self.model_names
+        if not target_names:
+            data_yaml = find_data_yaml(self.output_dir or '.')
+            target_names = load_class_names(data_yaml) if data_yaml else {}
+        self.import_source = source
+        self.import_classes = ClassMapper(target_names, source.class_names())
+        if not self.model_names:
+            self.model_names = self.import_classes.names
+        if source.num_keypoints and self.num_kp_classes_var.get() in ('', '0'):
+            self.num_kp_classes_var.set(str(source.num_keypoints))
+
+        # Names that got new ids are saved, so later sessions map them the same way
+        status = f"Annotations ready for {len(self.all_images)} images in {self.image_dir}"
+        new_names = {class_id: name for class_id, name in self.import_classes.names.items()
+                     if target_names.get(class_id) != name}
+        if new_names:
+            mapping = ', '.join(f"{class_id}={name}" for class_id, name in sorted(new_names.items()))
+            if self.output_dir:
+                try:
+                    save_class_names(self.output_dir / 'data.yaml', self.import_classes.names)
+                    status += f"; new classes {mapping} saved to data.yaml"
+                except OSError as e:
+                    status += f"; new classes {mapping} (data.yaml not saved: {e})"
+            else:
+                status += f"; new classes {mapping} (set an output directory to save them)"
+
+        if self.current_image and not self.annotations:
+            self.load_imported_annotations()
+            self.display_image()
+        self.status_var.set(status)
+
+    def load_imported_annotations(self):
+        """Pull the current image's annotations from the imported dataset"""
+        try:
+            objects = self.import_source.objects(self.current_image_path.name)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read annotations for {self.current_image_path.name}: {e}")
+            return
+        self.annotations = to_annotations(objects, self.import_classes)
+
+    def open_training_copies_export(self):
+        """Open window to write training-resolution copies of the output dataset"""
+        output_dir = self.dataset_directory("Select Dataset Directory to Resize")
+        if not output_dir:
+            return
+
+        resize_window = tk.Toplevel(self.root)
+        resize_window.title("Export Training Copies")
+        resize_window.geometry("320x120")
+        resize_window.transient(self.root)
+        resize_window.grab_set()
+
+        imgsz_frame = tk.Frame(resize_window, padx=10, pady=10)
+        imgsz_frame.pack(fill=tk.X)
+        tk.Label(imgsz_frame, text="Long Side (imgsz):").pack(side=tk.LEFT)
+        imgsz_var = tk.StringVar(value=str(self.settings.get('training_imgsz', DEFAULT_IMGSZ)))
+        tk.Entry(imgsz_frame, textvariable=imgsz_var, width=10).pack(side=tk.RIGHT)
+
+        button_frame = tk.Frame(resize_window, padx=10, pady=10)
+        button_frame.pack(fill=tk.X)
+
+        def export():
+            try:
+                imgsz = int(imgsz_var.get())
+            except ValueError:
+                imgsz = 0
+            if imgsz <= 0:
+                messagebox.showerror("Error", "Invalid image size", parent=resize_window)
+                return
+            self.settings['training_imgsz'] = imgsz
+            self.save_settings()
+            resize_window.destroy()
+
+            def progress(done, total):
+                self.run_on_ui(lambda: self.status_var.set(f"Resizing for training: {done}/{total} images"))
+
+            def worker():
+                try:
+                    summary = export_training_copies(output_dir, imgsz=imgsz, progress=progress)
+                except Exception as e:
+                    error = str(e)
+                    self.run_on_ui(lambda: messagebox.showerror("Error", f"Training copy export failed: {error}"))
+                    return
+                self.run_on_ui(lambda: self.finish_training_copies_export(summary))
+
+            self.status_var.set(f"Resizing {output_dir} for training...")
+            threading.Thread(target=worker, daemon=True).start()
+
+        tk.Button(button_frame, text="Export", command=export, bg='lightgreen', width=10).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=resize_window.destroy, bg='lightcoral',
+                  width=10).pack(side=tk.RIGHT, padx=5)
+
+    def finish_training_copies_export(self, summary):
+        """Report a finished training copy export"""
+        self.status_var.set(f"Training copies up to date in {summary['root']}")
+        messagebox.showinfo("Training Copies Exported", format_resize_summary(summary))
+
+    def toggle_training_copies(self):
+        """Switch writing a training-resolution copy of every saved image on or off"""
+        self.settings['training_copies'] = self.training_copies_var.get()
+        self.save_settings()
+        if self.training_copies_var.get() and self.output_dir:
+            imgsz = self.settings.get('training_imgsz', DEFAULT_IMGSZ)
+            self.status_var.set(f"Saved images will also be copied at {imgsz} px to "
+                                f"{training_root(self.output_dir, imgsz)}")
+
+    def start_training_copy(self, image, image_name, label_path):
+        """Write the training copy of a saved image in the background"""
+        output_dir = self.output_dir
+        imgsz = self.settings.get('training_imgsz', DEFAULT_IMGSZ)
+
+        def worker():
+            try:
+                save_training_copy(image, image_name, label_path, output_dir, imgsz)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: self.status_var.set(f"Training copy of {image_name} failed: {error}"))
+
+        threading.Thread(target=worker, daemon=True).start()
 
     def load_directory(self):
         """Load images from selected directory"""
         directory = filedialog.askdirectory(title="Select Image Directory")
-        if not directory:
-            return
+        if directory:
+            self.open_directory(directory)
 
+    @recorded
+    def open_directory(self, directory):
+        """Load images from a directory"""
         self.image_dir = Path(directory)
-        self.image_list = []
+        self.import_source = None
+        self.import_generation += 1
 
         # Load all image files
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp']:
-            self.image_list.extend(list(self.image_dir.glob(ext)))
-            self.image_list.extend(list(self.image_dir.glob(ext.upper())))
+        self.all_images = scan_image_directory(self.image_dir)
+        self.image_hashes = {}
+        self.refresh_image_list()
+
+        self.status_var.set(f"Loaded {len(self.all_images)} images from {directory}")
+        self.start_duplicate_indexing()
+        self.image_scores = {}
+        self.start_scoring()
+
+    def start_duplicate_indexing(self):
+        """Hash new images of the current directory in the background"""
+        image_dir = self.image_dir
+        image_paths = list(self.all_images)
+
+        def progress(done, total):
+            if self.hide_duplicates_var.get():
+                self.run_on_ui(lambda: self.status_var.set(f"Indexing near-duplicates: {done}/{total} images"))
+
+        def worker():
+            try:
+                hashes = update_hash_index(image_dir, image_paths, progress=progress)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: self.status_var.set(f"Near-duplicate indexing failed: {error}"))
+                return
+            self.run_on_ui(lambda: self.finish_duplicate_indexing(image_dir, hashes))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def finish_duplicate_indexing(self, image_dir, hashes):
+        """Use freshly computed hashes, unless another directory was opened meanwhile"""
+        if image_dir != self.image_dir:
+            return
+        if RECORDER.active:
+            RECORDER.record('duplicates_indexed', [])
+        self.image_hashes = hashes
+        if self.hide_duplicates_var.get():
+            self.refresh_image_list()
+            hidden = len(self.all_images) - len(self.image_list)
+            self.status_var.set(f"Near-duplicates indexed: {hidden} of {len(self.all_images)} images hidden")
+
+    def toggle_uncertainty_ranking(self):
+        """Switch between list order and most-uncertain-first for Save & Next"""
+        self.settings['rank_by_uncertainty'] = self.rank_var.get()
+        self.save_settings()
+        if self.rank_var.get():
+            self.start_scoring()
+        else:
+            self.scoring_generation += 1
 
-        self.image_list.sort()
+    def start_scoring(self):
+        """Score unlabeled images by model uncertainty in the background"""
+        self.scoring_generation += 1
+        if not (self.rank_var.get() and self.image_dir and self.model_path and not self.model_loading):
+            return
+
+        generation = self.scoring_generation
+        image_dir = self.image_dir
+        image_paths = list(self.all_images)
+        labels_dir = self.output_dir / "labels" if self.output_dir else None
+        conf_threshold = self.inference_params['conf']
+        key_args = (self.model_path, self.inference_params['backend'], self.inference_params['int8'],
+                    conf_threshold)
+
+        def worker():
+            try:
+                key = model_key(*key_args)
+                cache = load_scores(image_dir, key)
+                labeled = labeled_stems(labels_dir) if labels_dir else set()
+
+                # Cached scores are reused; only new or changed images are run through the model
+                scores = {}
+                todo = []
+                for path in image_paths:
+                    if path.stem in labeled:
+                        continue
+                    score = cached_score(cache, path)
+                    if score is None:
+                        todo.append(path)
+                    else:
+                        scores[path] = score
+                self.run_on_ui(lambda: self.add_image_scores(generation, scores, len(todo)))
+
+                def predict(batch):
+                    return self.predict_batch(batch, conf=SCORE_CONF)
+
+                batch_scores = {}
+                for i, (path, score) in enumerate(score_images(predict, todo, conf_threshold), 1):
+                    if generation != self.scoring_generation:
+                        break  # New directory or model, or ranking switched off
+                    cache[path.name] = file_signature(path) + [score]
+                    batch_scores[path] = score
+                    if len(batch_scores) >= 20 or i == len(todo):
+                        remaining = len(todo) - i
+                        update = batch_scores
+                        self.run_on_ui(lambda: self.add_image_scores(generation, update, remaining))
+                        batch_scores = {}
+                    if i % 200 == 0:
+                        save_scores(image_dir, key, cache)
+                save_scores(image_dir, key, cache)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: self.status_var.set(f"Uncertainty scoring failed: {error}"))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def add_image_scores(self, generation, scores, remaining):
+        """Take uncertainty scores from the background scorer"""
+        if generation != self.scoring_generation:
+            return
+        self.image_scores.update(scores)
+        if remaining:
+            self.status_var.set(f"Scoring uncertainty: {len(self.image_scores)} images scored, {remaining} to go")
+        else:
+            self.status_var.set(f"Uncertainty scores ready for {len(self.image_scores)} unlabeled images")
+
+    def on_duplicate_settings_change(self):
+        """Re-filter the image list when the near-duplicate settings change"""
+        try:
+            threshold = int(self.duplicate_threshold_var.get())
+        except ValueError:
+            return
+        self.settings['hide_duplicates'] = self.hide_duplicates_var.get()
+        self.settings['duplicate_threshold'] = threshold
+        self.save_settings()
+        self.refresh_image_list()
+        if self.hide_duplicates_var.get() and self.all_images and not self.image_hashes:
+            self.status_var.set("Near-duplicates are still being indexed...")
+
+    def on_propagate_change(self):
+        """Remember whether Save & Next carries boxes forward"""
+        self.settings['propagate_annotations'] = self.propagate_var.get()
+        self.save_settings()
+
+    @traced('carry_annotations_forward')
+    def carry_annotations_forward(self, prev_image, annotations):
+        """Start the current image from the previous frame's boxes, tracked to their new positions"""
+        self.annotations, lost = propagate_annotations(prev_image, self.current_image, annotations)
+        self.display_image()
+        status = f"Carried {len(self.annotations)} boxes from the previous frame"
+        if lost:
+            status += f" ({lost} not found, left in place)"
+        self.status_var.set(status)
+
+    def refresh_image_list(self):
+        """Rebuild the image list, collapsing near-duplicates into their first frame if enabled"""
+        self.duplicate_counts = {}
+        representatives = {}
+        if self.hide_duplicates_var.get() and self.image_hashes:
+            try:
+                threshold = int(self.duplicate_threshold_var.get())
+            except ValueError:
+                threshold = DEFAULT_THRESHOLD
+            clusters = cluster_duplicates(self.all_images, self.image_hashes, threshold)
+            self.image_list = list(clusters)
+            self.duplicate_counts = {path: len(dups) for path, dups in clusters.items() if dups}
+            representatives = {dup: path for path, dups in clusters.items() for dup in dups}
+        else:
+            self.image_list = list(self.all_images)
 
         # Update listbox
         self.image_listbox.delete(0, tk.END)
         for img_path in self.image_list:
-            self.image_listbox.insert(tk.END, img_path.name)
-
-        self.status_var.set(f"Loaded {len(self.image_list)} images from {directory}")
+            count = self.duplicate_counts.get(img_path)
+            self.image_listbox.insert(tk.END, f"{img_path.name} (+{count})" if count else img_path.name)
+
+        # Keep the current image selected if it's still listed; a hidden
+        # duplicate stays loaded, positioned at its cluster's first frame
+        listed = representatives.get(self.current_image_path, self.current_image_path)
+        if listed in self.image_list:
+            self.current_image_idx = self.image_list.index(listed)
+            self.image_listbox.selection_set(self.current_image_idx)
+            self.image_listbox.see(self.current_image_idx)
+        else:
+            self.current_image_idx = None
 
     def set_output_directory(self):
         """Set output directory for labeled data"""
@@ -227,11 +1057,16 @@ class YOLOLabelTool:
         if not selection:
             return
 
-        idx = selection[0]
+        self.open_image(selection[0])
+
+    @recorded
+    def open_image(self, idx):
+        """Load the image at an index in the image list"""
         self.current_image_idx = idx
         self.current_image_path = self.image_list[idx]
         self.load_image()
 
+    @traced('load_image')
     def load_image(self):
         """Load and display selected image"""
         if not self.current_image_path:
@@ -244,11 +1079,16 @@ class YOLOLabelTool:
         self.annotations = []
         self.current_box = None
         self.selected_box_idx = None
+        self.inference_generation += 1
+        self.deleted_previews = []
+        if self.import_source is not None:
+            self.load_imported_annotations()
 
         # Display image
         self.display_image()
         self.status_var.set(f"Loaded: {self.current_image_path.name}")
 
+    @traced('display_image')
     def display_image(self):
         """Display image on canvas with current annotations"""
         if not self.current_image:
@@ -263,115 +1103,45 @@ class YOLOLabelTool:
             return
 
         img_width, img_height = self.current_image.size
-
-        scale_x = canvas_width / img_width
-        scale_y = canvas_height / img_height
-        self.scale_factor = min(scale_x, scale_y, 1.0)
-
-        self.display_width = int(img_width * self.scale_factor)
-        self.display_height = int(img_height * self.scale_factor)
+        self.scale_factor, self.display_width, self.display_height = fit_scale(
+            img_width, img_height, canvas_width, canvas_height)
 
         # Resize image
-        display_img = self.current_image.resize((self.display_width, self.display_height),
-                                                Image.Resampling.LANCZOS)
+        with TRACER.span('display_image.resize'):
+            display_img = resize_for_display(self.current_image, self.display_width, self.display_height)
 
         # Draw annotations on image
-        display_img = display_img.copy()
-        draw = ImageDraw.Draw(display_img)
-
-        for i, ann in enumerate(self.annotations):
-            if ann['type'] == 'box':
-                x1, y1, x2, y2 = ann['coords']
-                x1_s = int(x1 * self.scale_factor)
-                y1_s = int(y1 * self.scale_factor)
-                x2_s = int(x2 * self.scale_factor)
-                y2_s = int(y2 * self.scale_factor)
-
-                color = self.get_class_color(ann['class'])
-                width = 3 if i == self.selected_box_idx else 2
-                draw.rectangle([x1_s, y1_s, x2_s, y2_s], outline=color, width=width)
-
-                # Draw label text above box (top left)
-                # Use class name from model if available, otherwise show "Class X"
-                if ann['class'] in self.model_names:
-                    label_text = self.model_names[ann['class']]
-                else:
-                    label_text = f"Class {ann['class']}"
-                text_bbox = draw.textbbox((0, 0), label_text)
-                text_width = text_bbox[2] - text_bbox[0]
-                text_height = text_bbox[3] - text_bbox[1]
-                text_y = y1_s - text_height - 5
-                if text_y < 0:
-                    text_y = y1_s + 2
-                draw.rectangle([x1_s, text_y, x1_s + text_width + 4, text_y + text_height + 4],
-                             fill=color)
-                draw.text((x1_s + 2, text_y + 2), label_text, fill='white')
-
-                # Draw keypoints
-                keypoints = ann.get('keypoints', [])
-                for kp in keypoints:
-                    kp_x, kp_y = kp['coords']
-                    kp_x_s = int(kp_x * self.scale_factor)
-                    kp_y_s = int(kp_y * self.scale_factor)
-                    kp_color = self.get_class_color(kp['class'])
-                    radius = 4
-
-                    if kp['visible']:
-                        # Visible keypoint - solid fill
-                        draw.ellipse([kp_x_s-radius, kp_y_s-radius, kp_x_s+radius, kp_y_s+radius],
-                                   fill=kp_color, outline='white', width=2)
-                        # Draw keypoint class label
-                        kp_label = f"{kp['class']}"
-                        draw.text((kp_x_s + 6, kp_y_s - 6), kp_label, fill=kp_color)
-                    else:
-                        # Invisible keypoint - outlined with X
-                        draw.ellipse([kp_x_s-radius, kp_y_s-radius, kp_x_s+radius, kp_y_s+radius],
-                                   outline='gray', width=2)
-                        # Draw X over invisible keypoint
-                        draw.line([kp_x_s-radius, kp_y_s-radius, kp_x_s+radius, kp_y_s+radius], fill='gray', width=2)
-                        draw.line([kp_x_s-radius, kp_y_s+radius, kp_x_s+radius, kp_y_s-radius], fill='gray', width=2)
-                        # Draw keypoint class label in gray
-                        kp_label = f"{kp['class']}"
-                        draw.text((kp_x_s + 6, kp_y_s - 6), kp_label, fill='gray')
-
-                # Draw handles for selected box
-                if i == self.selected_box_idx:
-                    handle_size = 6
-                    # Corners
-                    for x, y in [(x1_s, y1_s), (x2_s, y1_s), (x1_s, y2_s), (x2_s, y2_s)]:
-                        draw.rectangle([x-handle_size, y-handle_size, x+handle_size, y+handle_size],
-                                     fill='blue', outline='white')
-                    # Edges
-                    for x, y in [(x1_s, (y1_s+y2_s)//2), (x2_s, (y1_s+y2_s)//2),
-                               ((x1_s+x2_s)//2, y1_s), ((x1_s+x2_s)//2, y2_s)]:
-                        draw.rectangle([x-handle_size, y-handle_size, x+handle_size, y+handle_size],
-                                     fill='yellow', outline='white')
-
-        # Draw current box being drawn
-        if self.current_box:
-            # Convert canvas coordinates to display image coordinates
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            x_offset = (canvas_width - self.display_width) // 2
-            y_offset = (canvas_height - self.display_height) // 2
+        with TRACER.span('display_image.overlay'):
+            display_img = display_img.copy()
+            draw = draw_annotations(display_img, self.annotations, self.scale_factor,
+                                    self.selected_box_idx, self.model_names)
 
-            x1, y1, x2, y2 = self.current_box
-            x1_img = x1 - x_offset
-            y1_img = y1 - y_offset
-            x2_img = x2 - x_offset
-            y2_img = y2 - y_offset
-            # Normalize coordinates to ensure x1 <= x2 and y1 <= y2
-            draw.rectangle([min(x1_img, x2_img), min(y1_img, y2_img),
-                          max(x1_img, x2_img), max(y1_img, y2_img)], outline='blue', width=2)
+            # Draw current box being drawn
+            if self.current_box:
+                # Convert canvas coordinates to display image coordinates
+                canvas_width = self.canvas.winfo_width()
+                canvas_height = self.canvas.winfo_height()
+                x_offset = (canvas_width - self.display_width) // 2
+                y_offset = (canvas_height - self.display_height) // 2
+
+                x1, y1, x2, y2 = self.current_box
+                x1_img = x1 - x_offset
+                y1_img = y1 - y_offset
+                x2_img = x2 - x_offset
+                y2_img = y2 - y_offset
+                # Normalize coordinates to ensure x1 <= x2 and y1 <= y2
+                draw.rectangle([min(x1_img, x2_img), min(y1_img, y2_img),
+                              max(x1_img, x2_img), max(y1_img, y2_img)], outline='blue', width=2)
 
         # Convert to PhotoImage and display
-        self.current_photo = ImageTk.PhotoImage(display_img)
+        with TRACER.span('display_image.photo'):
+            self.current_photo = ImageTk.PhotoImage(display_img)
 
-        x_offset = (canvas_width - self.display_width) // 2
-        y_offset = (canvas_height - self.display_height) // 2
+            x_offset = (canvas_width - self.display_width) // 2
+            y_offset = (canvas_height - self.display_height) // 2
 
-        self.canvas.delete('all')
-        self.canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=self.current_photo)
+            self.canvas.delete('all')
+            self.canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=self.current_photo)
 
     def get_image_coords(self, canvas_x, canvas_y):
         """Convert canvas coordinates to image coordinates"""
@@ -386,6 +1156,8 @@ class YOLOLabelTool:
 
         return img_x, img_y
 
+    @recorded
+    @traced('on_mouse_down')
     def on_mouse_down(self, event):
         """Handle mouse button press"""
         if not self.current_image:
@@ -409,18 +1181,16 @@ class YOLOLabelTool:
                     return
 
             # Check if clicking on an existing box
-            for i, ann in enumerate(self.annotations):
-                if ann['type'] == 'box':
-                    x1, y1, x2, y2 = ann['coords']
-                    if x1 <= img_x <= x2 and y1 <= img_y <= y2:
-                        # If clicking on already selected box, prompt to change class
-                        if i == self.selected_box_idx:
-                            self.change_box_class(i)
-                            return
-                        # Otherwise, select this box
-                        self.selected_box_idx = i
-                        self.display_image()
-                        return
+            i = find_box_at(self.annotations, img_x, img_y)
+            if i is not None:
+                # If clicking on already selected box, prompt to change class
+                if i == self.selected_box_idx:
+                    self.change_box_class(i)
+                    return
+                # Otherwise, select this box
+                self.selected_box_idx = i
+                self.display_image()
+                return
 
             # Start drawing new box
             self.selected_box_idx = None
@@ -429,54 +1199,47 @@ class YOLOLabelTool:
 
         elif mode == 'keypoint':
             # Check if clicking on an existing box to select it
-            clicked_box = False
-            for i, ann in enumerate(self.annotations):
-                if ann['type'] == 'box':
-                    x1, y1, x2, y2 = ann['coords']
-                    if x1 <= img_x <= x2 and y1 <= img_y <= y2:
-                        # Check if clicking on a keypoint first
-                        keypoints = ann.get('keypoints', [])
-                        clicked_kp = False
-                        for idx, kp in enumerate(keypoints):
-                            kp_x, kp_y = kp['coords']
-                            distance = ((img_x - kp_x)**2 + (img_y - kp_y)**2)**0.5
-                            if distance < 10 / self.scale_factor:  # Within 10 pixels
-                                # Toggle keypoint visibility
-                                keypoints[idx]['visible'] = 0 if keypoints[idx]['visible'] else 1
-                                self.selected_box_idx = i
-                                self.display_image()
-                                self.status_var.set(f"Toggled keypoint {keypoints[idx]['class']} visibility")
-                                clicked_kp = True
-                                break
-
-                        if not clicked_kp:
-                            # Not clicking on keypoint, check if we should select box or add new keypoint
-                            if self.selected_box_idx == i:
-                                # Already selected - check if Control key is pressed to change class
-                                if event.state & 0x0004:  # Control key modifier
-                                    self.change_box_class(i)
-                                else:
-                                    # Add new keypoint
-                                    try:
-                                        class_id = int(self.class_var.get())
-                                        if 'keypoints' not in ann:
-                                            ann['keypoints'] = []
-                                        ann['keypoints'].append({
-                                            'class': class_id,
-                                            'coords': (img_x, img_y),
-                                            'visible': 1
-                                        })
-                                        self.display_image()
-                                        self.status_var.set(f"Added keypoint class {class_id} at ({int(img_x)}, {int(img_y)})")
-                                    except ValueError:
-                                        messagebox.showerror("Error", "Invalid class ID")
-                            else:
-                                # Select this box
-                                self.selected_box_idx = i
+            i = find_box_at(self.annotations, img_x, img_y)
+            clicked_box = i is not None
+            if clicked_box:
+                ann = self.annotations[i]
+                # Check if clicking on a keypoint first
+                keypoints = ann.get('keypoints', [])
+                idx = find_keypoint_at(keypoints, img_x, img_y, 10 / self.scale_factor)  # Within 10 pixels
+                if idx is not None:
+                    # Toggle keypoint visibility
+                    keypoints[idx]['visible'] = 0 if keypoints[idx]['visible'] else 1
+                    ann['edited'] = True
+                    self.selected_box_idx = i
+                    self.display_image()
+                    self.status_var.set(f"Toggled keypoint {keypoints[idx]['class']} visibility")
+                else:
+                    # Not clicking on keypoint, check if we should select box or add new keypoint
+                    if self.selected_box_idx == i:
+                        # Already selected - check if Control key is pressed to change class
+                        if event.state & 0x0004:  # Control key modifier
+                            self.change_box_class(i)
+                        else:
+                            # Add new keypoint
+                            try:
+                                class_id = int(self.class_var.get())
+                                if 'keypoints' not in ann:
+                                    ann['keypoints'] = []
+                                ann['keypoints'].append({
+                                    'class': class_id,
+                                    'coords': (img_x, img_y),
+                                    'visible': 1
+                                })
+                                ann['edited'] = True
                                 self.display_image()
-                                self.status_var.set(f"Selected box {i} (class {ann['class']}). Click inside to add keypoints, Ctrl+click to change class.")
-                        clicked_box = True
-                        break
+                                self.status_var.set(f"Added keypoint class {class_id} at ({int(img_x)}, {int(img_y)})")
+                            except ValueError:
+                                messagebox.showerror("Error", "Invalid class ID")
+                    else:
+                        # Select this box
+                        self.selected_box_idx = i
+                        self.display_image()
+                        self.status_var.set(f"Selected box {i} (class {ann['class']}). Click inside to add keypoints, Ctrl+click to change class.")
 
             if not clicked_box:
                 # Didn't click on any box, start drawing new box
@@ -494,31 +1257,11 @@ class YOLOLabelTool:
         if ann['type'] != 'box':
             return None
 
-        x1, y1, x2, y2 = ann['coords']
         threshold = 10 / self.scale_factor  # pixels threshold
+        return find_handle(ann['coords'], img_x, img_y, threshold)
 
-        # Check corners
-        if abs(img_x - x1) < threshold and abs(img_y - y1) < threshold:
-            return 'tl'  # top-left
-        if abs(img_x - x2) < threshold and abs(img_y - y1) < threshold:
-            return 'tr'  # top-right
-        if abs(img_x - x1) < threshold and abs(img_y - y2) < threshold:
-            return 'bl'  # bottom-left
-        if abs(img_x - x2) < threshold and abs(img_y - y2) < threshold:
-            return 'br'  # bottom-right
-
-        # Check edges
-        if abs(img_x - x1) < threshold and y1 <= img_y <= y2:
-            return 'l'  # left
-        if abs(img_x - x2) < threshold and y1 <= img_y <= y2:
-            return 'r'  # right
-        if abs(img_y - y1) < threshold and x1 <= img_x <= x2:
-            return 't'  # top
-        if abs(img_y - y2) < threshold and x1 <= img_x <= x2:
-            return 'b'  # bottom
-
-        return None
-
+    @recorded
+    @traced('on_mouse_drag')
     def on_mouse_drag(self, event):
         """Handle mouse drag"""
         if not self.current_image:
@@ -558,6 +1301,7 @@ class YOLOLabelTool:
                     y1, y2 = y2, y1
 
                 ann['coords'] = [x1, y1, x2, y2]
+                ann['edited'] = True
                 self.display_image()
 
             elif self.current_box:
@@ -573,6 +1317,8 @@ class YOLOLabelTool:
                 self.current_box[3] = event.y
                 self.display_image()
 
+    @recorded
+    @traced('on_mouse_up')
     def on_mouse_up(self, event):
         """Handle mouse button release"""
         if not self.current_image:
@@ -650,6 +1396,8 @@ class YOLOLabelTool:
                 self.current_box = None
                 self.display_image()
 
+    @recorded
+    @traced('on_mouse_move')
     def on_mouse_move(self, event):
         """Handle mouse movement for cursor changes"""
         if not self.current_image or self.mode_var.get() != 'box':
@@ -672,6 +1420,7 @@ class YOLOLabelTool:
         else:
             self.canvas.config(cursor='cross')
 
+    @recorded
     def on_mode_change(self, event):
         """Handle annotation mode change"""
         mode = self.mode_var.get()
@@ -685,27 +1434,39 @@ class YOLOLabelTool:
     def clear_annotations(self):
         """Clear all annotations"""
         if messagebox.askyesno("Confirm", "Clear all annotations?"):
-            self.annotations = []
-            self.selected_box_idx = None
-            self.display_image()
-            self.status_var.set("Annotations cleared")
+            self.clear_all_annotations()
 
+    @recorded
+    def clear_all_annotations(self):
+        """Remove every annotation from the current image"""
+        self.deleted_previews += [ann for ann in self.annotations if ann.get('source') == 'preview']
+        self.annotations = []
+        self.selected_box_idx = None
+        self.display_image()
+        self.status_var.set("Annotations cleared")
+
+    @recorded
     def delete_selected(self):
         """Delete selected annotation"""
         if self.selected_box_idx is not None and self.selected_box_idx < len(self.annotations):
-            self.annotations.pop(self.selected_box_idx)
+            ann = self.annotations.pop(self.selected_box_idx)
+            if ann.get('source') == 'preview':
+                # Remembered so the refined box for it isn't merged back in
+                self.deleted_previews.append(ann)
             self.selected_box_idx = None
             self.display_image()
             self.status_var.set("Deleted selected annotation")
         else:
             self.status_var.set("No annotation selected")
 
+    @recorded
     def clear_box_keypoints(self):
         """Clear all keypoints from selected box"""
         if self.selected_box_idx is not None and self.selected_box_idx < len(self.annotations):
             ann = self.annotations[self.selected_box_idx]
             if ann['type'] == 'box':
                 ann['keypoints'] = []
+                ann['edited'] = True
                 self.display_image()
                 self.status_var.set("Cleared keypoints from selected box")
             else:
@@ -720,100 +1481,468 @@ class YOLOLabelTool:
             filetypes=[("Model files", "*.pt *.pth"), ("All files", "*.*")]
         )
         if file_path:
+            self.set_model(file_path)
+
+    def set_model(self, file_path):
+        """Load a model file in the background with the configured inference backend"""
+        if self.model_loading:
+            self.status_var.set("A model is already loading, please wait")
+            return
+
+        backend = self.inference_params['backend']
+        int8 = self.inference_params['int8']
+        self.model_loading = True
+        if backend != 'pytorch':
+            # The first load exports the weights, which can take a while
+            self.status_var.set(f"Preparing {backend} model: {Path(file_path).name}...")
+        else:
+            self.status_var.set(f"Loading model: {Path(file_path).name}...")
+
+        def worker():
             try:
-                self.model = YOLO(file_path)
-                self.model_path = file_path
-                # Store class names from model
-                if hasattr(self.model, 'names'):
-                    self.model_names = self.model.names
-                self.status_var.set(f"Model loaded: {Path(file_path).name}")
+                # Prefer the shared inference server so this process doesn't hold the weights
+                if self.inference_client.available():
+                    try:
+                        names = self.inference_client.load_model(file_path, backend=backend, int8=int8)
+                        self.run_on_ui(lambda: self.finish_model_load(file_path, None, names))
+                        return
+                    except (OSError, InferenceServerError):
+                        pass  # Fall back to loading the model in this process
+
+                model = get_backend(backend, file_path, int8=int8)
+                # Pay the one-off initialization cost now rather than on the first click
+                model.warmup()
+                self.run_on_ui(lambda: self.finish_model_load(file_path, model, model.names))
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to load model: {str(e)}")
-                self.model = None
-                self.model_path = None
-                self.model_names = {}
+                error = str(e)
+                self.run_on_ui(lambda: self.fail_model_load(error))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def finish_model_load(self, file_path, model, names):
+        """Install a model loaded by the background worker"""
+        # No lock: a prediction in progress keeps the model it started with,
+        # and the UI must not wait for background scoring
+        self.model = model  # None when the inference server owns the model
+        self.model_path = file_path
+        # Store class names from model
+        self.model_names = names
+        self.model_loading = False
+
+        # Predictions from the previous model are stale
+        self.inference_generation += 1
+        self.image_scores = {}
+        kept = self.keep_previews()
+
+        backend = self.inference_params['backend']
+        if model is None:
+            status = f"Model loaded on inference server: {Path(file_path).name} ({backend})"
+        else:
+            status = f"Model loaded: {Path(file_path).name} ({backend})"
+        if kept:
+            status += f"; refinement cancelled, {kept} preview boxes kept as regular boxes"
+        self.status_var.set(status)
+        self.display_image()
+        self.start_scoring()
+
+        # Remember the model so it can be preloaded next time
+        self.settings['last_model'] = str(file_path)
+        self.settings['backend'] = backend
+        self.settings['int8'] = self.inference_params['int8']
+        self.save_settings()
+
+        if self.pending_model:
+            # Training improved again while this model was loading
+            pending, self.pending_model = self.pending_model, None
+            self.set_model(pending)
+
+    def fail_model_load(self, error):
+        """Report a model that failed to load in the background"""
+        self.model_loading = False
+        messagebox.showerror("Error", f"Failed to load model: {error}")
+        self.model = None
+        self.model_path = None
+        self.model_names = {}
 
+    def preload_last_model(self):
+        """Load the model used in the previous session, if it still exists"""
+        last_model = self.settings.get('last_model')
+        if self.model_path or not last_model or not Path(last_model).exists():
+            return
+        if self.settings.get('backend') in BACKENDS:
+            self.inference_params['backend'] = self.settings['backend']
+        self.inference_params['int8'] = bool(self.settings.get('int8', False))
+        self.set_model(last_model)
+
+    @traced('run_inference')
     def run_inference(self):
         """Run YOLO inference on current image"""
         if not self.current_image_path:
             messagebox.showerror("Error", "No image loaded")
             return
 
-        if not self.model:
+        if self.model_loading:
+            self.status_var.set("Model is still loading, please wait")
+            return
+
+        if not self.model and not self.model_path:
             messagebox.showerror("Error", "No model loaded. Please load a model first.")
             return
 
+        progressive = self.inference_params['progressive']
         try:
-            # Run inference
-            results = self.model(
-                str(self.current_image_path),
-                conf=self.inference_params['conf'],
-                iou=self.inference_params['iou'],
-                save=self.inference_params['save'],
-                verbose=False
-            )[0]
-
-            # Store class names from model if not already stored
-            if hasattr(self.model, 'names') and not self.model_names:
-                self.model_names = self.model.names
-
-            # Get detected boxes
-            boxes = results.boxes
-
-            if len(boxes) == 0:
+            # Run inference (a quick low-resolution pass when progressive)
+            imgsz = self.inference_params['preview_imgsz'] if progressive else self.refine_imgsz()
+            detections = self.predict_detections(self.current_image_path, self.current_image, imgsz=imgsz)
+
+            if len(detections) == 0 and not progressive:
                 self.status_var.set("No objects detected")
                 return
 
-            # Check if model has keypoints (pose model)
-            has_keypoints = hasattr(results, 'keypoints') and results.keypoints is not None
-
-            # Add detected boxes to annotations
-            img_width, img_height = self.current_image.size
-
-            for idx, box in enumerate(boxes):
-                # Get box coordinates in xyxy format (absolute coordinates)
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                class_id = int(box.cls[0].cpu().numpy())
-
-                # Create box annotation
-                box_ann = {
-                    'type': 'box',
-                    'class': class_id,
-                    'coords': [float(x1), float(y1), float(x2), float(y2)],
-                    'keypoints': []
-                }
-
-                # Add keypoints if available
-                if has_keypoints:
-                    kp_data = results.keypoints.data[idx].cpu().numpy()  # Shape: (num_keypoints, 3) - x, y, conf
-                    for kp_class, kp_point in enumerate(kp_data):
-                        kp_x, kp_y, kp_conf = kp_point
-                        # Consider keypoint visible if confidence > threshold
-                        visible = 1 if kp_conf > 0.5 else 0
-                        if visible:
-                            box_ann['keypoints'].append({
-                                'class': kp_class,
-                                'coords': (float(kp_x), float(kp_y)),
-                                'visible': visible
-                            })
-
-                # Add to annotations
-                self.annotations.append(box_ann)
+            # Merge detected boxes into annotations instead of stacking duplicates
+            new_annotations = detections_to_annotations(detections)
+            if progressive:
+                for ann in new_annotations:
+                    ann['source'] = 'preview'
+                # Unedited previews from an earlier run are superseded by this one
+                self.remove_previews()
+            self.annotations, stats = self.merge_annotations(self.annotations, new_annotations)
 
             self.display_image()
-            if has_keypoints:
-                self.status_var.set(f"Detected {len(boxes)} objects with keypoints")
+            RECORDER.snapshot(self)
+            objects = "objects with keypoints" if has_keypoints(detections) else "objects"
+            summary = f"{len(detections)} {objects} ({stats['added']} added, {stats['matched']} matched existing boxes)"
+            if progressive:
+                self.status_var.set(f"Preview: {summary}. Refining at full resolution...")
+                self.start_refinement()
             else:
-                self.status_var.set(f"Detected {len(boxes)} objects")
+                self.status_var.set(f"Detected {summary}")
 
         except Exception as e:
             messagebox.showerror("Error", f"Inference failed: {str(e)}")
 
+    def merge_annotations(self, existing, predictions, protect=None):
+        """Merge predicted boxes into existing ones using the merge settings"""
+        return merge_predictions(
+            existing,
+            predictions,
+            iou_threshold=self.inference_params['merge_iou'],
+            policy=self.inference_params['merge_policy'],
+            class_aware=self.inference_params['merge_class_aware'],
+            protect=protect
+        )
+
+    def remove_previews(self):
+        """Drop unedited preview boxes, keeping the selection on the same box"""
+        selected = None
+        if self.selected_box_idx is not None and self.selected_box_idx < len(self.annotations):
+            selected = self.annotations[self.selected_box_idx]
+
+        self.annotations = [ann for ann in self.annotations if not is_preview(ann)]
+        self.selected_box_idx = None
+        for i, ann in enumerate(self.annotations):
+            if ann is selected:
+                self.selected_box_idx = i
+
+    def keep_previews(self):
+        """Make unedited previews regular boxes once their refinement is discarded; returns how many"""
+        kept = 0
+        for ann in self.annotations:
+            if is_preview(ann):
+                del ann['source']
+                kept += 1
+        self.deleted_previews = []
+        return kept
+
+    def refine_imgsz(self):
+        """Image size for full-resolution inference (None = model default)"""
+        return self.inference_params['refine_imgsz'] or None
+
+    def start_refinement(self):
+        """Run full-resolution inference in the background for the current image"""
+        self.inference_generation += 1
+        self.deleted_previews = []
+        generation = self.inference_generation
+        image_path = self.current_image_path
+        image = self.current_image
+
+        def worker():
+            try:
+                with TRACER.span('refine_inference'):
+                    detections = self.predict_detections(image_path, image, imgsz=self.refine_imgsz())
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: self.status_var.set(f"Refinement failed: {error}"))
+                return
+            self.run_on_ui(lambda: self.apply_refined_detections(generation, detections))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def apply_refined_detections(self, generation, detections):
+        """Replace preview boxes with refined boxes, keeping any the user has edited"""
+        if generation != self.inference_generation:
+            return  # Another image was loaded or inference was run again
+
+        refined = detections_to_annotations(detections)
+
+        # Boxes the user touched stay as they are, whatever the merge policy,
+        # and the refined boxes they (or deleted previews) correspond to are dropped
+        edited = [ann for ann in self.annotations if ann.get('source') == 'preview' and ann.get('edited')]
+        corrected = edited + self.deleted_previews
+        matches = match_boxes([ann['coords'] for ann in corrected], [ann['class'] for ann in corrected],
+                              [ann['coords'] for ann in refined], [ann['class'] for ann in refined],
+                              iou_threshold=self.inference_params['merge_iou'], class_aware=False)
+        matched = {pred_idx for _, pred_idx in matches}
+        refined = [ann for j, ann in enumerate(refined) if j not in matched]
+        deleted = len(self.deleted_previews)
+        self.deleted_previews = []
+
+        replaced = sum(1 for ann in self.annotations if is_preview(ann))
+        self.remove_previews()
+        self.annotations, stats = self.merge_annotations(
+            self.annotations, refined, protect=lambda ann: ann.get('source') == 'preview' and ann.get('edited'))
+
+        self.display_image()
+        RECORDER.snapshot(self)
+        self.status_var.set(f"Refined: {stats['added']} objects added ({replaced} preview boxes replaced, "
+                            f"{len(edited)} edited boxes kept, {deleted} deleted boxes left out)")
+
+    def predict_detections(self, image_path, image, imgsz=None):
+        """Run the model on an image, using the shared server when it is running"""
+        if self.model_path and self.inference_client.available():
+            try:
+                detections, names = self.inference_client.predict(
+                    self.model_path,
+                    image,
+                    conf=self.inference_params['conf'],
+                    iou=self.inference_params['iou'],
+                    imgsz=imgsz,
+                    backend=self.inference_params['backend'],
+                    int8=self.inference_params['int8']
+                )
+                if names and not self.model_names:
+                    self.model_names = names
+                return detections
+            except (OSError, InferenceServerError):
+                pass  # Server went away, fall back to in-process inference
+
+        # The model isn't safe to call from two threads at once; background
+        # scoring yields to this between images
+        self.interactive_inference.set()
+        try:
+            with self.model_lock:
+                if not self.model:
+                    self.model = get_backend(self.inference_params['backend'], self.model_path,
+                                             int8=self.inference_params['int8'])
+
+                detections = self.model.predict(
+                    str(image_path),
+                    conf=self.inference_params['conf'],
+                    iou=self.inference_params['iou'],
+                    imgsz=imgsz,
+                    save=self.inference_params['save']
+                )[0]
+        finally:
+            self.interactive_inference.clear()
+
+        # Store class names from model if not already stored
+        if not self.model_names:
+            self.model_names = self.model.names
+
+        return detections
+
+    def open_training_dialog(self):
+        """Open window to start training on the output dataset in the background"""
+        if self.training_starting or (self.training_process and self.training_process.poll() is None):
+            messagebox.showinfo("Training", "A training job is already running")
+            return
+        output_dir = self.dataset_directory("Select Dataset Directory to Train On")
+        if not output_dir:
+            return
+
+        train_window = tk.Toplevel(self.root)
+        train_window.title("Background Training")
+        train_window.geometry("330x300")
+        train_window.transient(self.root)
+        train_window.grab_set()
+
+        option_vars = {}
+        for key, label, default in [('epochs', "Epochs:", 10), ('imgsz', "Image Size:", 640),
+                                    ('batch', "Batch Size:", 8),
+                                    ('threads', "CPU Threads:", max(1, (os.cpu_count() or 2) // 2)),
+                                    ('device', "Device (cpu, 0, ...):", 'cpu')]:
+            frame = tk.Frame(train_window, padx=10, pady=5)
+            frame.pack(fill=tk.X)
+            tk.Label(frame, text=label).pack(side=tk.LEFT)
+            option_vars[key] = tk.StringVar(value=str(default))
+            tk.Entry(frame, textvariable=option_vars[key], width=10).pack(side=tk.RIGHT)
+
+        # Fine-tuning the loaded weights is much quicker than starting from a base model
+        finetune_frame = tk.Frame(train_window, padx=10, pady=5)
+        finetune_frame.pack(fill=tk.X)
+        can_finetune = bool(self.model_path) and Path(self.model_path).suffix == '.pt'
+        tk.Label(finetune_frame, text="Fine-tune Current Model:").pack(side=tk.LEFT)
+        finetune_var = tk.BooleanVar(value=can_finetune)
+        tk.Checkbutton(finetune_frame, variable=finetune_var,
+                       state=tk.NORMAL if can_finetune else tk.DISABLED).pack(side=tk.RIGHT)
+
+        button_frame = tk.Frame(train_window, padx=10, pady=10)
+        button_frame.pack(fill=tk.X)
+
+        def start():
+            try:
+                options = {key: int(option_vars[key].get()) for key in ['epochs', 'imgsz', 'batch', 'threads']}
+            except ValueError:
+                messagebox.showerror("Error", "Epochs, image size, batch size and threads must be numbers",
+                                     parent=train_window)
+                return
+            if min(options.values()) <= 0:
+                messagebox.showerror("Error", "Values must be positive", parent=train_window)
+                return
+            options['device'] = option_vars['device'].get().strip() or 'cpu'
+            try:
+                num_kp_classes = int(self.num_kp_classes_var.get())
+            except ValueError:
+                num_kp_classes = 0
+            if finetune_var.get() and can_finetune:
+                weights = str(self.model_path)
+            else:
+                weights = DEFAULT_POSE_WEIGHTS if num_kp_classes else DEFAULT_WEIGHTS
+            train_window.destroy()
+            self.start_training(output_dir, weights, num_kp_classes, options)
+
+        tk.Button(button_frame, text="Start", command=start, bg='lightgreen', width=10).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=train_window.destroy, bg='lightcoral',
+                  width=10).pack(side=tk.RIGHT, padx=5)
+
+    def start_training(self, output_dir, weights, num_kp_classes, options):
+        """Split the dataset and launch the training process, streaming its progress"""
+        run_name = f"background_{time.strftime('%Y%m%d_%H%M%S')}"
+        project = Path("yolo_gui/runs").resolve()
+        log_path = project / f"{run_name}.log"
+        self.training_starting = True
+        self.training_var.set("Training: preparing dataset split...")
+
+        def worker():
+            try:
+                # The dataset's own split (e.g. group-aware) is kept, with images labeled
+                # since added to it; without one a fresh split is made. Either way the
+                # lists go in the run directory, not the dataset
+                split_dir = project / run_name / 'split'
+                if (Path(output_dir) / 'train.txt').exists():
+                    extend_split(output_dir, output_dir, split_dir)
+                else:
+                    export_split(output_dir, num_kp_classes=num_kp_classes or None, list_dir=split_dir)
+                # Train from copies at the training size so epochs don't decode full-resolution images
+                self.run_on_ui(lambda: self.training_var.set("Training: resizing images..."))
+                copies = export_training_copies(output_dir, imgsz=options['imgsz'], split_dir=split_dir)
+                project.mkdir(parents=True, exist_ok=True)
+                command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        'background_training.py'),
+                           str(Path(copies['root']) / 'data.yaml'), '--weights', weights,
+                           '--epochs', str(options['epochs']), '--imgsz', str(options['imgsz']),
+                           '--batch', str(options['batch']), '--threads', str(options['threads']),
+                           '--device', options['device'], '--project', str(project), '--name', run_name]
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                           text=True, bufsize=1)
+            except Exception as e:
+                error = str(e)
+                self.run_on_ui(lambda: self.fail_training_start(error))
+                return
+            self.training_process = process
+
+            # Progress events go to the UI, everything else to the run's log
+            with open(log_path, 'w') as log:
+                for line in process.stdout:
+                    event = parse_event(line)
+                    if event is None:
+                        log.write(line)
+                    else:
+                        self.run_on_ui(lambda event=event: self.on_training_event(event))
+            returncode = process.wait()
+            self.run_on_ui(lambda: self.finish_training(process, returncode, log_path))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_training_event(self, event):
+        """Show training progress and swap in improved weights"""
+        kind = event.get('event')
+        if kind == 'status':
+            self.training_var.set(f"Training: {event['message']}")
+        elif kind == 'baseline':
+            self.training_var.set(f"Training: starting fitness {event['fitness']:.3f}")
+        elif kind == 'epoch':
+            self.training_var.set(f"Training: epoch {event['epoch']}/{event['epochs']}, "
+                                  f"fitness {event['fitness']:.3f} (best {event['best_fitness']:.3f})")
+        elif kind == 'improved':
+            self.status_var.set(f"Validation improved to {event['fitness']:.3f} at epoch {event['epoch']}, "
+                                f"swapping in new weights")
+            self.hot_swap_model(event['weights'])
+        elif kind == 'done':
+            self.training_var.set(f"Training done, best fitness {event['best_fitness']:.3f}")
+        elif kind == 'error':
+            self.training_var.set("Training failed")
+            messagebox.showerror("Error", f"Training failed: {event['message']}")
+
+    def fail_training_start(self, error):
+        """Report a training job that failed before its process started"""
+        self.training_starting = False
+        self.on_training_event({'event': 'error', 'message': error})
+
+    def finish_training(self, process, returncode, log_path):
+        """Report a training process that exited"""
+        if process is self.training_process:
+            self.training_process = None
+            self.training_starting = False
+        if returncode not in (0, None) and not self.training_var.get().startswith(("Training failed",
+                                                                                   "Training stopped")):
+            self.training_var.set(f"Training exited with code {returncode}, see {log_path.name}")
+
+    def stop_training(self):
+        """Stop the background training process"""
+        if self.training_process and self.training_process.poll() is None:
+            self.training_process.terminate()
+            self.training_var.set("Training stopped")
+
+    def hot_swap_model(self, weights):
+        """Replace the inference model with new weights without interrupting labeling"""
+        if self.model_loading:
+            self.pending_model = weights
+            return
+        self.set_model(weights)
+
+    def predict_batch(self, image_paths, conf):
+        """Run the model on several images, returning a detection list per image"""
+        if self.model_path and self.inference_client.available():
+            try:
+                results = []
+                for image_path in image_paths:
+                    with Image.open(image_path) as image:
+                        detections, _ = self.inference_client.predict(
+                            self.model_path, image, conf=conf, iou=self.inference_params['iou'],
+                            backend=self.inference_params['backend'], int8=self.inference_params['int8'])
+                    results.append(detections)
+                return results
+            except (OSError, InferenceServerError):
+                pass  # Server went away, fall back to in-process inference
+
+        # One image per lock, so interactive inference waits for one image at most
+        results = []
+        for path in image_paths:
+            while self.interactive_inference.is_set():
+                time.sleep(0.01)
+            with self.model_lock:
+                if not self.model:
+                    self.model = get_backend(self.inference_params['backend'], self.model_path,
+                                             int8=self.inference_params['int8'])
+                results.append(self.model.predict(str(path), conf=conf, iou=self.inference_params['iou'])[0])
+        return results
+
     def open_inference_settings(self):
         """Open window to configure inference parameters"""
         settings_window = tk.Toplevel(self.root)
         settings_window.title("Inference Settings")
-        settings_window.geometry("300x230")
+        settings_window.geometry("300x510")
         settings_window.transient(self.root)
         settings_window.grab_set()
 
@@ -853,6 +1982,76 @@ class YOLOLabelTool:
         save_check = tk.Checkbutton(save_frame, variable=save_var)
         save_check.pack(side=tk.RIGHT)
 
+        # Inference backend
+        backend_frame = tk.Frame(settings_window, padx=10, pady=5)
+        backend_frame.pack(fill=tk.X)
+
+        tk.Label(backend_frame, text="Backend:").pack(side=tk.LEFT)
+        backend_var = tk.StringVar(value=self.inference_params['backend'])
+        backend_dropdown = ttk.Combobox(backend_frame, textvariable=backend_var,
+                                        values=BACKENDS, state="readonly", width=12)
+        backend_dropdown.pack(side=tk.RIGHT)
+
+        # INT8 quantization of exported models
+        int8_frame = tk.Frame(settings_window, padx=10, pady=5)
+        int8_frame.pack(fill=tk.X)
+
+        tk.Label(int8_frame, text="INT8 Quantization:").pack(side=tk.LEFT)
+        int8_var = tk.BooleanVar(value=self.inference_params['int8'])
+        int8_check = tk.Checkbutton(int8_frame, variable=int8_var)
+        int8_check.pack(side=tk.RIGHT)
+
+        # Progressive inference (preview, then refinement in the background)
+        progressive_frame = tk.Frame(settings_window, padx=10, pady=5)
+        progressive_frame.pack(fill=tk.X)
+
+        tk.Label(progressive_frame, text="Progressive Preview:").pack(side=tk.LEFT)
+        progressive_var = tk.BooleanVar(value=self.inference_params['progressive'])
+        progressive_check = tk.Checkbutton(progressive_frame, variable=progressive_var)
+        progressive_check.pack(side=tk.RIGHT)
+
+        preview_frame = tk.Frame(settings_window, padx=10, pady=5)
+        preview_frame.pack(fill=tk.X)
+
+        tk.Label(preview_frame, text="Preview Image Size:").pack(side=tk.LEFT)
+        preview_var = tk.StringVar(value=str(self.inference_params['preview_imgsz']))
+        preview_entry = tk.Entry(preview_frame, textvariable=preview_var, width=10)
+        preview_entry.pack(side=tk.RIGHT)
+
+        refine_frame = tk.Frame(settings_window, padx=10, pady=5)
+        refine_frame.pack(fill=tk.X)
+
+        tk.Label(refine_frame, text="Full Image Size (0 = model):").pack(side=tk.LEFT)
+        refine_var = tk.StringVar(value=str(self.inference_params['refine_imgsz']))
+        refine_entry = tk.Entry(refine_frame, textvariable=refine_var, width=10)
+        refine_entry.pack(side=tk.RIGHT)
+
+        # Merging predictions with existing boxes
+        policy_frame = tk.Frame(settings_window, padx=10, pady=5)
+        policy_frame.pack(fill=tk.X)
+
+        tk.Label(policy_frame, text="Merge Policy:").pack(side=tk.LEFT)
+        policy_var = tk.StringVar(value=self.inference_params['merge_policy'])
+        policy_dropdown = ttk.Combobox(policy_frame, textvariable=policy_var,
+                                       values=MERGE_POLICIES, state="readonly", width=14)
+        policy_dropdown.pack(side=tk.RIGHT)
+
+        merge_iou_frame = tk.Frame(settings_window, padx=10, pady=5)
+        merge_iou_frame.pack(fill=tk.X)
+
+        tk.Label(merge_iou_frame, text="Merge IOU Threshold:").pack(side=tk.LEFT)
+        merge_iou_var = tk.StringVar(value=str(self.inference_params['merge_iou']))
+        merge_iou_entry = tk.Entry(merge_iou_frame, textvariable=merge_iou_var, width=10)
+        merge_iou_entry.pack(side=tk.RIGHT)
+
+        class_aware_frame = tk.Frame(settings_window, padx=10, pady=5)
+        class_aware_frame.pack(fill=tk.X)
+
+        tk.Label(class_aware_frame, text="Match Same Class Only:").pack(side=tk.LEFT)
+        class_aware_var = tk.BooleanVar(value=self.inference_params['merge_class_aware'])
+        class_aware_check = tk.Checkbutton(class_aware_frame, variable=class_aware_var)
+        class_aware_check.pack(side=tk.RIGHT)
+
         # Buttons
         button_frame = tk.Frame(settings_window, padx=10, pady=10)
         button_frame.pack(fill=tk.X)
@@ -867,15 +2066,44 @@ class YOLOLabelTool:
                 if not (0 <= iou <= 1):
                     messagebox.showerror("Error", "IOU must be between 0 and 1")
                     return
+                merge_iou = float(merge_iou_var.get())
+                if not (0 < merge_iou <= 1):
+                    messagebox.showerror("Error", "Merge IOU must be between 0 and 1")
+                    return
+                preview_imgsz = int(preview_var.get())
+                refine_imgsz = int(refine_var.get())
+                if preview_imgsz <= 0 or refine_imgsz < 0:
+                    messagebox.showerror("Error", "Image sizes must be positive")
+                    return
 
+                conf_changed = conf != self.inference_params['conf']
                 self.inference_params['conf'] = conf
                 self.inference_params['iou'] = iou
                 self.inference_params['show'] = show_var.get()
                 self.inference_params['save'] = save_var.get()
+                self.inference_params['progressive'] = progressive_var.get()
+                self.inference_params['preview_imgsz'] = preview_imgsz
+                self.inference_params['refine_imgsz'] = refine_imgsz
+                self.inference_params['merge_policy'] = policy_var.get()
+                self.inference_params['merge_iou'] = merge_iou
+                self.inference_params['merge_class_aware'] = class_aware_var.get()
+
+                backend_changed = (backend_var.get() != self.inference_params['backend'] or
+                                   int8_var.get() != self.inference_params['int8'])
+                self.inference_params['backend'] = backend_var.get()
+                self.inference_params['int8'] = int8_var.get()
+
                 self.status_var.set("Inference settings updated")
                 settings_window.destroy()
+
+                # Reload the current model with the new backend
+                if backend_changed and self.model_path:
+                    self.set_model(self.model_path)
+                elif conf_changed:
+                    # Uncertainty scores depend on the confidence threshold
+                    self.start_scoring()
             except ValueError:
-                messagebox.showerror("Error", "Invalid confidence or IOU value")
+                messagebox.showerror("Error", "Invalid confidence, IOU or image size value")
 
         def cancel():
             settings_window.destroy()
@@ -939,10 +2167,8 @@ class YOLOLabelTool:
                 if new_class < 0:
                     messagebox.showerror("Error", "Class must be non-negative", parent=dialog)
                     return
-                ann['class'] = new_class
-                self.display_image()
-                self.status_var.set(f"Changed box class to {new_class}")
                 dialog.destroy()
+                self.apply_box_class(box_idx, new_class)
             except ValueError:
                 messagebox.showerror("Error", "Invalid class number", parent=dialog)
 
@@ -956,6 +2182,15 @@ class YOLOLabelTool:
         tk.Button(button_frame, text="Apply", command=apply_change, bg='lightgreen', width=10).pack(side=tk.LEFT, padx=5)
         tk.Button(button_frame, text="Cancel", command=cancel, bg='lightcoral', width=10).pack(side=tk.LEFT, padx=5)
 
+    @recorded
+    def apply_box_class(self, box_idx, new_class):
+        """Set the class of a box"""
+        ann = self.annotations[box_idx]
+        ann['class'] = new_class
+        ann['edited'] = True
+        self.display_image()
+        self.status_var.set(f"Changed box class to {new_class}")
+
     def save_and_next(self):
         """Save current annotations and move to next image"""
         if not self.current_image_path or not self.output_dir:
@@ -965,7 +2200,12 @@ class YOLOLabelTool:
         if not self.annotations:
             if not messagebox.askyesno("Warning", "No annotations. Save anyway?"):
                 return
+        self.save_annotations_and_next()
 
+    @recorded
+    @traced('save_and_next')
+    def save_annotations_and_next(self):
+        """Save the current annotations without asking and move to the next image"""
         # Create subdirectories
         images_dir = self.output_dir / "images"
         labels_dir = self.output_dir / "labels"
@@ -997,59 +2237,130 @@ class YOLOLabelTool:
         except ValueError:
             num_kp_classes = 0  # Default
 
-        with open(label_output_path, 'w') as f:
-            for ann in self.annotations:
-                if ann['type'] == 'box':
-                    # YOLOv11-Pose format: class x_center y_center width height kp1_x kp1_y kp1_v ...
-                    x1, y1, x2, y2 = ann['coords']
-                    x_center = ((x1 + x2) / 2) / img_width
-                    y_center = ((y1 + y2) / 2) / img_height
-                    width = (x2 - x1) / img_width
-                    height = (y2 - y1) / img_height
-
-                    line = f"{ann['class']} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}"
-
-                    # Create keypoint array indexed by class
-                    kp_array = {}
-                    for kp in ann.get('keypoints', []):
-                        kp_array[kp['class']] = kp
-
-                    # Output keypoints in order of class (0 to num_kp_classes-1)
-                    for kp_class in range(num_kp_classes):
-                        if kp_class in kp_array:
-                            kp = kp_array[kp_class]
-                            x_norm = kp['coords'][0] / img_width
-                            y_norm = kp['coords'][1] / img_height
-                            visible = kp['visible']
-                            line += f" {x_norm:.6f} {y_norm:.6f} {visible}"
-                        else:
-                            # Keypoint not present, write as 0 0 0
-                            line += " 0.000000 0.000000 0"
-
-                    f.write(line + "\n")
+        # YOLOv11-Pose format: class x_center y_center width height kp1_x kp1_y kp1_v ...
+        write_label_file(label_output_path, self.annotations, img_width, img_height, num_kp_classes)
+        RECORDER.checkpoint('save_and_next', label_output_path.read_text())
+        if self.training_copies_var.get():
+            self.start_training_copy(self.current_image, img_filename, label_output_path)
 
         # Save counter
         self.save_key_counter()
 
         self.status_var.set(f"Saved: {img_filename} and {label_filename}")
 
+        # The image is labeled now, so it leaves the uncertainty queue
+        self.image_scores.pop(self.current_image_path, None)
+
         # Move to next image
+        prev_image = self.current_image
+        prev_annotations = self.annotations
         if self.current_image_idx is not None:
             next_idx = self.current_image_idx + 1
+            if self.rank_var.get():
+                # Most uncertain unlabeled image first; list order for images not scored yet
+                labeled = labeled_stems(labels_dir)
+                next_idx = pick_next(self.image_list, self.current_image_idx, self.image_scores, labeled=labeled)
+                if next_idx is None:
+                    next_idx = next_unlabeled(self.image_list, self.current_image_idx, labeled)
+                if next_idx is None:
+                    next_idx = len(self.image_list)
+                # Scores come from the model, so replay uses the recorded pick
+                next_idx = RECORDER.choice('ranked_next', next_idx)
             if next_idx < len(self.image_list):
                 self.image_listbox.selection_clear(0, tk.END)
                 self.image_listbox.selection_set(next_idx)
                 self.image_listbox.see(next_idx)
+                consecutive = next_idx == self.current_image_idx + 1
                 self.current_image_idx = next_idx
                 self.current_image_path = self.image_list[next_idx]
                 self.load_image()
+                # Only the following frame looks like this one, and its own annotations (imported) win
+                if self.propagate_var.get() and consecutive and prev_annotations and not self.annotations:
+                    self.carry_annotations_forward(prev_image, prev_annotations)
             else:
                 messagebox.showinfo("Done", "All images labeled!")
 
 
+def parse_importtime(stderr):
+    """Return (cumulative_us, module) for top-level imports in -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # Header line
+        module = parts[2]
+        # Nested imports are indented below the module that imported them
+        if len(module) - len(module.lstrip()) == 1:
+            imports.append((int(parts[1]), module.strip()))
+    return imports
+
+
+def startup_report():
+    """Print time-to-window and the slowest imports with eager and lazy model imports"""
+    runs = [("Before (ultralytics imported at startup)", ['--eager-imports']),
+            ("After (ultralytics imported when a model loads)", [])]
+    for label, extra_args in runs:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--time-to-window'] + extra_args,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        time_to_window = None
+        for line in process.stdout:
+            if line.strip() == 'window-ready':
+                time_to_window = time.perf_counter() - start
+                break
+        _, stderr = process.communicate()
+
+        print(label)
+        if time_to_window is None:
+            print("  Window never appeared:")
+            print('\n'.join('    ' + line for line in stderr.splitlines()[-5:]))
+            continue
+        print(f"  Time to window: {time_to_window * 1000:.0f} ms")
+        print("  Slowest imports (cumulative):")
+        for cumulative_us, module in sorted(parse_importtime(stderr), reverse=True)[:8]:
+            print(f"    {cumulative_us / 1000:8.1f} ms  {module}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="YOLO Labeling Tool")
+    parser.add_argument('--no-preload', action='store_true',
+                        help="Don't load the last used model at startup")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Report time-to-window and import times, then exit")
+    parser.add_argument('--record', metavar='LOG',
+                        help="Record the session to a log for session_replay.py")
+    parser.add_argument('--time-to-window', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--eager-imports', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_report:
+        startup_report()
+        return
+
+    if args.eager_imports:
+        # Old behaviour, used as the baseline for --startup-report
+        import ultralytics  # noqa: F401
+
     root = tk.Tk()
     app = YOLOLabelTool(root)
+
+    if args.time_to_window:
+        root.update()
+        print('window-ready', flush=True)
+        root.destroy()
+        return
+
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    if args.record:
+        # Start once the window has its final size
+        root.after(200, lambda: app.start_recording(args.record))
+
+    if not args.no_preload:
+        # Load the previous session's model once the window is up
+        root.after(500, app.preload_last_model)
     root.mainloop()
 
 
@@ -0,0 +1,103 @@
+"""Batch pre-labeling of an image directory
+
+Runs a model over every image and writes YOLO label files, merging the
+predictions into any labels that already exist with the same IoU merge used
+by "Run Inference" (see annotation_merge.py), so re-running it never stacks
+duplicate boxes.
+
+    python prelabel.py best.pt path/to/images path/to/labels --policy keep_manual
+"""
+
+import argparse
+from pathlib import Path
+
+from PIL import Image
+
+from annotation_merge import MERGE_POLICIES, merge_predictions
+from detections import detections_to_annotations
+from inference_backends import BACKENDS, IMAGE_EXTENSIONS, get_backend
+from yolo_format import label_file_keypoint_count, read_label_file, write_label_file
+
+
+def prelabel_directory(backend, image_paths, labels_dir, conf=0.5, iou=0.4, merge_iou=0.5,
+                       policy='keep_manual', class_aware=True, num_kp_classes=None,
+                       batch_size=8, progress=None):
+    """Run the backend over the images and merge predictions into their label files
+
+    num_kp_classes defaults to the number of keypoints the model predicts (or
+    the existing label file has, if more).
+    progress, if given, is called with (images_done, total_images).
+    """
+    labels_dir = Path(labels_dir)
+    labels_dir.mkdir(parents=True, exist_ok=True)
+    image_paths = list(image_paths)
+    totals = {'images': 0, 'added': 0, 'matched': 0}
+
+    for start in range(0, len(image_paths), batch_size):
+        batch = image_paths[start:start + batch_size]
+        batch_detections = backend.predict([str(path) for path in batch], conf=conf, iou=iou)
+
+        for image_path, detections in zip(batch, batch_detections):
+            # Only the header is read to get the size
+            with Image.open(image_path) as img:
+                img_width, img_height = img.size
+
+            label_path = labels_dir / f"{Path(image_path).stem}.txt"
+
+            kp_classes = num_kp_classes
+            if kp_classes is None:
+                # Keep the existing keypoint columns when the model predicts fewer
+                kp_classes = max([len(det['keypoints'] or []) for det in detections] +
+                                 [label_file_keypoint_count(label_path)])
+            existing = read_label_file(label_path, img_width, img_height)
+            merged, stats = merge_predictions(existing, detections_to_annotations(detections),
+                                              iou_threshold=merge_iou, policy=policy,
+                                              class_aware=class_aware)
+            write_label_file(label_path, merged, img_width, img_height, kp_classes)
+
+            totals['images'] += 1
+            totals['added'] += stats['added']
+            totals['matched'] += stats['matched']
+
+        if progress:
+            progress(min(start + batch_size, len(image_paths)), len(image_paths))
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-label a directory of images with a YOLO model")
+    parser.add_argument('model', help="YOLO model file")
+    parser.add_argument('images', help="Directory of images")
+    parser.add_argument('labels', help="Directory for label files (existing labels are merged)")
+    parser.add_argument('--backend', default='pytorch', choices=BACKENDS)
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.4, help="NMS IoU threshold")
+    parser.add_argument('--merge-iou', type=float, default=0.5,
+                        help="IoU above which a prediction matches an existing box")
+    parser.add_argument('--policy', default='keep_manual', choices=MERGE_POLICIES,
+                        help="What to do when a prediction matches an existing box")
+    parser.add_argument('--class-agnostic', action='store_true',
+                        help="Match boxes regardless of class")
+    parser.add_argument('--num-kp', type=int, default=None,
+                        help="Number of keypoint classes to write (default: the model's)")
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    image_paths = sorted(path for path in Path(args.images).iterdir()
+                         if path.suffix.lower() in IMAGE_EXTENSIONS)
+    backend = get_backend(args.backend, args.model)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} images", end='', flush=True)
+
+    totals = prelabel_directory(backend, image_paths, args.labels, conf=args.conf, iou=args.iou,
+                                merge_iou=args.merge_iou, policy=args.policy,
+                                class_aware=not args.class_agnostic, num_kp_classes=args.num_kp,
+                                batch_size=args.batch_size, progress=progress)
+    print(f"\nPre-labeled {totals['images']} images: {totals['added']} boxes added, "
+          f"{totals['matched']} matched existing boxes")
+
+
+if __name__ == '__main__':
+    main()
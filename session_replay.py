@@ -0,0 +1,359 @@
+"""Record and replay annotation sessions
+
+While recording, every user-level call into the labeling tool (mouse
+handlers, button actions, image selection, settings changes) is written to
+a gzipped JSON-lines log. Inference results are stored as annotation
+snapshots, so replaying needs no model. Replay drives the same methods at
+full speed and reports handler time, the slowest events and whether the
+labels come out identical.
+
+Record from the GUI (Performance > Record Session...) or with
+"python label_tool.py --record session.jsonl.gz", then replay, under a
+virtual X server if there is no display:
+
+    xvfb-run python session_replay.py session.jsonl.gz --slowest 20
+"""
+
+import argparse
+import copy
+import functools
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from types import SimpleNamespace
+
+
+LOG_VERSION = 1
+
+# Tk variables whose changes are recorded
+RECORDED_VARS = ['mode_var', 'class_var', 'num_kp_classes_var', 'propagate_var', 'hide_duplicates_var',
+                 'duplicate_threshold_var', 'rank_var']
+# Methods replay calls after setting a variable, as its widget's command does
+VAR_COMMANDS = {'hide_duplicates_var': 'on_duplicate_settings_change',
+                'duplicate_threshold_var': 'on_duplicate_settings_change'}
+
+
+def normalize_annotations(annotations):
+    """JSON-compatible copy of the annotations (tuples become lists)"""
+    return json.loads(json.dumps(annotations))
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _encode_arg(arg):
+    # Tk events are reduced to the fields the handlers use
+    if hasattr(arg, 'x') and hasattr(arg, 'y') and hasattr(arg, 'widget'):
+        state = getattr(arg, 'state', 0)
+        return {'x': arg.x, 'y': arg.y, 's': state if isinstance(state, int) else 0}
+    return arg
+
+
+class SessionRecorder:
+    """Writes a session log while recording and checks checkpoints while replaying"""
+
+    def __init__(self):
+        self.file = None
+        self.depth = 0
+        self.start_time = 0.0
+        self.var_traces = []
+        self.replaying = False
+        self.expected_checkpoints = deque()
+        self.recorded_choices = deque()
+        self.checkpoint_mismatches = []
+
+    @property
+    def active(self):
+        return self.file is not None
+
+    def start(self, path, app):
+        """Start recording the app's session to a log file"""
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.start_time = time.perf_counter()
+        self.depth = 0
+
+        header = {
+            'version': LOG_VERSION,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'geometry': app.root.winfo_geometry().split('+')[0],
+            'canvas': [app.canvas.winfo_width(), app.canvas.winfo_height()],
+            'image_dir': str(app.image_dir) if app.image_dir else None,
+            'image_idx': app.current_image_idx,
+            'hashes_ready': bool(app.image_hashes),
+            'vars': {name: getattr(app, name).get() for name in RECORDED_VARS},
+            'model_names': {str(k): v for k, v in app.model_names.items()},
+            'annotations': normalize_annotations(app.annotations),
+            'selected_box_idx': app.selected_box_idx
+        }
+        self._write(header)
+
+        for name in RECORDED_VARS:
+            var = getattr(app, name)
+            callback = functools.partial(self._on_var_write, name, var)
+            self.var_traces.append((var, var.trace_add('write', callback)))
+
+    def stop(self, app):
+        """Finish the log with the final annotation state"""
+        if not self.active:
+            return
+        for var, trace_id in self.var_traces:
+            var.trace_remove('write', trace_id)
+        self.var_traces = []
+        self._write({'final_annotations': normalize_annotations(app.annotations)})
+        self.file.close()
+        self.file = None
+
+    def record(self, name, args):
+        elapsed_ms = round((time.perf_counter() - self.start_time) * 1000, 3)
+        self._write([elapsed_ms, name, [_encode_arg(arg) for arg in args]])
+
+    def snapshot(self, app):
+        """Record the annotation state after a change replay can't reproduce (e.g. inference)"""
+        if self.active:
+            self.record('set_state', [normalize_annotations(app.annotations), app.selected_box_idx])
+
+    def checkpoint(self, name, value):
+        """Record a value while recording, or compare it with the recorded one while replaying"""
+        if self.active:
+            self.record('checkpoint', [name, _digest(value)])
+        elif self.replaying:
+            expected = self.expected_checkpoints.popleft() if self.expected_checkpoints else None
+            if expected != [name, _digest(value)]:
+                self.checkpoint_mismatches.append(name)
+
+    def choice(self, name, value):
+        """Record a decision replay can't reproduce (e.g. one based on model scores)
+
+        While replaying, the recorded decision is returned instead of value.
+        """
+        if self.active:
+            self.record('choice', [name, value])
+        elif self.replaying and self.recorded_choices and self.recorded_choices[0][0] == name:
+            return self.recorded_choices.popleft()[1]
+        return value
+
+    def _on_var_write(self, name, var, *args):
+        if self.depth == 0:
+            self.record('set_var', [name, var.get()])
+
+    def _write(self, item):
+        self.file.write(json.dumps(item, separators=(',', ':')) + '\n')
+
+
+RECORDER = SessionRecorder()
+
+
+def recorded(fn):
+    """Decorator logging top-level calls of a method while a session is recorded
+
+    Calls made from inside another recorded method are not logged, since
+    replaying the outer call repeats them.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self, *args):
+        if not RECORDER.active:
+            return fn(self, *args)
+        if RECORDER.depth == 0:
+            RECORDER.record(name, args)
+        RECORDER.depth += 1
+        try:
+            return fn(self, *args)
+        finally:
+            RECORDER.depth -= 1
+    return wrapper
+
+
+def read_session(path):
+    """Return (header, events, footer) from a session log"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        events = []
+        footer = {}
+        for line in f:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                footer = item
+            else:
+                events.append(item)
+    if header.get('version') != LOG_VERSION:
+        raise ValueError(f"Unsupported session log version: {header.get('version')}")
+    return header, events, footer
+
+
+class _ReplayMessagebox:
+    """Answers the tool's dialogs without blocking: confirm everything, collect messages"""
+
+    def __init__(self):
+        self.messages = []
+
+    def askyesno(self, title, message, **kwargs):
+        return True
+
+    def showinfo(self, title, message, **kwargs):
+        self.messages.append(f"{title}: {message}")
+
+    showerror = showinfo
+    showwarning = showinfo
+
+
+def _set_var(app, name, value):
+    getattr(app, name).set(value)
+    if name in VAR_COMMANDS:
+        getattr(app, VAR_COMMANDS[name])()
+
+
+def _index_duplicates(app):
+    """Near-duplicate hashes of the replayed directory, computed synchronously"""
+    from image_dedup import update_hash_index
+
+    return update_hash_index(app.image_dir, list(app.all_images))
+
+
+def replay(log_path, slowest=10):
+    """Replay a session log against the current code and return a report"""
+    import tkinter as tk
+    import label_tool
+
+    log_path = os.path.abspath(log_path)
+    header, events, footer = read_session(log_path)
+
+    # Run in a scratch directory so saves and the key counter don't touch real data
+    workdir = tempfile.mkdtemp(prefix='yolo_replay_')
+    os.chdir(workdir)
+    messagebox = _ReplayMessagebox()
+    label_tool.messagebox = messagebox
+
+    root = tk.Tk()
+    root.geometry(header['geometry'])
+    app = label_tool.YOLOLabelTool(root)
+    root.update()
+
+    canvas_size = [app.canvas.winfo_width(), app.canvas.winfo_height()]
+    if canvas_size != header['canvas']:
+        print(f"Warning: canvas is {canvas_size}, recorded {header['canvas']}; "
+              f"mouse coordinates may map differently", file=sys.stderr)
+
+    app.output_dir = Path(workdir) / 'output'
+    app.output_dir.mkdir()
+    app.model_names = {int(k): v for k, v in header['model_names'].items()}
+
+    # Restore the state the recording started from. Near-duplicate hashes
+    # are applied when the recording did (see 'duplicates_indexed'), not when
+    # the background indexing happens to finish, so UI callbacks aren't run
+    if header['image_dir']:
+        app.open_directory(header['image_dir'])
+        if header.get('hashes_ready'):
+            app.image_hashes = _index_duplicates(app)
+    for name, value in header['vars'].items():
+        _set_var(app, name, value)
+    if header['image_idx'] is not None:
+        app.open_image(header['image_idx'])
+    app.annotations = copy.deepcopy(header['annotations'])
+    app.selected_box_idx = header['selected_box_idx']
+    app.display_image()
+    root.update_idletasks()
+
+    RECORDER.replaying = True
+    RECORDER.expected_checkpoints = deque(args for _, name, args in events if name == 'checkpoint')
+    RECORDER.recorded_choices = deque(args for _, name, args in events if name == 'choice')
+
+    timings = []
+    per_handler = defaultdict(lambda: [0, 0.0, 0.0])  # count, total ms, max ms
+    for index, (elapsed_ms, name, args) in enumerate(events):
+        if name in ('checkpoint', 'choice'):
+            continue
+        if name == 'set_var':
+            _set_var(app, *args)
+            continue
+        if name == 'duplicates_indexed':
+            app.finish_duplicate_indexing(app.image_dir, _index_duplicates(app))
+            continue
+        if name == 'set_state':
+            app.annotations = copy.deepcopy(args[0])
+            app.selected_box_idx = args[1]
+            app.display_image()
+            continue
+
+        call_args = [SimpleNamespace(x=arg['x'], y=arg['y'], state=arg['s'], widget=app.canvas)
+                     if isinstance(arg, dict) and 's' in arg else arg for arg in args]
+        start = time.perf_counter()
+        getattr(app, name)(*call_args)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        timings.append((duration_ms, index, name))
+        stats = per_handler[name]
+        stats[0] += 1
+        stats[1] += duration_ms
+        stats[2] = max(stats[2], duration_ms)
+
+        # Dialogs opened by a handler (e.g. change class) are answered by a later event
+        for widget in root.winfo_children():
+            if isinstance(widget, tk.Toplevel):
+                widget.destroy()
+        root.update_idletasks()
+
+    final_annotations = normalize_annotations(app.annotations)
+    root.destroy()
+    RECORDER.replaying = False
+
+    report = {
+        'events': len(timings),
+        'total_handler_ms': sum(t[0] for t in timings),
+        'per_handler': {name: {'count': s[0], 'total_ms': s[1], 'max_ms': s[2]}
+                        for name, s in sorted(per_handler.items())},
+        'slowest': [{'ms': ms, 'event': index, 'handler': name}
+                    for ms, index, name in sorted(timings, reverse=True)[:slowest]],
+        'final_annotations': final_annotations,
+        'final_matches_recording': None,
+        'checkpoint_mismatches': RECORDER.checkpoint_mismatches,
+        'messages': messagebox.messages
+    }
+    if 'final_annotations' in footer:
+        report['final_matches_recording'] = _digest(final_annotations) == _digest(footer['final_annotations'])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded labeling session")
+    parser.add_argument('log', help="Session log (.jsonl.gz)")
+    parser.add_argument('--slowest', type=int, default=10, help="Number of slowest events to list")
+    parser.add_argument('--output', help="Write the full report (including final annotations) as JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = replay(args.log, slowest=args.slowest)
+
+    print(f"Replayed {report['events']} events, total handler time {report['total_handler_ms']:.1f} ms")
+    print(f"{'handler':<24}{'count':>8}{'total ms':>12}{'max ms':>10}")
+    for name, stats in report['per_handler'].items():
+        print(f"{name:<24}{stats['count']:>8}{stats['total_ms']:>12.1f}{stats['max_ms']:>10.2f}")
+    print("Slowest events:")
+    for item in report['slowest']:
+        print(f"  #{item['event']:<8}{item['handler']:<24}{item['ms']:.2f} ms")
+    print(f"Final annotations: {len(report['final_annotations'])} boxes")
+
+    identical = report['final_matches_recording'] is not False and not report['checkpoint_mismatches']
+    if report['final_matches_recording'] is None:
+        print("Recording has no final state to compare with (it wasn't stopped cleanly)")
+    print(f"Labels identical to recording: {'yes' if identical else 'NO'}")
+    if report['checkpoint_mismatches']:
+        print(f"  Mismatched saves: {len(report['checkpoint_mismatches'])}")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
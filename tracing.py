@@ -0,0 +1,138 @@
+"""Low-overhead latency tracing for the labeling tool
+
+Spans are only recorded while tracing is switched on; when it is off a
+traced call costs one attribute check. Recorded sessions can be exported as
+Chrome trace-event JSON and opened in chrome://tracing or ui.perfetto.dev.
+
+    from tracing import TRACER, traced
+
+    @traced('display_image')
+    def display_image(self):
+        with TRACER.span('display_image.resize'):
+            ...
+"""
+
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+
+# Span whose durations are reported as frame times
+FRAME_SPAN = 'display_image'
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class Tracer:
+    """Collects timed spans in a bounded buffer"""
+
+    def __init__(self, max_events=200000, max_frames=1000):
+        self.enabled = bool(os.environ.get('YOLO_LABEL_TRACE'))
+        self.events = collections.deque(maxlen=max_events)  # (name, start_ns, end_ns, thread_id)
+        self.frame_times = collections.deque(maxlen=max_frames)  # Recent frame times in ms
+        self.thread_names = {}
+
+    def span(self, name):
+        """Context manager timing a block (a no-op while tracing is off)"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start_ns, end_ns):
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident, thread.name)
+        self.events.append((name, start_ns, end_ns, thread.ident))
+        if name == FRAME_SPAN:
+            self.frame_times.append((end_ns - start_ns) / 1e6)
+
+    def clear(self):
+        self.events.clear()
+        self.frame_times.clear()
+
+    def frame_percentiles(self):
+        """Return (p50_ms, p95_ms, count) of recent frame times, or None if there are none"""
+        if not self.frame_times:
+            return None
+        ordered = sorted(self.frame_times)
+        p50 = ordered[len(ordered) // 2]
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return p50, p95, len(ordered)
+
+    def span_summary(self):
+        """Return {name: (count, mean_ms, max_ms)} over the recorded spans"""
+        durations = collections.defaultdict(list)
+        for name, start, end, _ in list(self.events):
+            durations[name].append((end - start) / 1e6)
+        return {name: (len(values), sum(values) / len(values), max(values))
+                for name, values in durations.items()}
+
+    def export_chrome_trace(self, path):
+        """Write the recorded spans as Chrome trace-event JSON"""
+        events = list(self.events)
+        origin = min((start for _, start, _, _ in events), default=0)
+        pid = os.getpid()
+
+        trace_events = [{
+            'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+            'args': {'name': thread_name}
+        } for tid, thread_name in self.thread_names.items()]
+        for name, start, end, tid in events:
+            trace_events.append({
+                'name': name,
+                'cat': name.split('.')[0],
+                'ph': 'X',
+                'ts': (start - origin) / 1000,  # Microseconds
+                'dur': (end - start) / 1000,
+                'pid': pid,
+                'tid': tid
+            })
+
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+TRACER = Tracer()
+
+
+def traced(name):
+    """Decorator recording a span around every call of a function"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                TRACER.record(name, start, time.perf_counter_ns())
+        return wrapper
+    return decorator
@@ -0,0 +1,131 @@
+"""Reading and writing YOLO / YOLO-Pose label files
+
+Label lines look like:
+
+    class x_center y_center width height [kp1_x kp1_y kp1_v ...] [conf]
+
+with coordinates normalized to 0-1. Missing keypoints are written as
+"0.000000 0.000000 0". A trailing confidence (ultralytics save_conf) is
+recognized when the number of extra values isn't a multiple of three.
+"""
+
+import os
+
+
+def parse_yolo_line(line):
+    """Parse a label line into normalized values, or None for blank/invalid lines
+
+    Returns {'class': int, 'box': (xc, yc, w, h), 'keypoints': [(x, y, v), ...], 'conf': float or None}
+    """
+    parts = line.split()
+    if len(parts) < 5:
+        return None
+    try:
+        class_id = int(float(parts[0]))
+        values = [float(v) for v in parts[1:]]
+    except ValueError:
+        return None
+
+    box = tuple(values[:4])
+    extra = values[4:]
+    conf = None
+    if len(extra) % 3 == 1:
+        conf = extra.pop()
+
+    keypoints = []
+    for k in range(0, len(extra) - len(extra) % 3, 3):
+        keypoints.append((extra[k], extra[k + 1], int(extra[k + 2])))
+
+    return {'class': class_id, 'box': box, 'keypoints': keypoints, 'conf': conf}
+
+
+def format_yolo_line(class_id, box, keypoints=(), conf=None):
+    """Format normalized values as a label line"""
+    x_center, y_center, width, height = box
+    line = f"{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}"
+    for kp_x, kp_y, visible in keypoints:
+        line += f" {kp_x:.6f} {kp_y:.6f} {visible}"
+    if conf is not None:
+        line += f" {conf:.6f}"
+    return line
+
+
+def annotation_to_line(ann, img_width, img_height, num_kp_classes):
+    """Convert a box annotation (pixel coordinates) to a YOLO-Pose label line"""
+    x1, y1, x2, y2 = ann['coords']
+    box = (((x1 + x2) / 2) / img_width,
+           ((y1 + y2) / 2) / img_height,
+           (x2 - x1) / img_width,
+           (y2 - y1) / img_height)
+
+    # Output keypoints in order of class (0 to num_kp_classes-1)
+    kp_array = {kp['class']: kp for kp in ann.get('keypoints', [])}
+    keypoints = []
+    for kp_class in range(num_kp_classes):
+        if kp_class in kp_array:
+            kp = kp_array[kp_class]
+            keypoints.append((kp['coords'][0] / img_width, kp['coords'][1] / img_height, kp['visible']))
+        else:
+            # Keypoint not present, write as 0 0 0
+            keypoints.append((0.0, 0.0, 0))
+
+    return format_yolo_line(ann['class'], box, keypoints)
+
+
+def line_to_annotation(line, img_width, img_height):
+    """Convert a label line to a box annotation in pixel coordinates"""
+    parsed = parse_yolo_line(line)
+    if parsed is None:
+        return None
+
+    x_center, y_center, width, height = parsed['box']
+    ann = {
+        'type': 'box',
+        'class': parsed['class'],
+        'coords': [(x_center - width / 2) * img_width, (y_center - height / 2) * img_height,
+                   (x_center + width / 2) * img_width, (y_center + height / 2) * img_height],
+        'keypoints': []
+    }
+    for kp_class, (kp_x, kp_y, visible) in enumerate(parsed['keypoints']):
+        # "0 0 0" is a keypoint that was never placed
+        if visible == 0 and kp_x == 0 and kp_y == 0:
+            continue
+        ann['keypoints'].append({
+            'class': kp_class,
+            'coords': (kp_x * img_width, kp_y * img_height),
+            'visible': visible
+        })
+    return ann
+
+
+def read_label_file(path, img_width, img_height):
+    """Read a label file into box annotations (empty list if it doesn't exist)"""
+    if not os.path.exists(path):
+        return []
+    annotations = []
+    with open(path, 'r') as f:
+        for line in f:
+            ann = line_to_annotation(line, img_width, img_height)
+            if ann is not None:
+                annotations.append(ann)
+    return annotations
+
+
+def label_file_keypoint_count(path):
+    """Number of keypoints per line in an existing label file (0 if none or missing)"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r') as f:
+        for line in f:
+            parsed = parse_yolo_line(line)
+            if parsed is not None:
+                return len(parsed['keypoints'])
+    return 0
+
+
+def write_label_file(path, annotations, img_width, img_height, num_kp_classes):
+    """Write box annotations to a label file"""
+    with open(path, 'w') as f:
+        for ann in annotations:
+            if ann['type'] == 'box':
+                f.write(annotation_to_line(ann, img_width, img_height, num_kp_classes) + "\n")